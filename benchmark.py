@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Набор бенчмарков инструмента визуализации графа зависимостей
+Синтетические графы с фиксированным seed, локальный тестовый реестр и результаты в JSON
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dependency_visualizer import DependencyVisualizer, SvgLayoutRenderer
+
+
+def package_name(index):
+    return f"pkg{index}"
+
+
+def generate_chain(size, rng):
+    """Глубокая цепочка: pkg0 -> pkg1 -> ... -> pkgN-1"""
+    return {package_name(i): [package_name(i + 1)] if i + 1 < size else [] for i in range(size)}
+
+
+def generate_fan(size, rng):
+    """Широкий веер: корень зависит от всех остальных пакетов"""
+    graph = {package_name(0): [package_name(i) for i in range(1, size)]}
+    for i in range(1, size):
+        graph[package_name(i)] = []
+    return graph
+
+
+def generate_diamond(size, rng):
+    """Решетка ромбов: слои шириной ~sqrt(N), пакет зависит от двух соседей следующего слоя"""
+    width = max(2, int(size ** 0.5))
+    graph = {package_name(0): [package_name(i) for i in range(1, min(size, width + 1))]}
+    for i in range(1, size):
+        column = (i - 1) % width
+        next_row = i + width - column
+        dependencies = []
+        for offset in (column, (column + 1) % width):
+            target = next_row + offset
+            if target < size:
+                dependencies.append(package_name(target))
+        graph[package_name(i)] = dependencies
+    return graph
+
+
+def generate_cycle_clusters(size, rng, cluster_size=16, density=0.3):
+    """Плотные кластеры циклов: внутри кластера кольцо и случайные ребра, кластеры связаны цепочкой"""
+    graph = {}
+    for start in range(0, size, cluster_size):
+        members = list(range(start, min(size, start + cluster_size)))
+        for position, i in enumerate(members):
+            dependencies = {members[(position + 1) % len(members)]}
+            for j in members:
+                if j != i and rng.random() < density:
+                    dependencies.add(j)
+            if position == 0 and start + cluster_size < size:
+                dependencies.add(start + cluster_size)
+            graph[package_name(i)] = [package_name(j) for j in sorted(dependencies)]
+    return graph
+
+
+def generate_power_law(size, rng, mean_dependencies=4):
+    """Граф в духе npm: число зависимостей по степенному закону, популярные пакеты выбираются чаще
+
+    Пакеты ссылаются только на более ранние (библиотеки старше приложений),
+    корень pkg0 зависит от всех пакетов, от которых не зависит никто.
+    """
+    graph = {}
+    # Каждый пакет попадает в список столько раз, сколько у него зависящих (+1)
+    popularity = []
+    has_dependents = set()
+    for i in range(size - 1, 0, -1):
+        # Индексы идут от листьев к корню: pkgN-1 - самая старая библиотека
+        # Распределение Парето с показателем 1.5 имеет среднее 3
+        count = min(int(rng.paretovariate(1.5) * mean_dependencies / 3), size - 1 - i)
+        dependencies = set()
+        while len(dependencies) < count:
+            dependencies.add(rng.choice(popularity))
+        graph[package_name(i)] = [package_name(j) for j in sorted(dependencies)]
+        for j in dependencies:
+            popularity.append(j)
+            has_dependents.add(j)
+        popularity.append(i)
+
+    graph[package_name(0)] = [package_name(i) for i in range(1, size) if i not in has_dependents]
+    return graph
+
+
+GENERATORS = {
+    'chain': generate_chain,
+    'fan': generate_fan,
+    'diamond': generate_diamond,
+    'cycles': generate_cycle_clusters,
+    'power_law': generate_power_law,
+}
+
+
+def to_repository(graph):
+    """Граф в формате тестового репозитория"""
+    return {name: {'dependencies': {dep: '^1.0.0' for dep in dependencies}}
+            for name, dependencies in graph.items()}
+
+
+def make_packument(name, dependencies):
+    """Минимальный packument npm с единственной версией 1.0.0"""
+    return {
+        'name': name,
+        'dist-tags': {'latest': '1.0.0'},
+        'versions': {'1.0.0': {'name': name, 'version': '1.0.0',
+                               'dependencies': {dep: '^1.0.0' for dep in dependencies}}},
+    }
+
+
+class FakeRegistryHandler(BaseHTTPRequestHandler):
+    """Ответы тестового реестра: GET /<пакет> -> packument"""
+
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят отдельными записями - без TCP_NODELAY keep-alive ждет delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        name = urllib.parse.unquote(self.path.lstrip('/'))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        dependencies = self.server.graph.get(name)
+        if dependencies is None:
+            status, body = 404, b'{"error":"Not found"}'
+        else:
+            status, body = 200, json.dumps(make_packument(name, dependencies)).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeRegistry:
+    """Локальный реестр npm для синтетического графа (в отдельном потоке)"""
+
+    def __init__(self, graph, latency=0.0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeRegistryHandler)
+        self.server.daemon_threads = True
+        self.server.graph = graph
+        self.server.latency = latency
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def quiet_visualizer():
+    """Экземпляр инструмента; вывод в stdout на время замера отключается вызывающим"""
+    visualizer = DependencyVisualizer()
+    visualizer.ignore_ranges = True
+    return visualizer
+
+
+def bench_dfs(context):
+    visualizer = quiet_visualizer()
+    visualizer.repositories[context['repo_path']] = context['repository']
+    visualizer.build_dependency_graph_dfs(context['root'], context['repo_path'], True)
+
+
+def bench_reverse(context):
+    visualizer = quiet_visualizer()
+    visualizer.repositories[context['repo_path']] = context['repository']
+    visualizer.find_reverse_dependencies(context['target'], context['repo_path'], True, '', 0)
+
+
+def bench_mermaid(context):
+    visualizer = quiet_visualizer()
+    visualizer.generate_mermaid_diagram(context['graph'], context['root'])
+
+
+def bench_svg(context):
+    renderer = SvgLayoutRenderer(context['graph'], context['root'])
+    with open(os.devnull, 'w', encoding='utf-8') as f:
+        for chunk in renderer.iter_svg():
+            f.write(chunk)
+
+
+def bench_load(context):
+    visualizer = quiet_visualizer()
+    visualizer.get_repository(context['repo_path'])
+
+
+def bench_registry(context):
+    visualizer = quiet_visualizer()
+    visualizer.registry_url = context['registry_url']
+    visualizer.prefetch_dependencies(context['root'], context['registry_url'], False, '', context['jobs'])
+    visualizer.build_dependency_graph_dfs(context['root'], context['registry_url'], False)
+    visualizer.registry_client.close()
+
+
+MODES = {
+    'load': bench_load,
+    'dfs': bench_dfs,
+    'reverse': bench_reverse,
+    'mermaid': bench_mermaid,
+    'svg': bench_svg,
+    'registry': bench_registry,
+}
+
+# Режимы, которые по умолчанию не запускаются на больших графах (HTTP на каждый пакет, укладка)
+MODE_SIZE_LIMITS = {
+    'registry': 10000,
+    'svg': 100000,
+}
+
+
+def measure(function, context, repeat, track_memory):
+    """Минимальное время из repeat запусков и пиковая память по tracemalloc
+
+    Память измеряется отдельным запуском: tracemalloc замедляет выделения и
+    исказил бы время.
+    """
+    peak_memory = None
+    timings = []
+    stdout = sys.stdout
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        sys.stdout = devnull
+        try:
+            if track_memory:
+                gc.collect()
+                tracemalloc.start()
+                try:
+                    function(context)
+                    peak_memory = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+
+            for _ in range(repeat):
+                gc.collect()
+                started = time.perf_counter()
+                function(context)
+                timings.append(time.perf_counter() - started)
+        finally:
+            sys.stdout = stdout
+
+    return min(timings), peak_memory
+
+
+def parse_sizes(text):
+    """Размеры графов через запятую: '100,1e4,1000000'"""
+    try:
+        return [int(float(part)) for part in text.split(',') if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Некорректный список размеров: '{text}'")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Бенчмарки инструмента визуализации графа зависимостей')
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes('100,1000,10000'),
+                        help='Размеры графов через запятую (от 1e2 до 1e6)')
+    parser.add_argument('--generators', type=str, default=','.join(GENERATORS),
+                        help=f"Генераторы графов через запятую: {', '.join(GENERATORS)}")
+    parser.add_argument('--modes', type=str, default=','.join(MODES),
+                        help=f"Замеряемые режимы через запятую: {', '.join(MODES)}")
+    parser.add_argument('--seed', type=int, default=42, help='Seed генераторов случайных графов')
+    parser.add_argument('--repeat', type=int, default=3, help='Число повторов замера (берется минимум)')
+    parser.add_argument('--jobs', type=int, default=8, help='Число потоков загрузки в режиме registry')
+    parser.add_argument('--registry-latency', type=float, default=0.0,
+                        help='Задержка ответа тестового реестра, мс')
+    parser.add_argument('--no-memory', action='store_true', help='Не измерять пиковую память (tracemalloc)')
+    parser.add_argument('--no-limits', action='store_true',
+                        help='Запускать режимы registry и svg на графах любого размера')
+    parser.add_argument('--output', type=str, default='benchmark_results.json',
+                        help='Файл результатов в формате JSON')
+    parser.add_argument('--baseline', type=str, default='',
+                        help='Файл результатов предыдущего запуска для поиска регрессий')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Допустимое относительное ухудшение времени и памяти относительно baseline')
+    return parser.parse_args()
+
+
+def validate_arguments(args):
+    errors = []
+    for name in args.generators.split(','):
+        if name not in GENERATORS:
+            errors.append(f"Неизвестный генератор: '{name}'")
+    for name in args.modes.split(','):
+        if name not in MODES:
+            errors.append(f"Неизвестный режим: '{name}'")
+    if any(size < 2 for size in args.sizes):
+        errors.append("Размер графа должен быть не меньше 2")
+    if args.repeat < 1:
+        errors.append("Число повторов должно быть не меньше 1")
+    if args.jobs < 1:
+        errors.append("Число потоков должно быть не меньше 1")
+    if args.tolerance < 0:
+        errors.append("Допуск не может быть отрицательным")
+    return errors
+
+
+def find_regressions(results, baseline_file, tolerance):
+    """Замеры, ставшие медленнее или тяжелее baseline больше чем на tolerance"""
+    try:
+        with open(baseline_file, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise Exception(f"Не удалось прочитать baseline '{baseline_file}': {e}")
+
+    previous = {(record['generator'], record['nodes'], record['mode']): record
+                for record in baseline.get('results', [])}
+    regressions = []
+    for record in results:
+        old = previous.get((record['generator'], record['nodes'], record['mode']))
+        if old is None:
+            continue
+        for metric in ('seconds', 'peak_memory_bytes'):
+            if record.get(metric) and old.get(metric) and record[metric] > old[metric] * (1 + tolerance):
+                regressions.append({
+                    'generator': record['generator'],
+                    'nodes': record['nodes'],
+                    'mode': record['mode'],
+                    'metric': metric,
+                    'baseline': old[metric],
+                    'current': record[metric],
+                    'ratio': round(record[metric] / old[metric], 3),
+                })
+    return regressions
+
+
+def run_case(generator_name, size, modes, args, temp_dir):
+    """Все режимы для одного сгенерированного графа"""
+    rng = random.Random(f"{args.seed}:{generator_name}:{size}")
+    graph = GENERATORS[generator_name](size, rng)
+    edges = sum(len(dependencies) for dependencies in graph.values())
+
+    repo_path = os.path.join(temp_dir, f"{generator_name}_{size}.json")
+    with open(repo_path, 'w', encoding='utf-8') as f:
+        json.dump(to_repository(graph), f)
+
+    # Индекс и граф для режимов, не замеряющих загрузку и обход
+    setup = quiet_visualizer()
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            repository = setup.get_repository(repo_path)
+            built_graph, _ = setup.build_dependency_graph_dfs(package_name(0), repo_path, True)
+        finally:
+            sys.stdout = stdout
+
+    # Цель обратного поиска - самая популярная библиотека графа
+    in_degree = {}
+    for dependencies in graph.values():
+        for dep in dependencies:
+            in_degree[dep] = in_degree.get(dep, 0) + 1
+    target = max(in_degree, key=lambda name: (in_degree[name], name)) if in_degree else package_name(0)
+
+    context = {
+        'root': package_name(0),
+        'target': target,
+        'repo_path': repo_path,
+        'repository': repository,
+        'graph': built_graph,
+        'jobs': args.jobs,
+    }
+
+    results = []
+    for mode in modes:
+        limit = MODE_SIZE_LIMITS.get(mode)
+        if limit is not None and size > limit and not args.no_limits:
+            print(f"   ⏭️ {mode}: пропущен (больше {limit} пакетов, см. --no-limits)")
+            continue
+
+        if mode == 'registry':
+            with FakeRegistry(graph, args.registry_latency / 1000) as registry:
+                context['registry_url'] = registry.url
+                seconds, peak_memory = measure(MODES[mode], context, args.repeat, not args.no_memory)
+        else:
+            seconds, peak_memory = measure(MODES[mode], context, args.repeat, not args.no_memory)
+
+        record = {
+            'generator': generator_name,
+            'nodes': size,
+            'edges': edges,
+            'mode': mode,
+            'seconds': round(seconds, 6),
+            'nodes_per_second': round(size / seconds, 1) if seconds else None,
+            'peak_memory_bytes': peak_memory,
+        }
+        results.append(record)
+        memory = f", {peak_memory / 1024 / 1024:.1f} МБ" if peak_memory is not None else ""
+        print(f"   ⏱️ {mode}: {seconds * 1000:.1f} мс{memory}")
+
+    os.remove(repo_path)
+    return results
+
+
+def main():
+    args = parse_arguments()
+    errors = validate_arguments(args)
+    if errors:
+        print("❌ Ошибки валидации:")
+        for error in errors:
+            print(f"   - {error}")
+        sys.exit(1)
+
+    generators = args.generators.split(',')
+    modes = args.modes.split(',')
+    results = []
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for generator_name in generators:
+                for size in args.sizes:
+                    print(f"📦 {generator_name}: {size} пакетов")
+                    results.extend(run_case(generator_name, size, modes, args, temp_dir))
+
+        report = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'seed': args.seed,
+                'repeat': args.repeat,
+                'jobs': args.jobs,
+                'registry_latency_ms': args.registry_latency,
+            },
+            'results': results,
+        }
+
+        regressions = []
+        if args.baseline:
+            regressions = find_regressions(results, args.baseline, args.tolerance)
+            report['regressions'] = regressions
+
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Результаты сохранены: {args.output}")
+
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        sys.exit(1)
+
+    if regressions:
+        print(f"❌ Регрессии относительно {args.baseline}:")
+        for regression in regressions:
+            print(f"   - {regression['generator']}/{regression['nodes']}/{regression['mode']}: "
+                  f"{regression['metric']} x{regression['ratio']}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
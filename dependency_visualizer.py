@@ -5,233 +5,3771 @@
 """
 
 import argparse
+import asyncio
+import csv
 import sys
 import os
+import re
 import json
-import urllib.request
-import urllib.error
+import hashlib
+import fnmatch
+import mmap
+import struct
+import urllib.parse
+import http.client
+import gzip
+import zlib
+import io
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 import subprocess
 import tempfile
+from xml.sax.saxutils import escape
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager, redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:
+    # На Windows модуля resource нет, пиковая память измеряется через tracemalloc
+    resource = None
+
+
+DEFAULT_REGISTRY_URL = 'https://registry.npmjs.org'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'dependency_visualizer')
+
+
+def trim_packument(package_info):
+    """Сокращение packument'а до используемых полей: dist-tags и dependencies каждой версии"""
+    versions = {}
+    for version, version_info in (package_info.get('versions') or {}).items():
+        dependencies = version_info.get('dependencies') if isinstance(version_info, dict) else None
+        versions[version] = {'dependencies': dependencies or {}}
+
+    return {
+        'name': package_info.get('name'),
+        'dist-tags': package_info.get('dist-tags') or {},
+        'versions': versions,
+    }
+
+
+def dependency_hash(dependencies):
+    """Хэш содержимого словаря зависимостей пакета (не зависит от порядка ключей)"""
+    canonical = json.dumps(dependencies or {}, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=8).hexdigest()
+
+
+SEMVER_PATTERN = re.compile(
+    r'^v?(\d+)\.(\d+)\.(\d+)(?:-([0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$'
+)
+PARTIAL_VERSION_PATTERN = re.compile(
+    r'^v?(\d+|[xX*])(?:\.(\d+|[xX*]))?(?:\.(\d+|[xX*]))?(?:-([0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$'
+)
+COMPARATOR_PATTERN = re.compile(r'^(<=|>=|<|>|=|\^|~>?)?(.*)$')
+
+
+def prerelease_key(prerelease):
+    """Ключ сравнения предрелиза: числовые части меньше буквенных"""
+    return tuple((0, int(part), '') if part.isdigit() else (1, 0, part) for part in prerelease.split('.'))
+
+
+def parse_version(text):
+    """Ключ сравнения версии semver или None, если строка не является версией
+
+    Ключ (major, minor, patch, 1, ()) у релиза больше ключа любого его предрелиза
+    (major, minor, patch, 0, (...)); (major, minor, patch, 0, ()) меньше всех предрелизов.
+    """
+    match = SEMVER_PATTERN.match(text.strip())
+    if not match:
+        return None
+    major, minor, patch, prerelease = match.groups()
+    if prerelease:
+        return (int(major), int(minor), int(patch), 0, prerelease_key(prerelease))
+    return (int(major), int(minor), int(patch), 1, ())
+
+
+def split_package_spec(spec):
+    """Разбор 'имя@версия' (с учетом scoped-пакетов '@scope/имя@версия')"""
+    index = spec.rfind('@')
+    if index > 0:
+        return spec[:index], spec[index + 1:]
+    return spec, None
+
+
+class SemverRange:
+    """Диапазон версий npm: объединение (||) наборов ограничений снизу и сверху
+
+    Каждый набор хранится как (нижняя граница, включительно, верхняя граница,
+    включительно, кортежи версий с разрешенными предрелизами).
+    """
+
+    def __init__(self, comparator_sets):
+        self.comparator_sets = comparator_sets
+
+    @classmethod
+    def parse(cls, text):
+        """Разбор диапазона; None для нестандартных значений (теги, URL, git)"""
+        comparator_sets = []
+        for part in text.split('||'):
+            comparator_set = cls.parse_comparator_set(part.strip())
+            if comparator_set is None:
+                return None
+            comparator_sets.append(comparator_set)
+        return cls(comparator_sets)
+
+    @staticmethod
+    def parse_partial(text):
+        """(major, minor, patch, prerelease) с None для пропущенных и x-частей"""
+        match = PARTIAL_VERSION_PATTERN.match(text)
+        if not match:
+            return None
+        parts = [None if part is None or part in 'xX*' else int(part) for part in match.groups()[:3]]
+        # После x-части остальные части тоже считаются x: 1.x.3 == 1.x
+        for index in range(1, 3):
+            if parts[index - 1] is None:
+                parts[index] = None
+        return parts[0], parts[1], parts[2], match.group(4)
+
+    @classmethod
+    def parse_comparator_set(cls, text):
+        bounds = []
+
+        hyphen = re.match(r'^(\S+)\s+-\s+(\S+)$', text)
+        if hyphen:
+            lower = cls.parse_partial(hyphen.group(1))
+            upper = cls.parse_partial(hyphen.group(2))
+            if lower is None or upper is None:
+                return None
+            bounds.extend(cls.comparator_bounds('>=', lower))
+            bounds.extend(cls.comparator_bounds('<=', upper))
+        else:
+            # Оператор может быть отделен от версии пробелом: '>= 1.2.3'
+            text = re.sub(r'(<=|>=|<|>|=|\^|~>?)\s+', r'\1', text)
+            for token in text.split() or ['*']:
+                operator, version_text = COMPARATOR_PATTERN.match(token).groups()
+                version = cls.parse_partial(version_text or '*')
+                if version is None:
+                    return None
+                bounds.extend(cls.comparator_bounds(operator or '', version))
+
+        lower, lower_inclusive, upper, upper_inclusive = None, True, None, True
+        prereleases = set()
+        for operator, key in bounds:
+            if key[3] == 0 and key[4]:
+                prereleases.add(key[:3])
+            if operator in ('>=', '>'):
+                if lower is None or key > lower or (key == lower and operator == '>'):
+                    lower, lower_inclusive = key, operator == '>='
+            else:
+                if upper is None or key < upper or (key == upper and operator == '<'):
+                    upper, upper_inclusive = key, operator == '<='
+
+        return lower, lower_inclusive, upper, upper_inclusive, prereleases
+
+    @staticmethod
+    def comparator_bounds(operator, version):
+        """Границы [(оператор, ключ)] для одного ограничения по правилам npm semver"""
+        major, minor, patch, prerelease = version
+        if operator == '~>':
+            operator = '~'
+
+        def key(major_part, minor_part=0, patch_part=0, pre=None):
+            if pre is None:
+                return (major_part, minor_part, patch_part, 1, ())
+            return (major_part, minor_part, patch_part, 0, pre)
+
+        # Минимальный ключ для кортежа: меньше всех его предрелизов ("-0" в npm)
+        def floor(major_part, minor_part=0, patch_part=0):
+            return (major_part, minor_part, patch_part, 0, ())
+
+        exact = key(major or 0, minor or 0, patch or 0, prerelease_key(prerelease) if prerelease else None)
+
+        if major is None:
+            if operator in ('<', '>'):
+                # '<*' и '>*' не допускают ни одной версии
+                return [('<', floor(0))]
+            return []
+
+        if operator in ('', '='):
+            if patch is not None:
+                return [('>=', exact), ('<=', exact)]
+            if minor is not None:
+                return [('>=', floor(major, minor)), ('<', floor(major, minor + 1))]
+            return [('>=', floor(major)), ('<', floor(major + 1))]
+
+        if operator == '~':
+            if minor is None:
+                return [('>=', exact), ('<', floor(major + 1))]
+            return [('>=', exact), ('<', floor(major, minor + 1))]
+
+        if operator == '^':
+            if major > 0 or minor is None:
+                return [('>=', exact), ('<', floor(major + 1))]
+            if minor > 0 or patch is None:
+                return [('>=', exact), ('<', floor(0, minor + 1))]
+            return [('>=', exact), ('<', floor(0, 0, patch + 1))]
+
+        if operator == '>':
+            if patch is not None:
+                return [('>', exact)]
+            if minor is not None:
+                return [('>=', floor(major, minor + 1))]
+            return [('>=', floor(major + 1))]
+
+        if operator == '>=':
+            return [('>=', exact if patch is not None else floor(major, minor or 0))]
+
+        if operator == '<':
+            return [('<', exact if patch is not None else floor(major, minor or 0))]
+
+        # '<='
+        if patch is not None:
+            return [('<=', exact)]
+        if minor is not None:
+            return [('<', floor(major, minor + 1))]
+        return [('<', floor(major + 1))]
+
+
+class VersionIndex:
+    """Отсортированные версии пакета: поиск максимальной подходящей версии бисекцией"""
+
+    def __init__(self, versions):
+        parsed = sorted((parse_version(version), version) for version in versions
+                        if parse_version(version) is not None)
+        self.keys = [key for key, _ in parsed]
+        self.versions = [version for _, version in parsed]
+
+    def latest(self):
+        """Максимальная версия (релизы предпочтительнее предрелизов)"""
+        for index in range(len(self.keys) - 1, -1, -1):
+            if self.keys[index][3] == 1:
+                return self.versions[index]
+        return self.versions[-1] if self.versions else None
+
+    def max_satisfying(self, version_range):
+        """Максимальная версия, удовлетворяющая диапазону, или None"""
+        best = None
+        for lower, lower_inclusive, upper, upper_inclusive, prereleases in version_range.comparator_sets:
+            if upper is None:
+                index = len(self.keys)
+            elif upper_inclusive:
+                index = bisect_right(self.keys, upper)
+            else:
+                index = bisect_left(self.keys, upper)
+
+            # Обычно подходит первая же версия ниже верхней границы; пропускаются
+            # только предрелизы, не упомянутые в диапазоне явно
+            for position in range(index - 1, -1, -1):
+                key = self.keys[position]
+                if lower is not None and (key < lower or (key == lower and not lower_inclusive)):
+                    break
+                if key[3] == 0 and key[:3] not in prereleases:
+                    continue
+                if best is None or key > self.keys[best]:
+                    best = position
+                break
+
+        return self.versions[best] if best is not None else None
+
+
+def strongly_connected_components(graph):
+    """Компоненты сильной связности графа (итеративный алгоритм Тарьяна, O(V+E))
+
+    Компоненты возвращаются в обратном топологическом порядке: каждая компонента
+    идет раньше компонент, которые от нее зависят.
+    """
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    components = []
+    counter = 0
+
+    for root in graph:
+        if root in index:
+            continue
+
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph.get(root) or ()))]
+
+        while work:
+            node, dependencies = work[-1]
+            for dep in dependencies:
+                if dep not in index:
+                    index[dep] = lowlink[dep] = counter
+                    counter += 1
+                    stack.append(dep)
+                    on_stack.add(dep)
+                    work.append((dep, iter(graph.get(dep) or ())))
+                    break
+                elif dep in on_stack:
+                    lowlink[node] = min(lowlink[node], index[dep])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    return components
+
+
+def find_cycle_groups(graph):
+    """Группы циклических зависимостей: компоненты из нескольких пакетов или с петлей
+
+    Пакеты каждой группы и сами группы упорядочены по порядку пакетов в графе.
+    """
+    order = {package: position for position, package in enumerate(graph)}
+    groups = []
+    for component in strongly_connected_components(graph):
+        if len(component) == 1:
+            package = component[0]
+            if package not in (graph.get(package) or ()):
+                continue
+        component.sort(key=lambda package: order.get(package, len(order)))
+        groups.append(component)
+
+    groups.sort(key=lambda component: order.get(component[0], len(order)))
+    return groups
+
+
+def cycle_path(graph, component):
+    """Кратчайший цикл через первый пакет группы в виде пути [A, B, ..., A]"""
+    start = component[0]
+    members = set(component)
+    parent = {}
+    queue = deque([start])
+
+    while queue:
+        current_package = queue.popleft()
+        for dep in graph.get(current_package) or ():
+            if dep == start:
+                path = [start]
+                node = current_package
+                while node != start:
+                    path.append(node)
+                    node = parent[node]
+                path.append(start)
+                path[1:-1] = reversed(path[1:-1])
+                return path
+            if dep in members and dep not in parent:
+                parent[dep] = current_package
+                queue.append(dep)
+
+    return [start, start]
+
+
+class InternedGraph(Mapping):
+    """Граф зависимостей с интернированными именами пакетов и смежностью в формате CSR
+
+    Каждое имя хранится один раз и получает целочисленный id. Списки зависимостей
+    раскрытых пакетов лежат подряд в буфере targets, границы строк - в offsets.
+    Для совместимости граф ведет себя как словарь {пакет: [зависимости]} только
+    для чтения: ключи - раскрытые пакеты в порядке добавления.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        # id -> номер строки CSR (-1, если пакет не раскрыт)
+        self.rows = array('i')
+        # номер строки -> id пакета
+        self.row_nodes = array('I')
+        self.offsets = array('I', [0])
+        self.targets = array('I')
+        self.reverse_offsets = None
+        self.reverse_targets = None
+
+    @classmethod
+    def from_dict(cls, graph):
+        """Построение из словаря {пакет: [зависимости]}"""
+        interned = cls()
+        for package, dependencies in graph.items():
+            interned.add_package(package, dependencies)
+        return interned
+
+    def intern(self, name):
+        """id пакета (новое имя получает следующий свободный id)"""
+        node_id = self.ids.get(name)
+        if node_id is None:
+            node_id = len(self.names)
+            self.ids[name] = node_id
+            self.names.append(name)
+            self.rows.append(-1)
+        return node_id
+
+    def add_package(self, name, dependencies):
+        """Добавление строки смежности раскрытого пакета"""
+        node_id = self.intern(name)
+        if self.rows[node_id] != -1:
+            raise Exception(f"Пакет '{name}' уже добавлен в граф")
+
+        self.targets.extend(self.intern(dep) for dep in dependencies)
+        self.rows[node_id] = len(self.row_nodes)
+        self.row_nodes.append(node_id)
+        self.offsets.append(len(self.targets))
+        self.reverse_offsets = self.reverse_targets = None
+        return node_id
+
+    @property
+    def node_count(self):
+        return len(self.names)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def is_expanded(self, node_id):
+        return self.rows[node_id] != -1
+
+    def dependency_ids(self, node_id):
+        """id прямых зависимостей пакета"""
+        row = self.rows[node_id]
+        if row == -1:
+            return ()
+        return self.targets[self.offsets[row]:self.offsets[row + 1]]
+
+    def build_reverse(self):
+        """Обратный CSR по всем id: сортировка подсчетом за O(V+E)"""
+        counts = array('I', bytes(4 * (len(self.names) + 1)))
+        for target in self.targets:
+            counts[target + 1] += 1
+        for node_id in range(len(self.names)):
+            counts[node_id + 1] += counts[node_id]
+
+        positions = array('I', counts)
+        reverse_targets = array('I', bytes(4 * len(self.targets)))
+        for row, node_id in enumerate(self.row_nodes):
+            for index in range(self.offsets[row], self.offsets[row + 1]):
+                target = self.targets[index]
+                reverse_targets[positions[target]] = node_id
+                positions[target] += 1
+
+        self.reverse_offsets = counts
+        self.reverse_targets = reverse_targets
+
+    def dependent_ids(self, node_id):
+        """id пакетов, непосредственно зависящих от пакета"""
+        if self.reverse_offsets is None:
+            self.build_reverse()
+        return self.reverse_targets[self.reverse_offsets[node_id]:self.reverse_offsets[node_id + 1]]
+
+    def dependents(self, name):
+        """Имена пакетов, непосредственно зависящих от пакета"""
+        node_id = self.ids.get(name)
+        if node_id is None:
+            return []
+        return [self.names[dependent] for dependent in self.dependent_ids(node_id)]
+
+    def reverse_view(self):
+        """Обратный граф в виде словаря {пакет: [зависимые пакеты]} только для чтения"""
+        return ReverseGraphView(self)
+
+    def __getitem__(self, name):
+        node_id = self.ids.get(name)
+        if node_id is None or self.rows[node_id] == -1:
+            raise KeyError(name)
+        names = self.names
+        return [names[dep] for dep in self.dependency_ids(node_id)]
+
+    def __contains__(self, name):
+        node_id = self.ids.get(name)
+        return node_id is not None and self.rows[node_id] != -1
+
+    def __iter__(self):
+        names = self.names
+        return (names[node_id] for node_id in self.row_nodes)
+
+    def __len__(self):
+        return len(self.row_nodes)
+
+
+class ReverseGraphView(Mapping):
+    """Обратное представление InternedGraph: пакет -> пакеты, которые от него зависят"""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, name):
+        if name not in self.graph.ids:
+            raise KeyError(name)
+        return self.graph.dependents(name)
+
+    def __contains__(self, name):
+        return name in self.graph.ids
+
+    def __iter__(self):
+        return iter(self.graph.names)
+
+    def __len__(self):
+        return len(self.graph.names)
+
+
+class SnapshotNames:
+    """Таблица имен снимка: имена декодируются из mmap по требованию"""
+
+    def __init__(self, name_offsets, blob):
+        self.name_offsets = name_offsets
+        self.blob = blob
+
+    def __getitem__(self, node_id):
+        start = self.name_offsets[node_id]
+        return str(self.blob[start:self.name_offsets[node_id + 1]], 'utf-8')
+
+    def __len__(self):
+        return len(self.name_offsets) - 1
+
+    def __iter__(self):
+        return (self[node_id] for node_id in range(len(self)))
+
+    def encoded(self, node_id):
+        return self.blob[self.name_offsets[node_id]:self.name_offsets[node_id + 1]].tobytes()
+
+
+class SnapshotIds(Mapping):
+    """Отображение имя -> id снимка: бинарный поиск по таблице id, упорядоченной по имени
+
+    Сравниваются байты имен прямо в mmap, поэтому поиск не декодирует всю
+    таблицу имен. Найденные id запоминаются. Снимки первой версии не содержат
+    упорядоченной таблицы, для них словарь строится при первом поиске.
+    """
+
+    def __init__(self, names, sorted_ids=None):
+        self.names = names
+        self.sorted_ids = sorted_ids
+        self.found = None if sorted_ids is None else {}
+
+    def find(self, name):
+        key = name.encode('utf-8')
+        sorted_ids = self.sorted_ids
+        low, high = 0, len(sorted_ids)
+        while low < high:
+            middle = (low + high) // 2
+            if self.names.encoded(sorted_ids[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(sorted_ids) and self.names.encoded(sorted_ids[low]) == key:
+            return sorted_ids[low]
+        return None
+
+    def __getitem__(self, name):
+        if self.found is None:
+            self.found = {package: node_id for node_id, package in enumerate(self.names)}
+        node_id = self.found.get(name)
+        if node_id is None and self.sorted_ids is not None and isinstance(name, str):
+            node_id = self.find(name)
+            if node_id is not None:
+                self.found[name] = node_id
+        if node_id is None:
+            raise KeyError(name)
+        return node_id
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+
+class GraphSnapshot(InternedGraph):
+    """Граф, открытый из бинарного снимка через mmap
+
+    Буферы CSR - это memoryview поверх отображенного файла, поэтому смежность
+    читается без копирования и разбора. Поиск id по имени идет бинарным
+    поиском по таблице id, упорядоченной по байтам имен (SnapshotIds).
+
+    Формат файла (little-endian): заголовок MAGIC, версия, число пакетов, число
+    раскрытых пакетов, число ребер, размер таблицы имен, id корня; затем массивы
+    name_offsets, rows, row_nodes, offsets, targets, sorted_ids (с версии 2) и
+    байты имен в UTF-8.
+    """
+
+    MAGIC = b'DVGS'
+    VERSION = 2
+    HEADER = struct.Struct('<4sIIIIIi4x')
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        try:
+            with open(file_path, 'rb') as f:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            raise Exception(f"Файл снимка '{file_path}' не найден")
+        except ValueError:
+            raise Exception(f"Файл снимка '{file_path}' пуст")
+
+        self.buffer = buffer = memoryview(self.mmap)
+        if len(buffer) < self.HEADER.size:
+            raise Exception(f"Файл '{file_path}' не является снимком графа")
+
+        magic, version, node_count, row_count, edge_count, names_size, root_id = \
+            self.HEADER.unpack_from(buffer)
+        if magic != self.MAGIC:
+            raise Exception(f"Файл '{file_path}' не является снимком графа")
+        if version not in (1, self.VERSION):
+            raise Exception(f"Неподдерживаемая версия снимка графа: {version}")
+        if sys.byteorder != 'little':
+            raise Exception("Снимки графа поддерживаются только на little-endian платформах")
+
+        position = self.HEADER.size
+
+        def section(typecode, count):
+            nonlocal position
+            size = 4 * count
+            view = buffer[position:position + size].cast(typecode)
+            position += size
+            return view
+
+        name_offsets = section('I', node_count + 1)
+        self.rows = section('i', node_count)
+        self.row_nodes = section('I', row_count)
+        self.offsets = section('I', row_count + 1)
+        self.targets = section('I', edge_count)
+        sorted_ids = section('I', node_count) if version >= 2 else None
+        if position + names_size > len(buffer):
+            raise Exception(f"Файл снимка '{file_path}' поврежден")
+
+        self.names = SnapshotNames(name_offsets, buffer[position:position + names_size])
+        self.root = self.names[root_id] if root_id >= 0 else None
+        self.ids = SnapshotIds(self.names, sorted_ids)
+        self.reverse_offsets = None
+        self.reverse_targets = None
+
+    def intern(self, name):
+        raise Exception("Снимок графа доступен только для чтения")
+
+    def add_package(self, name, dependencies):
+        raise Exception("Снимок графа доступен только для чтения")
+
+    @classmethod
+    def write(cls, graph, file_path, root=None):
+        """Сохранение графа в бинарный снимок"""
+        if not isinstance(graph, InternedGraph):
+            graph = InternedGraph.from_dict(graph)
+
+        encoded_names = [name.encode('utf-8') for name in graph.names]
+        name_offsets = array('I', [0])
+        for encoded in encoded_names:
+            name_offsets.append(name_offsets[-1] + len(encoded))
+        sorted_ids = array('I', sorted(range(len(encoded_names)), key=encoded_names.__getitem__))
+
+        root_id = graph.ids.get(root, -1) if root is not None else -1
+        header = cls.HEADER.pack(
+            cls.MAGIC, cls.VERSION, graph.node_count, len(graph.row_nodes),
+            graph.edge_count, name_offsets[-1], root_id
+        )
+
+        temp_path = file_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(header)
+            for section in (name_offsets, array('i', graph.rows), array('I', graph.row_nodes),
+                            array('I', graph.offsets), array('I', graph.targets), sorted_ids):
+                f.write(section.tobytes())
+            for encoded in encoded_names:
+                f.write(encoded)
+        os.replace(temp_path, file_path)
+
+    def close(self):
+        """Освобождение буферов и отображения файла"""
+        views = [self.names.name_offsets, self.names.blob, self.rows,
+                 self.row_nodes, self.offsets, self.targets]
+        if self.ids.sorted_ids is not None:
+            views.append(self.ids.sorted_ids)
+        for view in views + [self.buffer]:
+            view.release()
+        self.mmap.close()
+
+
+class SvgLayoutRenderer:
+    """Отрисовка графа в SVG без внешних программ (послойная укладка в стиле Сугиямы)
+
+    Этапы: удаление обратных ребер циклов, разбиение на слои по длиннейшему пути,
+    уменьшение пересечений ребер методом барицентров, расстановка координат.
+    Фиктивные узлы для длинных ребер не создаются: такие ребра огибают слои
+    сбоку, что сохраняет линейный размер укладки на больших графах.
+    """
+
+    NODE_HEIGHT = 36
+    LAYER_GAP = 80
+    NODE_GAP = 24
+    CHAR_WIDTH = 7.5
+    NODE_PADDING = 24
+    MARGIN = 20
+    SWEEPS = 4
+
+    # Цвета совпадают со стилями classDef в Mermaid коде
+    STYLES = {
+        'root': ('#e1f5fe', '#01579b', 2),
+        'leaf': ('#f3e5f5', '#4a148c', 1),
+        'node': ('#e8f5e8', '#1b5e20', 1),
+        'truncated': ('#fff3e0', '#e65100', 1),
+    }
+
+    def __init__(self, graph, start_package, truncated=()):
+        if not isinstance(graph, InternedGraph):
+            graph = InternedGraph.from_dict(graph)
+        self.graph = graph
+        self.start_id = graph.ids.get(start_package)
+        # id пакетов, не раскрытых из-за ограничений обхода
+        self.truncated_ids = {graph.ids[name] for name in truncated if name in graph.ids}
+
+        # Отрисовываются только раскрытые пакеты, как и в Mermaid коде
+        self.nodes = list(graph.row_nodes)
+        self.edges = []
+        for node_id in self.nodes:
+            for dep in graph.dependency_ids(node_id):
+                if graph.is_expanded(dep) and dep != node_id:
+                    self.edges.append((node_id, dep))
+        self.edges = list(dict.fromkeys(self.edges))
+
+    def break_cycles(self):
+        """Множество обратных ребер итеративного DFS: без них граф ациклический"""
+        successors = {node_id: [] for node_id in self.nodes}
+        for source, target in self.edges:
+            successors[source].append(target)
+
+        state = {}
+        back_edges = set()
+        roots = [self.start_id] if self.start_id in successors else []
+        for root in roots + self.nodes:
+            if root in state:
+                continue
+            state[root] = 1
+            work = [(root, iter(successors[root]))]
+            while work:
+                node, targets = work[-1]
+                for target in targets:
+                    if target not in state:
+                        state[target] = 1
+                        work.append((target, iter(successors[target])))
+                        break
+                    if state[target] == 1:
+                        back_edges.add((node, target))
+                else:
+                    state[node] = 2
+                    work.pop()
+
+        return back_edges
+
+    def assign_layers(self, dag_edges):
+        """Слои по длиннейшему пути: пакет ниже всех пакетов, которые от него зависят"""
+        successors = {node_id: [] for node_id in self.nodes}
+        in_degree = dict.fromkeys(self.nodes, 0)
+        for source, target in dag_edges:
+            successors[source].append(target)
+            in_degree[target] += 1
+
+        layer = dict.fromkeys(self.nodes, 0)
+        queue = deque(node_id for node_id in self.nodes if in_degree[node_id] == 0)
+        while queue:
+            node = queue.popleft()
+            for target in successors[node]:
+                layer[target] = max(layer[target], layer[node] + 1)
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    queue.append(target)
+
+        return layer
+
+    def order_layers(self, layer, dag_edges):
+        """Порядок пакетов в слоях: проходы барицентров вниз и вверх"""
+        layers = [[] for _ in range(max(layer.values(), default=0) + 1)]
+        for node_id in self.nodes:
+            layers[layer[node_id]].append(node_id)
+
+        parents = {node_id: [] for node_id in self.nodes}
+        children = {node_id: [] for node_id in self.nodes}
+        for source, target in dag_edges:
+            parents[target].append(source)
+            children[source].append(target)
+
+        position = {}
+
+        def update_positions():
+            # Позиция нормируется шириной слоя, чтобы слои разной ширины были сравнимы
+            for nodes in layers:
+                width = max(len(nodes) - 1, 1)
+                for index, node_id in enumerate(nodes):
+                    position[node_id] = index / width
+
+        def barycenter(node_id, neighbours):
+            if not neighbours[node_id]:
+                return position[node_id]
+            return sum(position[other] for other in neighbours[node_id]) / len(neighbours[node_id])
+
+        update_positions()
+        for sweep in range(self.SWEEPS):
+            neighbours, sequence = (parents, layers[1:]) if sweep % 2 == 0 else (children, layers[-2::-1])
+            for nodes in sequence:
+                nodes.sort(key=lambda node_id: barycenter(node_id, neighbours))
+                width = max(len(nodes) - 1, 1)
+                for index, node_id in enumerate(nodes):
+                    position[node_id] = index / width
+
+        return layers
+
+    def node_width(self, node_id):
+        return len(self.graph.names[node_id]) * self.CHAR_WIDTH + self.NODE_PADDING
+
+    def layout(self):
+        """Координаты центров пакетов и ширина/высота изображения"""
+        back_edges = self.break_cycles()
+        dag_edges = [(s, t) if (s, t) not in back_edges else (t, s) for s, t in self.edges]
+        layer = self.assign_layers(dag_edges)
+        layers = self.order_layers(layer, dag_edges)
+
+        widths = [sum(self.node_width(n) for n in nodes) + self.NODE_GAP * max(len(nodes) - 1, 0)
+                  for nodes in layers]
+        # Слева оставляется место для длинных ребер, огибающих слои
+        left = self.MARGIN + self.NODE_GAP * len(layers)
+        image_width = max(widths, default=0) + left + self.MARGIN
+
+        coordinates = {}
+        for index, nodes in enumerate(layers):
+            x = left + (image_width - left - self.MARGIN - widths[index]) / 2
+            y = self.MARGIN + index * (self.NODE_HEIGHT + self.LAYER_GAP) + self.NODE_HEIGHT / 2
+            for node_id in nodes:
+                width = self.node_width(node_id)
+                coordinates[node_id] = (x + width / 2, y)
+                x += width + self.NODE_GAP
+
+        image_height = 2 * self.MARGIN + len(layers) * self.NODE_HEIGHT + max(len(layers) - 1, 0) * self.LAYER_GAP
+        return coordinates, layer, back_edges, image_width, image_height
+
+    def node_class(self, node_id):
+        if node_id == self.start_id:
+            return 'root'
+        if node_id in self.truncated_ids:
+            return 'truncated'
+        if not self.graph.dependency_ids(node_id):
+            return 'leaf'
+        return 'node'
+
+    def edge_paths(self, coordinates, layer, back_edges):
+        """Пути ребер (d-атрибуты SVG) и крайняя правая точка кривых"""
+        half_height = self.NODE_HEIGHT / 2
+        paths = []
+        right = 0
+
+        for source, target in self.edges:
+            x1, y1 = coordinates[source]
+            x2, y2 = coordinates[target]
+            if (source, target) in back_edges:
+                # Ребро цикла идет вверх: рисуется пунктирной дугой справа
+                y1 -= half_height
+                y2 += half_height
+                bend = max(x1, x2) + self.LAYER_GAP / 2
+                paths.append((f'M{x1:.1f},{y1:.1f} C{bend:.1f},{y1:.1f} {bend:.1f},{y2:.1f} {x2:.1f},{y2:.1f}', True))
+                right = max(right, bend)
+                continue
+
+            y1 += half_height
+            y2 -= half_height
+            span = layer[target] - layer[source]
+            if span > 1:
+                # Длинное ребро огибает промежуточные слои сбоку, а не проходит сквозь пакеты
+                bend = min(x1, x2) - self.NODE_GAP * span
+                paths.append((f'M{x1:.1f},{y1:.1f} C{bend:.1f},{y1 + self.LAYER_GAP:.1f} '
+                              f'{bend:.1f},{y2 - self.LAYER_GAP:.1f} {x2:.1f},{y2:.1f}', False))
+            else:
+                middle = (y1 + y2) / 2
+                paths.append((f'M{x1:.1f},{y1:.1f} C{x1:.1f},{middle:.1f} {x2:.1f},{middle:.1f} '
+                              f'{x2:.1f},{y2:.1f}', False))
+
+        return paths, right
+
+    def iter_svg(self):
+        """Строки SVG документа"""
+        coordinates, layer, back_edges, width, height = self.layout()
+        paths, right = self.edge_paths(coordinates, layer, back_edges)
+        width = max(width, right + self.MARGIN)
+        half_height = self.NODE_HEIGHT / 2
+
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        yield (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+               f'viewBox="0 0 {width:.0f} {height:.0f}" font-family="sans-serif" font-size="13">\n')
+        yield ('<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="8" '
+               'markerHeight="8" orient="auto-start-reverse"><path d="M0,0 L10,5 L0,10 z" fill="#333"/>'
+               '</marker></defs>\n')
+        yield '<rect width="100%" height="100%" fill="white"/>\n'
+
+        yield '<g fill="none" stroke="#333" stroke-width="1.2">\n'
+        for path, dashed in paths:
+            dash = ' stroke-dasharray="5,3"' if dashed else ''
+            yield f'<path d="{path}"{dash} marker-end="url(#arrow)"/>\n'
+        yield '</g>\n'
+
+        yield '<g text-anchor="middle" dominant-baseline="central">\n'
+        for node_id in self.nodes:
+            x, y = coordinates[node_id]
+            node_width = self.node_width(node_id)
+            fill, stroke, stroke_width = self.STYLES[self.node_class(node_id)]
+            label = escape(self.graph.names[node_id])
+            yield (f'<rect x="{x - node_width / 2:.1f}" y="{y - half_height:.1f}" width="{node_width:.1f}" '
+                   f'height="{self.NODE_HEIGHT}" rx="5" fill="{fill}" stroke="{stroke}" '
+                   f'stroke-width="{stroke_width}"/>\n')
+            yield f'<text x="{x:.1f}" y="{y:.1f}">{label}</text>\n'
+        yield '</g>\n'
+        yield '</svg>\n'
+
+    def write(self, output_file):
+        """Запись SVG в файл"""
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.writelines(self.iter_svg())
+
+
+class GraphEmitter:
+    """Потоковый вывод графа в текстовых форматах (Mermaid, Graphviz DOT, JSON)
+
+    Строки выдаются генераторами и пишутся прямо в файловый объект, поэтому
+    текст всего графа не собирается в одну строку. Повторные ребра отбрасываются
+    по паре интернированных id.
+    """
+
+    FORMATS = ('mermaid', 'dot', 'json')
+
+    def __init__(self, graph, start_package, truncated=()):
+        if not isinstance(graph, InternedGraph):
+            graph = InternedGraph.from_dict(graph)
+        self.graph = graph
+        self.start_package = start_package
+        self.start_id = graph.ids.get(start_package)
+        # id пакетов, не раскрытых из-за ограничений обхода
+        self.truncated_ids = {graph.ids[name] for name in truncated if name in graph.ids}
+
+    def iter_edges(self):
+        """Уникальные ребра (id пакета, id зависимости) между раскрытыми пакетами"""
+        graph = self.graph
+        for node_id in graph.row_nodes:
+            seen = set()
+            for dep in graph.dependency_ids(node_id):
+                if graph.is_expanded(dep) and dep not in seen:
+                    seen.add(dep)
+                    yield node_id, dep
+
+    def node_class(self, node_id):
+        if not self.graph.dependency_ids(node_id):
+            return 'truncated' if node_id in self.truncated_ids else 'leaf'
+        if node_id == self.start_id:
+            return 'root'
+        return 'node'
+
+    def iter_mermaid(self):
+        """Строки Mermaid кода"""
+        start_package = self.start_package
+        yield "%% Дерево зависимостей для пакета " + start_package + "\n"
+        yield "graph TD\n"
+
+        # Добавляем стартовый пакет с особым стилем
+        yield f"    {start_package.replace('-', '_')}[{start_package}]:::root\n"
+
+        # Идентификатор Mermaid вычисляется один раз для каждого интернированного имени
+        mermaid_ids = [name.replace('-', '_') for name in self.graph.names]
+
+        for node_id, dep in self.iter_edges():
+            yield f"    {mermaid_ids[node_id]} --> {mermaid_ids[dep]}\n"
+
+        # Добавляем стили
+        yield "    \n"
+        yield "    classDef root fill:#e1f5fe,stroke:#01579b,stroke-width:2px\n"
+        yield "    classDef leaf fill:#f3e5f5,stroke:#4a148c,stroke-width:1px\n"
+        yield "    classDef node fill:#e8f5e8,stroke:#1b5e20,stroke-width:1px\n"
+        if self.truncated_ids:
+            yield "    classDef truncated fill:#fff3e0,stroke:#e65100,stroke-width:1px,stroke-dasharray:5 5\n"
+
+        # Применяем стили к листовым и промежуточным узлам
+        for node_id in self.graph.row_nodes:
+            node_class = self.node_class(node_id)
+            if node_class != 'root':
+                yield f"    class {mermaid_ids[node_id]} {node_class}\n"
+
+    def iter_dot(self):
+        """Строки описания графа на языке Graphviz DOT"""
+        names = self.graph.names
+        styles = SvgLayoutRenderer.STYLES
+
+        def quote(name):
+            return '"' + name.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+        yield f"// Дерево зависимостей для пакета {self.start_package}\n"
+        yield "digraph dependencies {\n"
+        yield "    rankdir=TB;\n"
+        yield '    node [shape=box, style="rounded,filled", fontname="sans-serif"];\n'
+
+        for node_id in self.graph.row_nodes:
+            node_class = 'root' if node_id == self.start_id else self.node_class(node_id)
+            fill, stroke, width = styles[node_class]
+            style = ', style="rounded,filled,dashed"' if node_class == 'truncated' else ''
+            yield f'    {quote(names[node_id])} [fillcolor="{fill}", color="{stroke}", penwidth={width}{style}];\n'
+
+        for node_id, dep in self.iter_edges():
+            yield f"    {quote(names[node_id])} -> {quote(names[dep])};\n"
+
+        yield "}\n"
+
+    def iter_json(self):
+        """Список смежности в формате JSON: {"root": ..., "graph": {пакет: [зависимости]}}"""
+        graph = self.graph
+        names = graph.names
+        yield '{"root": ' + json.dumps(self.start_package, ensure_ascii=False) + ', "graph": {'
+
+        for index, node_id in enumerate(graph.row_nodes):
+            dependencies = [names[dep] for dep in dict.fromkeys(graph.dependency_ids(node_id))]
+            separator = ',' if index else ''
+            yield (f'{separator}\n  {json.dumps(names[node_id], ensure_ascii=False)}: '
+                   f'{json.dumps(dependencies, ensure_ascii=False)}')
+
+        yield '\n}'
+        if self.truncated_ids:
+            truncated = [names[node_id] for node_id in graph.row_nodes if node_id in self.truncated_ids]
+            yield ', "truncated": ' + json.dumps(truncated, ensure_ascii=False)
+        yield '}\n'
+
+    def iter_lines(self, output_format):
+        if output_format not in self.FORMATS:
+            raise Exception(f"Неподдерживаемый формат вывода графа: {output_format}")
+        return getattr(self, f'iter_{output_format}')()
+
+    def write(self, output_format, file):
+        """Запись графа в указанном формате в файловый объект"""
+        file.writelines(self.iter_lines(output_format))
+
+
+class PackageFilter:
+    """Фильтр пакетов по спискам шаблонов включения и исключения
+
+    Режим шаблона задается явно префиксом: 'glob:@types/*' - glob по всему имени,
+    're:^eslint-' - регулярное выражение (поиск в имени), без префикса - подстрока
+    (символы *, ? и [ в ней обычные). Все шаблоны списка компилируются в одно
+    регулярное выражение, решение для каждого имени запоминается. Сравнение без
+    учета регистра, версия в узле 'имя@версия' не учитывается.
+    """
+
+    GLOB_PREFIX = 'glob:'
+    REGEX_PREFIX = 're:'
+
+    def __init__(self, include=(), exclude=()):
+        self.include = [pattern for pattern in include if pattern]
+        self.exclude = [pattern for pattern in exclude if pattern]
+        self.include_regex = self.compile(self.include)
+        self.exclude_regex = self.compile(self.exclude)
+        # Имя пакета -> True, если пакет отфильтрован
+        self.verdicts = {}
+
+    @classmethod
+    def compile(cls, patterns):
+        """Одно регулярное выражение для списка шаблонов (None для пустого списка)"""
+        if not patterns:
+            return None
+
+        alternatives = [cls.pattern_regex(pattern) for pattern in patterns]
+        return re.compile('|'.join(f'(?:{alternative})' for alternative in alternatives), re.IGNORECASE)
+
+    @classmethod
+    def pattern_regex(cls, pattern):
+        """Регулярное выражение одного шаблона по его префиксу режима"""
+        if pattern.startswith(cls.GLOB_PREFIX):
+            return '^' + fnmatch.translate(pattern[len(cls.GLOB_PREFIX):])
+        if pattern.startswith(cls.REGEX_PREFIX):
+            expression = pattern[len(cls.REGEX_PREFIX):]
+            try:
+                re.compile(expression)
+            except re.error as e:
+                raise Exception(f"Некорректное регулярное выражение в шаблоне '{pattern}': {e}")
+            return expression
+        return re.escape(pattern)
+
+    def is_filtered(self, package_name):
+        """Нужно ли исключить пакет из обхода"""
+        verdict = self.verdicts.get(package_name)
+        if verdict is None:
+            name = split_package_spec(package_name)[0]
+            verdict = bool(
+                (self.exclude_regex is not None and self.exclude_regex.search(name))
+                or (self.include_regex is not None and not self.include_regex.search(name))
+            )
+            self.verdicts[package_name] = verdict
+        return verdict
+
+    def __bool__(self):
+        return bool(self.include or self.exclude)
+
+    def __str__(self):
+        # Одиночный фильтр --filter выводится как раньше - самой подстрокой
+        if not self.include and len(self.exclude) == 1:
+            return self.exclude[0]
+        parts = [f"+{pattern}" for pattern in self.include] + [f"-{pattern}" for pattern in self.exclude]
+        return ' '.join(parts)
+
+
+def popcount(bits):
+    """Число единичных битов int (int.bit_count появился в Python 3.10)"""
+    return bits.bit_count() if hasattr(bits, 'bit_count') else bin(bits).count('1')
+
+
+class ReachabilityIndex:
+    """Индекс достижимости: «зависит ли A от B» и транзитивные счетчики без обхода графа
+
+    Компоненты сильной связности стягиваются в вершины конденсации; алгоритм
+    Тарьяна выдает их в топологическом порядке от зависимостей к зависящим.
+    Пакеты нумеруются подряд по компонентам, и каждой компоненте строится
+    битовое множество (int) достижимых пакетов: собственный диапазон битов и
+    объединение множеств компонент-зависимостей. Так же по обратным ребрам
+    строятся множества зависящих пакетов. Счетчики вычисляются при построении
+    (O(1) на запрос).
+
+    Полные множества занимают до V^2 / 8 байт на длинных цепочках, поэтому они
+    строятся полосами номеров пакетов: в полосе у каждой компоненты не больше
+    memory_budget * 8 / C бит, и после подсчета единиц полоса освобождается.
+    Пиковая память построения - около memory_budget байт при любом размере
+    графа, время - O(V * (V + E) / 64) операций над словами. Если граф
+    помещается в одну полосу, множества сохраняются и depends_on - проверка
+    одного бита; иначе depends_on обходит конденсацию, не спускаясь в компоненты
+    с номером меньше, чем у искомой (в порядке Тарьяна они ее не достигают).
+    """
+
+    # Бюджет памяти битовых множеств одной полосы, байт
+    MEMORY_BUDGET = 32 * 1024 * 1024
+
+    def __init__(self, graph, memory_budget=None):
+        components = strongly_connected_components(graph)
+        self.component_of = {}
+        self.position = {}
+        position = 0
+        for number, component in enumerate(components):
+            for package in component:
+                self.component_of[package] = number
+                self.position[package] = position
+                position += 1
+
+        self.components = components
+        self.component_count = len(components)
+        self.cyclic = []
+        # Компоненты-зависимости каждой компоненты (номера меньше ее собственного)
+        self.successors = []
+        predecessors = [[] for _ in components]
+        for number, component in enumerate(components):
+            cyclic = len(component) > 1
+            successors = []
+            seen = set()
+            for package in component:
+                for dep in graph.get(package) or ():
+                    other = self.component_of[dep]
+                    if other == number:
+                        cyclic = True
+                    elif other not in seen:
+                        seen.add(other)
+                        successors.append(other)
+                        predecessors[other].append(number)
+            self.successors.append(successors)
+            self.cyclic.append(cyclic)
+
+        starts = []
+        start = 0
+        for component in components:
+            starts.append(start)
+            start += len(component)
+        package_count = start
+
+        budget = memory_budget or self.MEMORY_BUDGET
+        width = max(64, budget * 8 // max(1, len(components)))
+        # Сам пакет в счетчики не входит, даже если лежит на цикле
+        self.dependency_counts = [-1] * len(components)
+        self.dependent_counts = [-1] * len(components)
+        self.forward = None
+        for low in range(0, package_count, width):
+            high = min(low + width, package_count)
+            forward = self.count_stripe(low, high, starts, self.successors, self.dependency_counts, True)
+            if low == 0 and high == package_count:
+                self.forward = forward
+            # Полоса освобождается до построения множеств зависящих пакетов
+            del forward
+            self.count_stripe(low, high, starts, predecessors, self.dependent_counts, False)
+        self.versions = None
+
+    def count_stripe(self, low, high, starts, neighbours, counts, forward):
+        """Множества полосы пакетов [low, high) и добавление их единиц к counts
+
+        forward=True - достижимые пакеты (компоненты в порядке Тарьяна),
+        иначе зависящие (в обратном порядке). Компоненты, множества которых не
+        пересекаются с полосой, пропускаются.
+        """
+        components = self.components
+        if forward:
+            # Достижимы только пакеты с номерами меньше конца компоненты
+            first = bisect_right(starts, low) - 1
+            numbers = range(max(first, 0), len(components))
+        else:
+            # Зависящие пакеты имеют номера не меньше начала компоненты
+            numbers = range(bisect_left(starts, high) - 1, -1, -1)
+
+        bits = [0] * len(components)
+        for number in numbers:
+            own_low = max(starts[number], low)
+            own_high = min(starts[number] + len(components[number]), high)
+            stripe = ((1 << (own_high - own_low)) - 1) << (own_low - low) if own_low < own_high else 0
+            for other in neighbours[number]:
+                stripe |= bits[other]
+            bits[number] = stripe
+            counts[number] += popcount(stripe)
+        return bits
+
+    def __contains__(self, package):
+        return package in self.component_of
+
+    def __len__(self):
+        return len(self.component_of)
+
+    def packages(self, name):
+        """Узлы графа для имени: точное совпадение или все версии 'имя@версия' пакета"""
+        if name in self.component_of:
+            return [name]
+        if self.versions is None:
+            self.versions = {}
+            for package in self.component_of:
+                self.versions.setdefault(split_package_spec(package)[0], []).append(package)
+        return self.versions.get(name, [])
+
+    def depends_on(self, package, dependency):
+        """Зависит ли package (транзитивно) от dependency; пакет зависит от себя только через цикл"""
+        component = self.component_of.get(package)
+        if component is None or dependency not in self.position:
+            return False
+        if package == dependency:
+            return self.cyclic[component]
+        if self.forward is not None:
+            return bool(self.forward[component] >> self.position[dependency] & 1)
+
+        target = self.component_of[dependency]
+        if target >= component:
+            return target == component
+        stack = [component]
+        seen = {component}
+        while stack:
+            for other in self.successors[stack.pop()]:
+                if other == target:
+                    return True
+                if other > target and other not in seen:
+                    seen.add(other)
+                    stack.append(other)
+        return False
+
+    def dependency_count(self, package):
+        """Число пакетов, от которых package зависит транзитивно"""
+        return self.dependency_counts[self.component_of[package]]
+
+    def dependent_count(self, package):
+        """Число пакетов, транзитивно зависящих от package"""
+        return self.dependent_counts[self.component_of[package]]
+
+
+class RepositoryMetrics:
+    """Метрики каждого пакета графа за один проход по конденсации
+
+    Транзитивные счетчики и принадлежность компонентам берутся из индекса
+    достижимости, глубина (длина самой длинной цепочки зависимостей под
+    пакетом, циклы стянуты) вычисляется динамикой по ребрам конденсации в
+    порядке Тарьяна: зависимости компоненты всегда обработаны раньше нее.
+    Радиус поражения - число пакетов, транзитивно зависящих от пакета; пакеты
+    ранжируются по нему, при равенстве - по числу прямых зависящих.
+
+    Транзитивные счетчики считаются индексом полосами в пределах
+    ReachabilityIndex.MEMORY_BUDGET, поэтому память метрик - O(V + E) плюс этот
+    бюджет, а время на больших графах без циклов растет как V * (V + E) / 64.
+    """
+
+    FIELDS = ('package', 'direct_dependencies', 'direct_dependents', 'transitive_dependencies',
+              'transitive_dependents', 'depth', 'scc', 'scc_size', 'cyclic', 'blast_rank')
+    FORMATS = ('csv', 'jsonl')
+
+    def __init__(self, graph, index=None):
+        self.index = index if index is not None else ReachabilityIndex(graph)
+
+        self.direct_dependencies = {}
+        self.direct_dependents = dict.fromkeys(self.index.component_of, 0)
+        for package in self.index.component_of:
+            dependencies = graph.get(package) or ()
+            self.direct_dependencies[package] = len(dependencies)
+            for dep in dependencies:
+                self.direct_dependents[dep] += 1
+
+        self.depths = []
+        for successors in self.index.successors:
+            self.depths.append(max((self.depths[other] + 1 for other in successors), default=0))
+
+        # Ранг с пропусками: пакеты с равными счетчиками делят одно место
+        self.ranking = sorted(self.index.component_of, key=lambda package: (
+            -self.index.dependent_count(package), -self.direct_dependents[package], package))
+        self.ranks = {}
+        previous = None
+        for position, package in enumerate(self.ranking, 1):
+            key = (self.index.dependent_count(package), self.direct_dependents[package])
+            if key != previous:
+                rank = position
+                previous = key
+            self.ranks[package] = rank
+
+    def __len__(self):
+        return len(self.ranking)
+
+    def record(self, package):
+        """Метрики одного пакета в порядке FIELDS"""
+        component = self.index.component_of[package]
+        return {
+            'package': package,
+            'direct_dependencies': self.direct_dependencies[package],
+            'direct_dependents': self.direct_dependents[package],
+            'transitive_dependencies': self.index.dependency_counts[component],
+            'transitive_dependents': self.index.dependent_counts[component],
+            'depth': self.depths[component],
+            'scc': component,
+            'scc_size': len(self.index.components[component]),
+            'cyclic': self.index.cyclic[component],
+            'blast_rank': self.ranks[package],
+        }
+
+    def iter_records(self):
+        """Записи всех пакетов по убыванию радиуса поражения"""
+        for package in self.ranking:
+            yield self.record(package)
+
+    def write(self, output_format, file):
+        """Потоковая запись метрик в CSV или JSONL"""
+        if output_format == 'csv':
+            writer = csv.DictWriter(file, fieldnames=self.FIELDS, lineterminator='\n')
+            writer.writeheader()
+            writer.writerows(self.iter_records())
+        else:
+            for record in self.iter_records():
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class RepositoryIndex:
+    """Индекс тестового репозитория: файл разбирается один раз, поиск зависимостей за O(1)"""
+
+    def __init__(self, packages):
+        # Имя пакета -> словарь зависимостей {имя: диапазон версий}
+        self.packages = packages
+
+    @classmethod
+    def load(cls, file_path):
+        """Загрузка и индексация файла репозитория"""
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            raise Exception(f"Файл '{file_path}' не найден")
+        except json.JSONDecodeError as e:
+            raise Exception(f"Ошибка парсинга JSON файла: {e}")
+
+        return cls.from_data(data)
+
+    @classmethod
+    def from_data(cls, data):
+        """Построение индекса за один проход по любой из поддерживаемых структур"""
+        packages = {}
+
+        if isinstance(data, dict):
+            if 'dependencies' in data:
+                # Файл содержит информацию об одном пакете
+                packages[data.get('name', '')] = data.get('dependencies') or {}
+            else:
+                # Файл содержит информацию о нескольких пакетах
+                for name, package_data in data.items():
+                    if isinstance(package_data, dict) and 'dependencies' in package_data:
+                        packages[name] = package_data['dependencies'] or {}
+                    elif isinstance(package_data, dict):
+                        packages[name] = package_data
+                    else:
+                        packages[name] = {}
+        elif isinstance(data, list):
+            # Файл содержит список пакетов
+            for package in data:
+                if isinstance(package, dict) and package.get('name'):
+                    # Как и при линейном поиске, выигрывает первое вхождение
+                    packages.setdefault(package['name'], package.get('dependencies') or {})
+
+        return cls(packages)
+
+    def get_dependencies(self, package_name):
+        """Прямые зависимости пакета"""
+        return self.packages.get(package_name, {})
+
+    def package_names(self):
+        """Список всех пакетов репозитория"""
+        return list(self.packages.keys())
+
+    def package_hash(self, package_name):
+        """Хэш словаря зависимостей пакета"""
+        return dependency_hash(self.get_dependencies(package_name))
+
+    def close(self):
+        """Файл разобран при загрузке, освобождать нечего (единый интерфейс с NdjsonRepositoryIndex)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, package_name):
+        return package_name in self.packages
+
+    def __len__(self):
+        return len(self.packages)
+
+
+class PackageNotFoundError(Exception):
+    """Пакета нет в реестре (ответ 404); зеркало реестра передает его клиенту как 404"""
+
+
+class RegistryResponse:
+    """Ответ реестра: код, заголовки и распакованное тело"""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class RegistryClient:
+    """HTTP-клиент npm реестра: пул keep-alive соединений на хост, gzip и повторы с backoff"""
+
+    # Сокращенный формат метаданных npm содержит только поля, нужные для установки
+    ACCEPT = 'application/vnd.npm.install-v1+json; q=1.0, application/json; q=0.8'
+    USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, timeout=10, retries=3, backoff=0.5, pool_size=8):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        # (схема, хост, порт) -> список свободных соединений
+        self.pools = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_received = 0
+
+    def acquire(self, key):
+        """Свободное соединение из пула или новое"""
+        with self.lock:
+            pool = self.pools.get(key)
+            if pool:
+                return pool.pop(), True
+
+        scheme, host, port = key
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(host, port, timeout=self.timeout), False
+
+    def release(self, key, connection):
+        """Возврат соединения в пул (лишние соединения закрываются)"""
+        with self.lock:
+            pool = self.pools.setdefault(key, [])
+            if len(pool) < self.pool_size:
+                pool.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        """Закрытие всех соединений пула"""
+        with self.lock:
+            pools, self.pools = self.pools, {}
+        for pool in pools.values():
+            for connection in pool:
+                connection.close()
+
+    def get(self, url, headers=None):
+        """GET-запрос с повтором временных ошибок; возвращает RegistryResponse"""
+        parsed = urllib.parse.urlsplit(url)
+        scheme = parsed.scheme or 'https'
+        port = parsed.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parsed.hostname, port)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+
+        request_headers = {
+            'User-Agent': self.USER_AGENT,
+            'Accept': self.ACCEPT,
+            'Accept-Encoding': 'gzip, deflate',
+        }
+        request_headers.update(headers or {})
+
+        attempt = 0
+        while True:
+            connection, reused = self.acquire(key)
+            try:
+                connection.request('GET', path, headers=request_headers)
+                response = connection.getresponse()
+                raw = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                # Сервер мог закрыть простаивающее keep-alive соединение - повторяем сразу
+                if reused:
+                    continue
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+                continue
+
+            with self.lock:
+                self.requests += 1
+                self.bytes_received += len(raw)
+
+            if response.will_close:
+                connection.close()
+            else:
+                self.release(key, connection)
+
+            if response.status in self.RETRY_STATUSES and attempt < self.retries:
+                attempt += 1
+                retry_after = response.headers.get('Retry-After', '')
+                delay = float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** (attempt - 1)
+                time.sleep(delay)
+                continue
+
+            encoding = (response.headers.get('Content-Encoding') or '').lower()
+            if encoding == 'gzip':
+                raw = gzip.decompress(raw)
+            elif encoding == 'deflate':
+                raw = zlib.decompress(raw)
+
+            return RegistryResponse(response.status, response.headers, raw)
+
+
+class NdjsonRepositoryIndex:
+    """Репозиторий в формате NDJSON (одна запись {"name", "dependencies"} на строку)
+
+    Файл читается потоково один раз для построения индекса смещений; при поиске
+    читается только строка нужного пакета.
+    """
+
+    EXTENSIONS = ('.ndjson', '.jsonl')
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        # Имя пакета -> номер записи в массивах смещений и длин
+        self.positions = {}
+        self.offsets = array('Q')
+        self.lengths = array('I')
+        # Хэши словарей зависимостей вычисляются попутно при построении индекса
+        self.hashes = []
+        self.lock = threading.Lock()
+
+        try:
+            self.file = open(file_path, 'rb')
+        except FileNotFoundError:
+            raise Exception(f"Файл '{file_path}' не найден")
+
+        try:
+            self.build_index()
+        except BaseException:
+            self.file.close()
+            raise
+
+    def build_index(self):
+        """Один потоковый проход по файлу: имя пакета -> смещение строки"""
+        offset = 0
+        for line_number, line in enumerate(self.file, 1):
+            length = len(line)
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise Exception(f"Ошибка парсинга JSON файла (строка {line_number}): {e}")
+
+                name = record.get('name') if isinstance(record, dict) else None
+                # Как и при линейном поиске, выигрывает первое вхождение
+                if name and name not in self.positions:
+                    self.positions[name] = len(self.offsets)
+                    self.offsets.append(offset)
+                    self.lengths.append(length)
+                    self.hashes.append(dependency_hash(record.get('dependencies')))
+            offset += length
+
+    def read_record(self, package_name):
+        """Чтение и разбор записи одного пакета"""
+        position = self.positions.get(package_name)
+        if position is None:
+            return None
+
+        with self.lock:
+            self.file.seek(self.offsets[position])
+            line = self.file.read(self.lengths[position])
+        return json.loads(line)
+
+    def get_dependencies(self, package_name):
+        """Прямые зависимости пакета"""
+        record = self.read_record(package_name)
+        if record is None:
+            return {}
+        return record.get('dependencies') or {}
+
+    def package_names(self):
+        """Список всех пакетов репозитория"""
+        return list(self.positions.keys())
+
+    def package_hash(self, package_name):
+        """Хэш словаря зависимостей пакета (без чтения записи с диска)"""
+        position = self.positions.get(package_name)
+        if position is None:
+            return dependency_hash({})
+        return self.hashes[position]
+
+    def close(self):
+        """Закрытие файла репозитория"""
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, package_name):
+        return package_name in self.positions
+
+    def __len__(self):
+        return len(self.positions)
+
+
+def open_repository(file_path):
+    """Индекс тестового репозитория подходящего формата (по расширению файла)"""
+    if file_path.lower().endswith(NdjsonRepositoryIndex.EXTENSIONS):
+        return NdjsonRepositoryIndex(file_path)
+    return RepositoryIndex.load(file_path)
+
+
+class JsonStreamReader:
+    """Потоковое чтение JSON-значений из текстового файла частями через json.JSONDecoder.raw_decode
+
+    В памяти держится только текущая часть файла и разбираемое значение, а не
+    весь документ. Если значение не помещается в буфер, он увеличивается вдвое.
+    """
+
+    CHUNK_SIZE = 1 << 16
+    WHITESPACE = ' \t\r\n'
+
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def fill(self):
+        """Дочитывание следующей части; False в конце файла"""
+        chunk = self.file.read(max(self.chunk_size, len(self.buffer) - self.position))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Следующий непробельный символ ('' в конце файла)"""
+        while True:
+            buffer = self.buffer
+            while self.position < len(buffer) and buffer[self.position] in self.WHITESPACE:
+                self.position += 1
+            if self.position < len(buffer):
+                return buffer[self.position]
+            if not self.fill():
+                return ''
+
+    def expect(self, characters):
+        """Чтение одного из символов-разделителей characters"""
+        character = self.peek()
+        if not character or character not in characters:
+            found = repr(character) if character else 'конец файла'
+            raise Exception(f"Ошибка парсинга JSON файла: ожидался один из символов {characters!r}, найден {found}")
+        self.position += 1
+        return character
+
+    def value(self):
+        """Разбор следующего JSON-значения"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as e:
+                # Значение обрезано границей части - дочитываем и разбираем заново
+                if self.fill():
+                    continue
+                raise Exception(f"Ошибка парсинга JSON файла: {e}")
+            # Число в конце буфера может продолжаться в следующей части
+            if end == len(self.buffer) and not self.eof and self.fill():
+                continue
+            self.position = end
+            return value
+
+    def members(self):
+        """Пары (ключ, значение) объекта, открывающая скобка которого уже прочитана"""
+        if self.peek() == '}':
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key, self.value()
+            if self.expect(',}') == '}':
+                return
+
+    def items(self):
+        """Элементы массива, открывающая скобка которого уже прочитана"""
+        if self.peek() == ']':
+            self.position += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+
+def convert_repository_to_ndjson(source_path, target_path):
+    """Преобразование репозитория из формата JSON (словарь или список) в NDJSON
+
+    Файл разбирается потоково (JsonStreamReader), по одному пакету за раз, с той
+    же интерпретацией структур, что и RepositoryIndex.from_data. Возвращает число
+    записанных пакетов.
+    """
+    def write(name, dependencies):
+        record = {'name': name, 'dependencies': dependencies}
+        target.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        target.write('\n')
+
+    try:
+        source = open(source_path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        raise Exception(f"Файл '{source_path}' не найден")
+
+    count = 0
+    with source, open(target_path, 'w', encoding='utf-8') as target:
+        reader = JsonStreamReader(source)
+        if reader.expect('{[') == '[':
+            # Список пакетов: как и при линейном поиске, выигрывает первое вхождение
+            seen = set()
+            for package in reader.items():
+                if isinstance(package, dict) and package.get('name') and package['name'] not in seen:
+                    seen.add(package['name'])
+                    write(package['name'], package.get('dependencies') or {})
+                    count += 1
+            return count
+
+        # Словарь пакетов или один пакет с ключом 'dependencies' верхнего уровня
+        single = {}
+        for name, package_data in reader.members():
+            if name in ('name', 'dependencies'):
+                single[name] = package_data
+            if 'dependencies' in single:
+                # Это файл одного пакета: уже записанные строки отбрасываются
+                continue
+            if isinstance(package_data, dict) and 'dependencies' in package_data:
+                dependencies = package_data['dependencies'] or {}
+            elif isinstance(package_data, dict):
+                dependencies = package_data
+            else:
+                dependencies = {}
+            write(name, dependencies)
+            count += 1
+
+        if 'dependencies' in single:
+            target.seek(0)
+            target.truncate()
+            write(single.get('name', ''), single['dependencies'] or {})
+            count = 1
+
+    return count
+
+
+class PackumentCache:
+    """Дисковый кэш packument'ов npm с TTL, LRU-вытеснением и ревалидацией по ETag/Last-Modified"""
+
+    def __init__(self, cache_dir, ttl=3600, max_size=256 * 1024 * 1024, registry_url=DEFAULT_REGISTRY_URL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size = max_size
+        # Записи разных реестров не перезаписывают друг друга: имя файла начинается с хэша URL
+        self.prefix = hashlib.blake2b(registry_url.rstrip('/').encode('utf-8'), digest_size=6).hexdigest()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Размеры записей для контроля общего объема кэша
+        self.sizes = {}
+        for entry in os.scandir(cache_dir):
+            if entry.is_file() and entry.name.endswith('.json'):
+                self.sizes[entry.path] = entry.stat().st_size
+
+    def entry_path(self, package_name):
+        """Путь к файлу записи (имя пакета экранируется, включая '/' у scoped-пакетов)"""
+        return os.path.join(self.cache_dir, f"{self.prefix}-{urllib.parse.quote(package_name, safe='')}.json")
+
+    def record(self, outcome):
+        """Учет обращения к кэшу: 'hits', 'misses' или 'revalidated' (из нескольких потоков)"""
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def get(self, package_name):
+        """Запись кэша {'packument', 'fetched_at', 'etag', 'last_modified'} или None"""
+        path = self.entry_path(package_name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        # Время доступа хранится в mtime файла и служит порядком LRU
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def is_fresh(self, entry):
+        """Запись моложе TTL и может использоваться без запроса к реестру"""
+        return time.time() - entry.get('fetched_at', 0) < self.ttl
+
+    def put(self, package_name, packument, etag=None, last_modified=None):
+        """Сохранение записи (атомарная запись через временный файл)"""
+        entry = {
+            'packument': packument,
+            'fetched_at': time.time(),
+            'etag': etag,
+            'last_modified': last_modified,
+        }
+        path = self.entry_path(package_name)
+        data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            # Недописанный временный файл не должен оставаться в каталоге кэша
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+        with self.lock:
+            self.sizes[path] = len(data)
+            self.evict()
+        return entry
+
+    def refresh(self, package_name, entry):
+        """Продление записи после ответа 304 Not Modified"""
+        return self.put(package_name, entry['packument'], entry.get('etag'), entry.get('last_modified'))
+
+    def evict(self):
+        """Удаление давно не использованных записей при превышении лимита размера"""
+        total = sum(self.sizes.values())
+        if total <= self.max_size:
+            return
+
+        def last_used(path):
+            try:
+                return os.stat(path).st_mtime
+            except OSError:
+                return 0
+
+        for path in sorted(self.sizes, key=last_used):
+            if total <= self.max_size:
+                break
+            total -= self.sizes.pop(path)
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов: rate токенов в секунду, запас до capacity
+
+    Общий для всех потоков: ожидающие получают токены по очереди под
+    threading.Lock, поэтому ограничение действует на любые запросы к реестру -
+    последовательный обход, пул потоков асинхронного обхода и зеркало.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                time.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncRegistryCrawler:
+    """Асинхронный обход реестра, заполняющий resolved_dependencies визуализатора
+
+    Каждый раскрываемый узел - отдельная задача asyncio, поэтому медленный пакет
+    не задерживает целый уровень BFS. Блокирующий HTTP-клиент с пулом keep-alive
+    соединений работает в пуле из jobs потоков, одновременные соединения с хостом
+    ограничены host_connections. Ограничение частоты и объединение одновременных
+    загрузок выполняет fetch_package_info_from_npm (общие для всех режимов);
+    ожидающие одного packument'а узлы обхода разделяют одну задачу, чтобы не
+    занимать потоки пула ожиданием.
+
+    Загрузка, которую больше никто не ждет (все ожидающие узлы отменены),
+    отменяется до того, как займет токен или соединение. Отфильтрованные узлы,
+    узлы глубже max_depth и сверх max_nodes не раскрываются; по истечении
+    deadline (момент time.monotonic()) и в cancel() ожидающие задачи снимаются.
+    """
+
+    def __init__(self, visualizer, repo_url, jobs=8, host_connections=8, checkpoint=None):
+        self.visualizer = visualizer
+        self.repo_url = repo_url
+        self.jobs = jobs
+        self.host_connections = host_connections
+        self.checkpoint = checkpoint
+        self.loop = None
+        self.executor = None
+        self.tasks = set()
+
+    def crawl(self, roots, filter_substring="", max_depth=None, max_nodes=None, deadline=None):
+        """Обход от корневых пакетов до исчерпания графа или ограничений"""
+        loop = asyncio.new_event_loop()
+        try:
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                self.executor = executor
+                loop.run_until_complete(self.run(roots, filter_substring, max_depth, max_nodes, deadline))
+        finally:
+            loop.close()
+            self.loop = self.executor = None
+
+    async def run(self, roots, filter_substring, max_depth, max_nodes, deadline):
+        self.loop = asyncio.get_running_loop()
+        self.filter_substring = filter_substring
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.host_limits = {}
+        # Имя пакета -> задача загрузки и число ее ожидающих
+        self.fetches = {}
+        self.waiters = {}
+        # Узел -> наименьшая известная глубина; узлы, отложенные из-за max_depth
+        self.depths = {}
+        self.deferred = set()
+        # Число узлов, раскрытие которых запущено (для max_nodes)
+        self.expanded = 0
+
+        for root in roots:
+            self.discover(root, 0)
+
+        try:
+            while self.tasks:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                done, _ = await asyncio.wait(list(self.tasks), timeout=timeout,
+                                             return_when=asyncio.FIRST_EXCEPTION)
+                if not done:
+                    # Время обхода истекло: незавершенные раскрытия отменяются
+                    break
+                for task in done:
+                    if not task.cancelled() and task.exception() is not None:
+                        raise task.exception()
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        """Отмена всех ожидающих раскрытий и загрузок"""
+        for task in list(self.tasks) + list((self.fetches or {}).values()):
+            task.cancel()
+
+    def discover(self, package, depth):
+        """Учет найденного узла и постановка его раскрытия в очередь"""
+        visualizer = self.visualizer
+        known_depth = self.depths.get(package)
+        if known_depth is not None and known_depth <= depth:
+            return
+        self.depths[package] = depth
+
+        if known_depth is not None and package not in self.deferred:
+            # Узел уже раскрыт или раскрывается: повторно нужно только пройти детей на меньшей глубине
+            dependencies = visualizer.resolved_dependencies.get(package)
+            if dependencies is not None:
+                for dep in dependencies:
+                    self.discover(dep, depth + 1)
+            return
+
+        # Отфильтрованные пакеты DFS не раскрывает, загружать их не нужно
+        if visualizer.should_filter_package(package, self.filter_substring):
+            return
+        if self.max_depth is not None and depth >= self.max_depth:
+            self.deferred.add(package)
+            return
+        if self.max_nodes is not None and self.expanded >= self.max_nodes:
+            return
+        self.deferred.discard(package)
+        self.expanded += 1
+
+        task = self.loop.create_task(self.expand(package))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def host_limit(self):
+        host = urllib.parse.urlsplit(self.visualizer.registry_url).netloc
+        semaphore = self.host_limits.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.host_connections)
+            self.host_limits[host] = semaphore
+        return semaphore
+
+    async def fetch(self, package_name):
+        """Загрузка packument'а: память и дисковый кэш - без ожидания соединения, сеть - через ограничители"""
+        visualizer = self.visualizer
+        cached = await self.loop.run_in_executor(self.executor, visualizer.cached_package_info, package_name)
+        if cached is not None:
+            return
+        async with self.host_limit():
+            await self.loop.run_in_executor(self.executor, visualizer.fetch_package_info_from_npm, package_name)
+
+    async def packument(self, package_name):
+        """Ожидание packument'а пакета; одновременные запросы разделяют одну загрузку"""
+        if package_name in self.visualizer.packuments:
+            return
+
+        task = self.fetches.get(package_name)
+        if task is None or task.cancelled():
+            task = self.loop.create_task(self.fetch(package_name))
+            self.fetches[package_name] = task
+            self.waiters[package_name] = 0
+
+        self.waiters[package_name] += 1
+        try:
+            await asyncio.shield(task)
+        finally:
+            self.waiters[package_name] -= 1
+            if self.waiters[package_name] == 0 and not task.done():
+                task.cancel()
+
+    async def expand(self, package):
+        """Раскрытие узла: packument пакета, затем packument'ы всех его зависимостей разом"""
+        visualizer = self.visualizer
+        dependencies = visualizer.resolved_dependencies.get(package)
+        if dependencies is not None:
+            # Зависимости уже известны (например, из контрольной точки)
+            depth = self.depths[package]
+            for dep in dependencies:
+                self.discover(dep, depth + 1)
+            return
+
+        try:
+            await self.packument(split_package_spec(package)[0])
+            declared = await self.loop.run_in_executor(self.executor, visualizer.declared_dependencies, package)
+            if not visualizer.ignore_ranges:
+                await asyncio.gather(*(
+                    self.packument(split_package_spec(range_text[4:])[0] if range_text.startswith('npm:') else dep)
+                    for dep, range_text in declared.items()
+                ))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Ошибку сообщит get_direct_dependencies с предупреждением, как при последовательном обходе
+            pass
+
+        dependencies = await self.loop.run_in_executor(
+            self.executor, visualizer.get_direct_dependencies, package, self.repo_url, False
+        )
+        depth = self.depths[package]
+        for dep in dependencies:
+            self.discover(dep, depth + 1)
+
+        if self.checkpoint is not None and self.checkpoint.due():
+            self.checkpoint.save(dict(visualizer.resolved_dependencies), dict(visualizer.failed_packages))
+
+
+class TraversalCheckpoint:
+    """Контрольная точка обхода реестра: уже полученные зависимости пакетов
+
+    Файл перезаписывается не чаще раза в interval секунд. При повторном запуске
+    с тем же корнем и фильтром зависимости из файла не загружаются заново, и
+    обход продолжается с места остановки. Пакеты, загрузить которые не удалось,
+    в файл не попадают и при продолжении загружаются снова.
+    """
+
+    VERSION = 1
+
+    def __init__(self, file_path, root, filter_text='', interval=5.0):
+        self.file_path = file_path
+        self.root = root
+        self.filter_text = filter_text
+        self.interval = interval
+        self.saved_at = time.monotonic()
+
+    def load(self):
+        """Сохраненные зависимости {пакет: [зависимости]} (пусто, если файл от другого обхода)"""
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            raise Exception(f"Не удалось прочитать контрольную точку '{self.file_path}': {e}")
+
+        if (data.get('version') != self.VERSION or data.get('root') != self.root
+                or data.get('filter') != self.filter_text):
+            print(f"   ⚠️ Контрольная точка '{self.file_path}' относится к другому обходу и не используется")
+            return {}
+        return data.get('resolved') or {}
+
+    def due(self):
+        """Пора ли перезаписать файл"""
+        return time.monotonic() - self.saved_at >= self.interval
+
+    def save(self, resolved, failed=()):
+        """Атомарная запись зависимостей {пакет: зависимости} без пакетов из failed"""
+        data = {
+            'version': self.VERSION,
+            'root': self.root,
+            'filter': self.filter_text,
+            'resolved': {package: list(dependencies) for package, dependencies in resolved.items()
+                         if package not in failed},
+        }
+        temp_path = self.file_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, self.file_path)
+        self.saved_at = time.monotonic()
+
+    def remove(self):
+        """Удаление файла после полного обхода"""
+        try:
+            os.remove(self.file_path)
+        except FileNotFoundError:
+            pass
+
+
+class RunProfiler:
+    """Профиль запуска: время фаз, загрузки из реестра и события для Chrome trace
+
+    Выключенный профиль (по умолчанию) ничего не измеряет и не хранит: запуск
+    включает его только по --stats / --trace, а отдельные события для трассировки
+    накапливаются только при --trace. Файл трассировки в формате Trace Event
+    открывается в chrome://tracing и Perfetto.
+    """
+
+    # Верхние границы корзин гистограммы задержек загрузок, мс
+    LATENCY_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, enabled=False, tracing=False):
+        self.enabled = enabled or tracing
+        self.tracing = tracing
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.events = []
+        # Фаза -> суммарное время, с (в порядке первого появления)
+        self.phases = {}
+        # Имя интервала -> [число, суммарное время, с]
+        self.spans = {}
+        # Источник загрузки ('network', 'cache', 'revalidated', 'error') -> число
+        self.fetch_sources = {}
+        self.fetch_latencies = []
+        self.graph = None
+
+    def timestamp(self, moment):
+        """Время от начала запуска в микросекундах (единица Trace Event)"""
+        return round((moment - self.started) * 1000000, 1)
+
+    def add_event(self, name, category, started, finished, args=None):
+        if not self.tracing:
+            return
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': self.timestamp(started),
+            'dur': round((finished - started) * 1000000, 1),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+        }
+        if args:
+            event['args'] = args
+        with self.lock:
+            self.events.append(event)
+
+    @contextmanager
+    def phase(self, name):
+        """Фаза запуска: время суммируется по имени фазы"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            self.add_event(name, 'phase', started, finished)
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0.0) + finished - started
+
+    @contextmanager
+    def span(self, name, category, **args):
+        """Мелкий интервал (разбор JSON, чтение репозитория): число и суммарное время"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            self.add_event(name, category, started, finished, args)
+            with self.lock:
+                totals = self.spans.setdefault(name, [0, 0.0])
+                totals[0] += 1
+                totals[1] += finished - started
+
+    def record_fetch(self, package_name, source, started):
+        """Загрузка метаданных пакета, начатая в момент started"""
+        if not self.enabled:
+            return
+        finished = time.perf_counter()
+        self.add_event(package_name, 'fetch', started, finished, {'source': source})
+        with self.lock:
+            self.fetch_sources[source] = self.fetch_sources.get(source, 0) + 1
+            self.fetch_latencies.append(finished - started)
+
+    def latency_histogram(self):
+        """Гистограмма задержек загрузок: {'<=N ms': число, ..., '>M ms': число}"""
+        histogram = {f"<={bound} ms": 0 for bound in self.LATENCY_BUCKETS}
+        overflow_label = f">{self.LATENCY_BUCKETS[-1]} ms"
+        histogram[overflow_label] = 0
+        for latency in self.fetch_latencies:
+            milliseconds = latency * 1000
+            position = bisect_left(self.LATENCY_BUCKETS, milliseconds)
+            if position < len(self.LATENCY_BUCKETS):
+                histogram[f"<={self.LATENCY_BUCKETS[position]} ms"] += 1
+            else:
+                histogram[overflow_label] += 1
+        return histogram
+
+    @staticmethod
+    def start_memory_tracking():
+        """Включение tracemalloc там, где нет resource.getrusage"""
+        if resource is None and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @staticmethod
+    def peak_memory():
+        """Пиковая память процесса в байтах (или None, если измерить нельзя)"""
+        if resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Linux возвращает килобайты, macOS - байты
+            return peak if sys.platform == 'darwin' else peak * 1024
+        if tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[1]
+        return None
+
+    def statistics(self, registry_client=None, packument_cache=None):
+        """Сводка запуска в виде словаря для JSON"""
+        latencies = sorted(self.fetch_latencies)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000, 3)
+
+        fetches = {
+            'count': len(latencies),
+            'sources': dict(self.fetch_sources),
+            'total_seconds': round(sum(latencies), 6),
+            'latency_ms': {
+                'p50': percentile(0.5),
+                'p90': percentile(0.9),
+                'p99': percentile(0.99),
+                'max': round(latencies[-1] * 1000, 3) if latencies else None,
+            },
+            'latency_histogram': self.latency_histogram(),
+        }
+
+        cache = None
+        if packument_cache is not None:
+            lookups = packument_cache.hits + packument_cache.misses + packument_cache.revalidated
+            cache = {
+                'hits': packument_cache.hits,
+                'misses': packument_cache.misses,
+                'revalidated': packument_cache.revalidated,
+                'hit_rate': round(packument_cache.hits / lookups, 4) if lookups else None,
+            }
+
+        network = None
+        if registry_client is not None:
+            network = {
+                'requests': registry_client.requests,
+                'bytes_received': registry_client.bytes_received,
+            }
+
+        graph = None
+        if self.graph is not None:
+            nodes = self.graph.node_count if isinstance(self.graph, InternedGraph) else len(self.graph)
+            edges = self.graph.edge_count if isinstance(self.graph, InternedGraph) else \
+                sum(len(dependencies) for dependencies in self.graph.values())
+            # Скорость считается по загрузке и обходу - фазам, которые строят граф
+            resolution = self.phases.get('prefetch', 0.0) + self.phases.get('traversal', 0.0)
+            graph = {
+                'nodes': nodes,
+                'edges': edges,
+                'resolution_seconds': round(resolution, 6),
+                'nodes_per_second': round(nodes / resolution, 1) if resolution else None,
+                'edges_per_second': round(edges / resolution, 1) if resolution else None,
+            }
+
+        return {
+            'wall_seconds': round(time.perf_counter() - self.started, 6),
+            'phases': {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            'spans': {name: {'count': count, 'seconds': round(seconds, 6)}
+                      for name, (count, seconds) in self.spans.items()},
+            'fetches': fetches,
+            'cache': cache,
+            'network': network,
+            'graph': graph,
+            'peak_memory_bytes': self.peak_memory(),
+        }
+
+    def write_statistics(self, file_path, statistics):
+        """Сохранение сводки в JSON ('-' - stderr, чтобы не смешиваться с выводом обхода)"""
+        text = json.dumps(statistics, ensure_ascii=False, indent=2)
+        if file_path == '-':
+            print(text, file=sys.stderr)
+            return
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+    def write_trace(self, file_path):
+        """Сохранение событий в формате Chrome Trace Event"""
+        metadata = [{
+            'name': 'process_name',
+            'ph': 'M',
+            'pid': os.getpid(),
+            'args': {'name': 'dependency_visualizer'},
+        }]
+        with self.lock:
+            events = sorted(self.events, key=lambda event: event['ts'])
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+
+
+# Состояние рабочего процесса пула анализа: снимок графа, экземпляр инструмента и данные задачи
+ANALYSIS_WORKER = {}
+
+
+def init_analysis_worker(snapshot_path, task, parameters):
+    """Инициализация рабочего процесса: граф открывается из снимка через mmap, без передачи по pipe
+
+    Результаты обхода всего графа (расстояния до цели, компоненты) вычисляются
+    родителем один раз и приходят в parameters, а не пересчитываются в каждом процессе.
+    """
+    graph = GraphSnapshot(snapshot_path)
+    visualizer = DependencyVisualizer()
+    ANALYSIS_WORKER.update(graph=graph, visualizer=visualizer, task=task)
+
+    if task == 'reverse':
+        targets, target_package, max_paths, distance, components = parameters
+        ANALYSIS_WORKER.update(
+            targets=set(targets),
+            target_package=target_package,
+            max_paths=max_paths,
+            distance=distance,
+            components=components,
+        )
+    elif task == 'batch':
+        # Отчеты по корням упоминают недоступные и не раскрытые пакеты, как в последовательном запуске
+        with_records, failed_packages, truncated_packages = parameters
+        visualizer.failed_packages = failed_packages
+        visualizer.truncated_packages = truncated_packages
+        ANALYSIS_WORKER['with_records'] = with_records
+
+
+def run_analysis_chunk(items):
+    """Обработка части элементов задачи в рабочем процессе"""
+    worker = ANALYSIS_WORKER
+    graph = worker['graph']
+    visualizer = worker['visualizer']
+    task = worker['task']
+
+    if task == 'cycles':
+        return [cycle_path(graph, component) for component in items]
+    if task == 'reverse':
+        return [
+            visualizer.classify_dependent(graph, worker['distance'], worker['components'], worker['targets'],
+                                          worker['target_package'], package, worker['max_paths'])
+            for package in items
+        ]
+    if task == 'batch':
+        return [visualizer.analyze_batch_root(graph, root, worker['with_records']) for root in items]
+    raise Exception(f"Неизвестная задача анализа: {task}")
+
+
+class ProcessPoolAnalyzer:
+    """Пул процессов для анализа готового графа
+
+    Граф не сериализуется для каждого процесса: он передается путем к бинарному
+    снимку, который рабочие процессы открывают через mmap, так что страницы
+    CSR-буферов общие через страничный кэш ОС. Граф, еще не являющийся снимком,
+    один раз записывается во временный файл. Элементы задачи делятся на части
+    (по несколько на процесс), результаты возвращаются в исходном порядке.
+    """
+
+    CHUNKS_PER_PROCESS = 4
+
+    def __init__(self, graph, processes, task, parameters=None):
+        self.graph = graph
+        self.processes = processes
+        self.task = task
+        self.parameters = parameters
+        self.temp_path = None
+        self.executor = None
+
+    def __enter__(self):
+        if isinstance(self.graph, GraphSnapshot):
+            snapshot_path = self.graph.file_path
+        else:
+            descriptor, snapshot_path = tempfile.mkstemp(suffix='.dvgs')
+            os.close(descriptor)
+            self.temp_path = snapshot_path
+            GraphSnapshot.write(self.graph, snapshot_path)
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            initializer=init_analysis_worker,
+            initargs=(snapshot_path, self.task, self.parameters)
+        )
+        return self
+
+    def map(self, items):
+        """Результаты задачи для каждого элемента, в порядке элементов"""
+        items = list(items)
+        size = max(1, -(-len(items) // (self.processes * self.CHUNKS_PER_PROCESS)))
+        chunks = [items[start:start + size] for start in range(0, len(items), size)]
+        results = []
+        for chunk_results in self.executor.map(run_analysis_chunk, chunks):
+            results.extend(chunk_results)
+        return results
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.executor.shutdown()
+        if self.temp_path is not None:
+            os.remove(self.temp_path)
 
 
 class DependencyVisualizer:
+    # Причины остановки раскрытия пакета (--max-depth, --max-nodes, --timeout)
+    TRUNCATION_REASONS = {
+        'depth': 'достигнута максимальная глубина',
+        'nodes': 'достигнут предел числа пакетов',
+        'timeout': 'истекло время обхода',
+    }
+
+    # Меньше элементов анализ в пуле процессов не окупает запуск процессов и запись снимка
+    MIN_PARALLEL_ITEMS = 256
+
     def __init__(self):
         self.dependency_graph = {}
+        # Индексы тестовых репозиториев: путь -> RepositoryIndex
+        self.repositories = {}
+        self.registry_url = DEFAULT_REGISTRY_URL
+        self.packument_cache = None
+        self.registry_client = RegistryClient()
+        # Уже полученные из реестра зависимости: пакет -> словарь зависимостей
+        self.resolved_dependencies = {}
+        # Пакеты, зависимости которых получить не удалось: пакет -> текст ошибки.
+        # В resolved_dependencies они не попадают и при следующем обращении загружаются снова
+        self.failed_packages = {}
+        # Сокращенные packument'ы, уже загруженные в этом запуске: имя -> packument
+        self.packuments = {}
+        # Загрузки в процессе: имя -> Future; одновременные запросы пакета ждут одну загрузку
+        self.pending_fetches = {}
+        self.fetch_lock = threading.Lock()
+        # Ограничитель частоты запросов к реестру (--rate-limit), общий для всех режимов
+        self.rate_limiter = None
+        # ETag загруженных packument'ов для проверки изменений в --state: имя пакета -> ETag
+        self.package_etags = {}
+        # Разрешение версий: индексы версий пакетов и (пакет, диапазон) -> 'имя@версия'
+        self.version_indexes = {}
+        self.resolved_ranges = {}
+        self.ignore_ranges = False
+        # Скомпилированные фильтры пакетов: подстрока -> PackageFilter
+        self.package_filters = {}
+        # Открытый бинарный снимок графа, заменяющий репозиторий (--snapshot)
+        self.snapshot = None
+        # Время фаз и загрузок для --stats / --trace (выключен, пока не запрошен)
+        self.profiler = RunProfiler()
+        # Пакеты, не раскрытые последним обходом из-за ограничений: пакет -> причина
+        self.truncated_packages = {}
+        # Контрольная точка обхода (--checkpoint)
+        self.checkpoint = None
+        # Число процессов для анализа готового графа (--processes)
+        self.processes = 1
+        # Получатель предупреждений обхода (например, list.append); None - вывод в stdout
+        self.warning_handler = None
+        # Поток для данных, выводимых в '-' (исходный stdout, пока ход работы перенаправлен в stderr)
+        self.data_stream = None
+
+    def parse_arguments(self):
+        """Парсинг аргументов командной строки"""
+        parser = argparse.ArgumentParser(
+            description='Инструмент визуализации графа зависимостей пакетов'
+        )
+
+        parser.add_argument(
+            '--package',
+            type=str,
+            default='',
+            help='Имя анализируемого пакета'
+        )
+
+        parser.add_argument(
+            '--repo',
+            type=str,
+            default='',
+            help='URL-адрес репозитория или путь к файлу тестового репозитория'
+        )
+
+        parser.add_argument(
+            '--test-mode',
+            action='store_true',
+            help='Режим работы с тестового репозитория'
+        )
+
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='dependency_graph.svg',
+            help='Имя сгенерированного файла с изображением графа'
+        )
+
+        parser.add_argument(
+            '--filter',
+            type=str,
+            default='',
+            help="Подстрока для фильтрации пакетов (или шаблон с префиксом 'glob:' / 're:')"
+        )
+
+        parser.add_argument(
+            '--include',
+            action='append',
+            default=[],
+            help="Шаблон пакетов, которые остаются в графе: подстрока, 'glob:@types/*' или 're:^eslint-'; можно повторять"
+        )
+
+        parser.add_argument(
+            '--exclude',
+            action='append',
+            default=[],
+            help="Шаблон исключаемых пакетов: подстрока, 'glob:...' или 're:...'; можно повторять"
+        )
+
+        parser.add_argument(
+            '--reverse',
+            action='store_true',
+            help='Режим вывода обратных зависимостей'
+        )
+
+        parser.add_argument(
+            '--query',
+            action='append',
+            default=[],
+            help="Запрос к индексу достижимости: 'A:B' (зависит ли A от B) или 'A' (транзитивные счетчики); можно повторять"
+        )
+
+        parser.add_argument(
+            '--query-file',
+            type=str,
+            default='',
+            help="Файл запросов к индексу достижимости, по одному на строку ('-' - stdin)"
+        )
+
+        parser.add_argument(
+            '--analyze-all',
+            type=str,
+            default='',
+            help="Метрики всех пакетов репозитория или снимка за один проход: файл CSV/JSONL ('-' - stdout)"
+        )
+
+        parser.add_argument(
+            '--analyze-format',
+            choices=list(RepositoryMetrics.FORMATS),
+            default=None,
+            help='Формат файла метрик: csv или jsonl (по умолчанию по расширению файла)'
+        )
+
+        parser.add_argument(
+            '--format',
+            choices=list(GraphEmitter.FORMATS),
+            default='mermaid',
+            help='Формат текстового представления графа: mermaid, dot или json'
+        )
+
+        parser.add_argument(
+            '--emit',
+            type=str,
+            default='',
+            help="Записать текстовое представление графа в файл ('-' - stdout)"
+        )
+
+        parser.add_argument(
+            '--quiet-graph',
+            action='store_true',
+            help='Не выводить граф и его текстовое представление в stdout'
+        )
+
+        parser.add_argument(
+            '--renderer',
+            choices=['native', 'mermaid-cli'],
+            default='native',
+            help='Способ генерации изображения: встроенный рендерер SVG или mermaid-cli (Docker/npx)'
+        )
+
+        parser.add_argument(
+            '--batch',
+            type=str,
+            default='',
+            help="Файл со списком корневых пакетов для пакетного режима ('-' - stdin)"
+        )
+
+        parser.add_argument(
+            '--batch-output',
+            type=str,
+            default='',
+            help='Сохранить результаты пакетного режима в файл JSONL'
+        )
 
-    def parse_arguments(self):
-        """Парсинг аргументов командной строки"""
-        parser = argparse.ArgumentParser(
-            description='Инструмент визуализации графа зависимостей пакетов'
+        parser.add_argument(
+            '--state',
+            type=str,
+            default='',
+            help='Файл состояния для инкрементального повторного анализа (граф и хэши пакетов)'
         )
 
         parser.add_argument(
-            '--package',
+            '--snapshot',
             type=str,
-            required=True,
-            help='Имя анализируемого пакета'
+            default='',
+            help='Использовать бинарный снимок графа вместо репозитория'
         )
 
         parser.add_argument(
-            '--repo',
+            '--save-snapshot',
             type=str,
-            required=True,
-            help='URL-адрес репозитория или путь к файлу тестового репозитория'
+            default='',
+            help='Сохранить построенный граф в бинарный снимок'
         )
 
         parser.add_argument(
-            '--test-mode',
+            '--convert-ndjson',
+            type=str,
+            default='',
+            help='Преобразовать файл репозитория --repo в формат NDJSON и сохранить по указанному пути'
+        )
+
+        parser.add_argument(
+            '--max-paths',
+            type=int,
+            default=0,
+            help='Число выводимых полных путей для каждой обратной зависимости (0 - не выводить)'
+        )
+
+        parser.add_argument(
+            '--ignore-ranges',
             action='store_true',
-            help='Режим работы с тестового репозитория'
+            help='Не учитывать диапазоны версий: брать последние версии, узлы графа без версий'
         )
 
         parser.add_argument(
-            '--output',
+            '--cache-dir',
             type=str,
-            default='dependency_graph.svg',
-            help='Имя сгенерированного файла с изображением графа'
+            default=DEFAULT_CACHE_DIR,
+            help='Каталог дискового кэша метаданных npm реестра'
+        )
+
+        parser.add_argument(
+            '--cache-ttl',
+            type=int,
+            default=3600,
+            help='Время жизни записи кэша в секундах (после истечения - ревалидация)'
+        )
+
+        parser.add_argument(
+            '--cache-max-size',
+            type=int,
+            default=256,
+            help='Максимальный размер кэша в мегабайтах'
+        )
+
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Не использовать дисковый кэш метаданных npm реестра'
+        )
+
+        parser.add_argument(
+            '--stats',
+            type=str,
+            default='',
+            help="Сохранить профиль запуска (время фаз, загрузки, кэш, память) в JSON-файл ('-' - stderr)"
+        )
+
+        parser.add_argument(
+            '--trace',
+            type=str,
+            default='',
+            help='Сохранить хронологию запуска в формате Chrome trace (chrome://tracing, Perfetto)'
+        )
+
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=8,
+            help='Число параллельных загрузок из npm реестра (1 - последовательно)'
+        )
+
+        parser.add_argument(
+            '--max-depth',
+            type=int,
+            default=None,
+            help='Максимальная глубина раскрытия зависимостей (корень - глубина 0)'
+        )
+
+        parser.add_argument(
+            '--max-nodes',
+            type=int,
+            default=None,
+            help='Остановить обход после раскрытия указанного числа пакетов'
+        )
+
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=None,
+            help='Ограничение времени обхода в секундах (выводится частичный граф)'
+        )
+
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            default='',
+            help='Файл контрольной точки: периодическое сохранение частичного обхода и продолжение с него'
         )
 
-        parser.add_argument(
-            '--filter',
-            type=str,
-            default='',
-            help='Подстрока для фильтрации пакетов'
-        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Число процессов для анализа готового графа: циклы, обратные зависимости, пакетный режим'
+        )
+
+        parser.add_argument(
+            '--rate-limit',
+            type=float,
+            default=0,
+            help='Ограничение частоты запросов к реестру, запросов в секунду (0 - без ограничения)'
+        )
+
+        parser.add_argument(
+            '--host-connections',
+            type=int,
+            default=8,
+            help='Максимум одновременных соединений с одним хостом реестра'
+        )
+
+        return parser.parse_args()
+
+    def validate_arguments(self, args):
+        """Валидация аргументов командной строки"""
+        errors = []
+
+        # Проверка имени пакета (при преобразовании репозитория и в пакетном режиме пакет не нужен)
+        if args.convert_ndjson or args.batch:
+            pass
+        elif (args.query or args.query_file or args.analyze_all) and args.test_mode:
+            # Запросы и метрики в тестовом режиме строятся по графу всего репозитория
+            pass
+        elif args.snapshot:
+            # Корневой пакет по умолчанию берется из снимка
+            pass
+        elif not args.package or not args.package.strip():
+            errors.append("Имя пакета не может быть пустым")
+
+        # Проверка репозитория (снимок графа заменяет репозиторий)
+        if args.snapshot:
+            if not os.path.isfile(args.snapshot):
+                errors.append(f"Файл снимка графа не существует: {args.snapshot}")
+        elif not args.repo or not args.repo.strip():
+            errors.append("Репозиторий не может быть пустым")
+        elif args.test_mode or args.convert_ndjson:
+            # В тестовом режиме проверяем существование файла
+            if not os.path.exists(args.repo):
+                errors.append(f"Файл репозитория не существует: {args.repo}")
+            elif not os.path.isfile(args.repo):
+                errors.append(f"Указанный путь не является файлом: {args.repo}")
+
+        if args.batch and args.batch != '-' and not os.path.isfile(args.batch):
+            errors.append(f"Файл списка пакетов не существует: {args.batch}")
+        if args.batch and args.reverse:
+            errors.append("Пакетный режим не совместим с режимом обратных зависимостей")
+        if (args.query or args.query_file) and (args.batch or args.reverse):
+            errors.append("Запросы достижимости не совместимы с пакетным режимом и режимом обратных зависимостей")
+        if args.query_file and args.query_file != '-' and not os.path.isfile(args.query_file):
+            errors.append(f"Файл запросов не существует: {args.query_file}")
+        if args.analyze_all and (args.batch or args.reverse or args.query or args.query_file):
+            errors.append("Анализ всего репозитория не совместим с пакетным режимом, режимом обратных "
+                          "зависимостей и запросами достижимости")
+
+        # Проверка параметров кэша
+        if args.cache_ttl < 0:
+            errors.append("Время жизни кэша не может быть отрицательным")
+        if args.cache_max_size <= 0:
+            errors.append("Размер кэша должен быть положительным")
+
+        if args.max_paths < 0:
+            errors.append("Число выводимых путей не может быть отрицательным")
+        if args.jobs < 1:
+            errors.append("Число параллельных загрузок должно быть не меньше 1")
+        if args.max_depth is not None and args.max_depth < 0:
+            errors.append("Максимальная глубина не может быть отрицательной")
+        if args.max_nodes is not None and args.max_nodes < 1:
+            errors.append("Предел числа пакетов должен быть не меньше 1")
+        if args.timeout is not None and args.timeout <= 0:
+            errors.append("Ограничение времени обхода должно быть положительным")
+        bounded = args.max_depth is not None or args.max_nodes is not None or args.timeout is not None
+        if (bounded or args.checkpoint) and (args.batch or args.reverse or args.state or args.query or args.query_file
+                                             or args.analyze_all):
+            errors.append("--max-depth, --max-nodes, --timeout и --checkpoint не совместимы с --batch, --reverse, "
+                          "--state, запросами достижимости и --analyze-all")
+        if args.checkpoint and (args.test_mode or args.snapshot):
+            errors.append("Контрольная точка используется только при обходе реестра")
+        if args.processes < 1:
+            errors.append("Число процессов должно быть не меньше 1")
+        if args.rate_limit < 0:
+            errors.append("Ограничение частоты запросов не может быть отрицательным")
+        if args.host_connections < 1:
+            errors.append("Число соединений с хостом должно быть не меньше 1")
+
+        # Проверка выходного файла
+        if not args.output or not args.output.strip():
+            errors.append("Имя выходного файла не может быть пустым")
+        else:
+            valid_extensions = ['.svg', '.png', '.jpg', '.jpeg']
+            if not any(args.output.lower().endswith(ext) for ext in valid_extensions):
+                errors.append(f"Неподдерживаемый формат файла. Допустимые: {', '.join(valid_extensions)}")
+
+        return errors
+
+    def fetch_package_info_from_npm(self, package_name):
+        """Получение информации о пакете из npm реестра (с учетом дискового кэша)
+
+        Потокобезопасно: одновременные запросы одного пакета ждут одну загрузку
+        и получают ее результат или ошибку.
+        """
+        package_info = self.packuments.get(package_name)
+        if package_info is not None:
+            return package_info
+
+        with self.fetch_lock:
+            package_info = self.packuments.get(package_name)
+            if package_info is not None:
+                return package_info
+            pending = self.pending_fetches.get(package_name)
+            if pending is None:
+                pending = self.pending_fetches[package_name] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return pending.result()
+
+        started = time.perf_counter()
+        source = 'error'
+        try:
+            package_info, source = self.load_package_info(package_name)
+            self.packuments[package_name] = package_info
+            pending.set_result(package_info)
+            return package_info
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            self.profiler.record_fetch(package_name, source, started)
+            with self.fetch_lock:
+                self.pending_fetches.pop(package_name, None)
+
+    def registry_get(self, url, headers=None):
+        """Запрос к реестру через общий ограничитель частоты (--rate-limit)"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        return self.registry_client.get(url, headers)
+
+    def cached_package_info(self, package_name):
+        """Packument из памяти или свежей записи дискового кэша, без обращения к сети (иначе None)"""
+        package_info = self.packuments.get(package_name)
+        if package_info is not None or self.packument_cache is None:
+            return package_info
+
+        started = time.perf_counter()
+        cache = self.packument_cache
+        entry = cache.get(package_name)
+        if entry is None or not cache.is_fresh(entry):
+            return None
+
+        cache.record('hits')
+        self.profiler.record_fetch(package_name, 'cache', started)
+        self.packuments[package_name] = entry['packument']
+        self.package_etags[package_name] = entry.get('etag')
+        return entry['packument']
+
+    def load_package_info(self, package_name):
+        """Packument пакета и его источник: 'cache', 'revalidated' или 'network'"""
+        cache = self.packument_cache
+        entry = cache.get(package_name) if cache else None
+
+        if entry is not None and cache.is_fresh(entry):
+            cache.record('hits')
+            self.package_etags[package_name] = entry.get('etag')
+            return entry['packument'], 'cache'
+
+        url = f"{self.registry_url}/{urllib.parse.quote(package_name, safe='@')}"
+        headers = {}
+        # Условный запрос: реестр ответит 304, если документ не изменился
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = self.registry_get(url, headers)
+        except (OSError, http.client.HTTPException) as e:
+            raise Exception(f"Ошибка сети: {e}")
+
+        if response.status == 304 and entry is not None:
+            cache.record('revalidated')
+            self.package_etags[package_name] = entry.get('etag')
+            return cache.refresh(package_name, entry)['packument'], 'revalidated'
+        if response.status == 404:
+            raise PackageNotFoundError(f"Пакет '{package_name}' не найден в npm реестру")
+        if response.status != 200:
+            raise Exception(f"Ошибка HTTP {response.status} при запросе к npm реестру: {response.body[:200]!r}")
+
+        try:
+            with self.profiler.span('json_parse', 'parse', package=package_name, bytes=len(response.body)):
+                data = json.loads(response.body.decode())
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise Exception(f"Ошибка парсинга JSON ответа: {e}")
+
+        self.package_etags[package_name] = response.headers.get('ETag')
+        if cache is None:
+            return trim_packument(data), 'network'
+        cache.record('misses')
+        packument = trim_packument(data)
+        cache.put(package_name, packument, response.headers.get('ETag'),
+                  response.headers.get('Last-Modified'))
+        return packument, 'network'
+
+    def configure_registry(self, args):
+        """Настройка адреса реестра и дискового кэша по аргументам командной строки"""
+        if not args.test_mode and args.repo.startswith(('http://', 'https://')):
+            self.registry_url = args.repo.rstrip('/')
+
+        self.ignore_ranges = args.ignore_ranges
+        self.registry_client.pool_size = args.host_connections
+        self.rate_limiter = TokenBucket(args.rate_limit) if args.rate_limit else None
+        self.processes = args.processes
+
+        if not args.test_mode and not args.no_cache:
+            self.packument_cache = PackumentCache(
+                args.cache_dir,
+                ttl=args.cache_ttl,
+                max_size=args.cache_max_size * 1024 * 1024,
+                registry_url=self.registry_url
+            )
+
+    def get_version_index(self, package_name, package_info):
+        """Индекс версий пакета (строится один раз на пакет)"""
+        index = self.version_indexes.get(package_name)
+        if index is None:
+            index = VersionIndex((package_info.get('versions') or {}).keys())
+            self.version_indexes[package_name] = index
+        return index
+
+    def warn(self, message):
+        """Предупреждение обхода: в warning_handler, если он задан, иначе в stdout"""
+        text = f"⚠️ Предупреждение: {message}"
+        if self.warning_handler is not None:
+            self.warning_handler(text)
+        else:
+            print(f"   {text}")
+
+    def select_version(self, package_name, package_info, range_text='latest'):
+        """Версия пакета, выбранная по диапазону, тегу dist-tags или как последняя"""
+        dist_tags = package_info.get('dist-tags') or {}
+        if range_text in dist_tags:
+            return dist_tags[range_text]
+
+        index = self.get_version_index(package_name, package_info)
+        version_range = SemverRange.parse(range_text) if range_text != 'latest' else None
+        if version_range is not None:
+            version = index.max_satisfying(version_range)
+            if version is not None:
+                return version
+            self.warn(f"нет версии '{package_name}', подходящей под '{range_text}'")
+
+        # Если нет latest, берем максимальную версию по правилам semver
+        return dist_tags.get('latest') or index.latest()
+
+    def resolve_dependency_spec(self, package_name, range_text):
+        """Узел графа 'имя@версия' для зависимости с диапазоном версий (с мемоизацией)"""
+        key = (package_name, range_text)
+        spec = self.resolved_ranges.get(key)
+        if spec is not None:
+            return spec
+
+        # Псевдонимы npm: "имя": "npm:другой-пакет@диапазон"
+        target_name, target_range = package_name, range_text
+        if range_text.startswith('npm:'):
+            target_name, target_range = split_package_spec(range_text[4:])
+            target_range = target_range or 'latest'
+
+        try:
+            package_info = self.fetch_package_info_from_npm(target_name)
+            version = self.select_version(target_name, package_info, target_range.strip() or '*')
+            spec = f"{target_name}@{version}" if version else target_name
+        except Exception as e:
+            self.warn(f"не удалось выбрать версию '{package_name}@{range_text}': {e}")
+            spec = target_name
+
+        self.resolved_ranges[key] = spec
+        return spec
+
+    def resolve_root_package(self, package_spec):
+        """Корневой узел 'имя@версия' (без версии берется dist-tags.latest)"""
+        name, version = split_package_spec(package_spec)
+        if version and parse_version(version) is not None:
+            return package_spec
+        package_info = self.fetch_package_info_from_npm(name)
+        version = self.select_version(name, package_info, version or 'latest')
+        return f"{name}@{version}" if version else name
+
+    def declared_dependencies(self, package_name):
+        """Объявленные зависимости узла {имя: диапазон} из packument'а пакета"""
+        name, version = split_package_spec(package_name)
+        package_info = self.fetch_package_info_from_npm(name)
+
+        if not version or self.ignore_ranges:
+            version = self.select_version(name, package_info)
+        if not version:
+            return {}
+
+        # Получаем зависимости для выбранной версии
+        version_info = (package_info.get('versions') or {}).get(version, {})
+        return version_info.get('dependencies') or {}
+
+    def get_dependencies_from_npm(self, package_name):
+        """Получение зависимостей пакета из npm реестра
+
+        Узлы имеют вид 'имя@версия'; зависимости разрешаются по объявленным
+        диапазонам версий. Для узла без версии берется dist-tags.latest, а при
+        ignore_ranges - прежнее поведение: последние версии и имена без версий.
+        """
+        try:
+            dependencies = self.declared_dependencies(package_name)
+
+            if not self.ignore_ranges:
+                dependencies = {
+                    self.resolve_dependency_spec(dep, range_text): range_text
+                    for dep, range_text in dependencies.items()
+                }
+
+        except Exception as e:
+            # Предупреждение выводится один раз на пакет, ошибка сохраняется до успешной загрузки
+            if package_name not in self.failed_packages:
+                self.warn(f"не удалось получить зависимости для '{package_name}': {e}")
+            self.failed_packages[package_name] = str(e)
+            return {}
+
+        self.failed_packages.pop(package_name, None)
+        return dependencies
+
+    def get_repository(self, file_path):
+        """Индекс тестового репозитория (файл разбирается только при первом обращении)"""
+        repository = self.repositories.get(file_path)
+        if repository is None:
+            with self.profiler.span('load_repository', 'parse', path=file_path):
+                repository = open_repository(file_path)
+            self.repositories[file_path] = repository
+        return repository
+
+    def get_dependencies_from_test_file(self, package_name, file_path):
+        """Получение зависимостей из тестового файла"""
+        return self.get_repository(file_path).get_dependencies(package_name)
+
+    def get_direct_dependencies(self, package_name, repo_url, test_mode=False):
+        """Получение прямых зависимостей пакета"""
+        if self.snapshot is not None:
+            return dict.fromkeys(self.snapshot.get(package_name) or ())
+
+        if test_mode:
+            return self.get_dependencies_from_test_file(package_name, repo_url)
+
+        dependencies = self.resolved_dependencies.get(package_name)
+        if dependencies is None:
+            dependencies = self.get_dependencies_from_npm(package_name)
+            # Неудачная загрузка не запоминается как пакет без зависимостей
+            if package_name not in self.failed_packages:
+                self.resolved_dependencies[package_name] = dependencies
+        return dependencies
+
+    def prefetch_dependencies(self, start_package, repo_url, test_mode=False, filter_substring="", jobs=8,
+                              rate_limit=0, host_connections=8, max_depth=None, max_nodes=None, deadline=None,
+                              checkpoint=None):
+        """Параллельная загрузка зависимостей асинхронным обходом реестра (AsyncRegistryCrawler)
+
+        start_package - корневой пакет или список корней (общие пакеты загружаются
+        один раз). Результаты попадают в resolved_dependencies, поэтому последующий
+        DFS строит тот же граф и тот же список циклов, что и последовательный
+        обход, но без ожидания сети на каждом шаге. rate_limit, если задан,
+        настраивает общий ограничитель частоты запросов.
+        """
+        if test_mode:
+            return
+
+        if rate_limit:
+            self.rate_limiter = TokenBucket(rate_limit)
+        roots = [start_package] if isinstance(start_package, str) else list(start_package)
+        crawler = AsyncRegistryCrawler(self, repo_url, jobs, host_connections, checkpoint)
+        crawler.crawl(roots, filter_substring, max_depth, max_nodes, deadline)
+
+    def should_filter_package(self, package_name, filter_substring):
+        """Проверка, нужно ли фильтровать пакет
+
+        filter_substring - подстрока (как раньше) или скомпилированный PackageFilter.
+        """
+        if not filter_substring:
+            return False
+        if not isinstance(filter_substring, PackageFilter):
+            filter_substring = self.get_package_filter(filter_substring)
+        return filter_substring.is_filtered(package_name)
+
+    def get_package_filter(self, filter_substring):
+        """Скомпилированный фильтр для подстроки (компилируется один раз за запуск)"""
+        package_filter = self.package_filters.get(filter_substring)
+        if package_filter is None:
+            package_filter = PackageFilter(exclude=[filter_substring])
+            self.package_filters[filter_substring] = package_filter
+        return package_filter
+
+    def build_dependency_graph_dfs(self, start_package, repo_url, test_mode=False, filter_substring="",
+                                   resolve=None, max_depth=None, max_nodes=None, deadline=None, checkpoint=None):
+        """Построение графа зависимостей с помощью DFS без рекурсии
+
+        Возвращает граф и список циклов в виде путей [A, B, ..., A] - по одному
+        на каждую группу пакетов, образующих циклическую зависимость. Функция
+        resolve(пакет) -> [зависимости] заменяет обращение к репозиторию.
+
+        max_depth (глубина по кратчайшему пути от корня), max_nodes (число раскрытых
+        пакетов) и deadline (момент time.monotonic()) останавливают раскрытие: нераскрытые пакеты
+        остаются в графе без зависимостей и перечисляются в truncated_packages.
+        После deadline раскрываются только пакеты с уже загруженными зависимостями.
+        checkpoint периодически получает загруженные зависимости.
+        """
+        stack = [start_package]
+        visited = {start_package}
+        depth = {start_package: 0}
+        graph = InternedGraph()
+        truncated = {}
+        self.truncated_packages = truncated
+        # Раскрытые пакеты; node_count учитывал бы и еще не раскрытых детей
+        expanded = 0
+
+        while stack:
+            current_package = stack.pop()
+            current_depth = depth[current_package]
+
+            if current_package in graph:
+                # Пакет найден на меньшей глубине: передаем новую глубину его зависимостям
+                dependency_names = graph[current_package]
+            else:
+                # Пропускаем пакеты по фильтру
+                if self.should_filter_package(current_package, filter_substring):
+                    print(f"   🚫 Пакет '{current_package}' отфильтрован")
+                    graph.add_package(current_package, [])
+                    continue
+
+                if max_depth is not None and current_depth >= max_depth:
+                    truncated[current_package] = 'depth'
+                    continue
+                if max_nodes is not None and expanded >= max_nodes:
+                    truncated[current_package] = 'nodes'
+                    continue
+                if (deadline is not None and time.monotonic() >= deadline
+                        and (test_mode or current_package not in self.resolved_dependencies)):
+                    truncated[current_package] = 'timeout'
+                    continue
+                truncated.pop(current_package, None)
+
+                if resolve is not None:
+                    dependency_names = resolve(current_package)
+                else:
+                    dependencies = self.get_direct_dependencies(current_package, repo_url, test_mode)
+                    dependency_names = list(dependencies.keys())
+                graph.add_package(current_package, dependency_names)
+                expanded += 1
+                print(f"   📦 {current_package} -> {dependency_names}")
+
+                if checkpoint is not None and checkpoint.due():
+                    checkpoint.save(self.resolved_dependencies, self.failed_packages)
+
+            # Добавляем в стек для дальнейшего обхода
+            for dep in reversed(dependency_names):
+                if dep not in visited:
+                    visited.add(dep)
+                    depth[dep] = current_depth + 1
+                    stack.append(dep)
+                elif max_depth is not None and current_depth + 1 < depth[dep]:
+                    depth[dep] = current_depth + 1
+                    stack.append(dep)
+
+        # Нераскрытые пакеты фронтира остаются в графе без зависимостей
+        for package in truncated:
+            graph.add_package(package, [])
+        if truncated:
+            print(f"   ✂️ Обход остановлен досрочно: {len(truncated)} пакетов не раскрыто")
+
+        # Циклы определяются одним проходом по компонентам сильной связности
+        cycles = self.detect_cycles(graph)
+        return graph, cycles
+
+    def package_hash(self, package_name, repo_url, test_mode=False):
+        """Хэш текущего словаря зависимостей пакета в источнике данных"""
+        if self.snapshot is None and test_mode:
+            repository = self.get_repository(repo_url)
+            return repository.package_hash(package_name)
+        return dependency_hash(self.get_direct_dependencies(package_name, repo_url, test_mode))
+
+    def package_unchanged(self, package_name, etag):
+        """Проверка packument'а по ETag прошлого запуска без загрузки неизменившегося документа
+
+        Свежая запись дискового кэша с тем же ETag не требует обращения к сети, иначе
+        выполняется условный запрос. Изменившийся документ сохраняется в памяти, и
+        разрешение зависимостей не загружает его повторно.
+        """
+        cache = self.packument_cache
+        entry = cache.get(package_name) if cache else None
+        if entry is not None and cache.is_fresh(entry) and entry.get('etag') == etag:
+            cache.record('hits')
+            self.package_etags[package_name] = etag
+            return True
+
+        url = f"{self.registry_url}/{urllib.parse.quote(package_name, safe='@')}"
+        try:
+            response = self.registry_get(url, {'If-None-Match': etag})
+        except (OSError, http.client.HTTPException):
+            return False
+
+        if response.status == 304:
+            if entry is not None and entry.get('etag') == etag:
+                cache.refresh(package_name, entry)
+            self.package_etags[package_name] = etag
+            return True
+        if response.status == 200:
+            try:
+                data = json.loads(response.body.decode())
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                return False
+            packument = trim_packument(data)
+            self.packuments[package_name] = packument
+            self.package_etags[package_name] = response.headers.get('ETag')
+            if cache is not None:
+                cache.record('misses')
+                cache.put(package_name, packument, response.headers.get('ETag'),
+                          response.headers.get('Last-Modified'))
+        return False
+
+    def source_signature(self, repo_url, test_mode=False):
+        """Подпись источника данных: совпадение означает, что файл не менялся"""
+        if self.snapshot is not None:
+            path = self.snapshot.file_path
+        elif test_mode:
+            path = repo_url
+        else:
+            # Реестр npm проверяется по хэшам отдельных пакетов
+            return None
+
+        stat = os.stat(path)
+        return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+    def load_state(self, state_file):
+        """Состояние предыдущего запуска или None"""
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"   ⚠️ Предупреждение: не удалось прочитать состояние '{state_file}': {e}")
+            return None
+
+        if not isinstance(state, dict) or state.get('version') != 1:
+            return None
+        return state
+
+    def save_state(self, state_file, state):
+        """Атомарная запись состояния запуска"""
+        temp_path = state_file + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp_path, state_file)
+
+    def build_dependency_graph_incremental(self, start_package, repo_url, test_mode=False, filter_substring="",
+                                           state_file=""):
+        """Построение графа с повторным использованием результата предыдущего запуска
+
+        Работа начинается с сохраненного графа. В реестре packument'ы проверяются
+        условным запросом с ETag прошлого запуска (неизменившийся документ не
+        загружается), и хэши сравниваются только у узлов, чей packument или
+        packument зависимости изменился; в репозитории сравниваются хэши словарей
+        зависимостей. Заново разрешаются только изменившиеся пакеты и новые пакеты,
+        на которые они теперь ссылаются. Возвращает граф, циклы и описание изменений (или
+        None, если сохраненного состояния нет).
+        """
+        signature = self.source_signature(repo_url, test_mode)
+        state = self.load_state(state_file)
+        if state is not None and (state.get('root') != start_package or state.get('filter') != str(filter_substring or '')):
+            print("   ⚠️ Сохраненное состояние относится к другому пакету или фильтру, выполняется полный обход")
+            state = None
+
+        if state is None:
+            hashes = {}
+
+            def resolve(package):
+                dependencies = self.get_direct_dependencies(package, repo_url, test_mode)
+                hashes[package] = dependency_hash(dependencies)
+                return list(dependencies.keys())
+
+            graph, cycles = self.build_dependency_graph_dfs(start_package, repo_url, test_mode,
+                                                            filter_substring, resolve)
+            delta = None
+        else:
+            graph, hashes, changed = self.update_saved_graph(state, signature, start_package, repo_url,
+                                                             test_mode, filter_substring)
+            cycles = self.detect_cycles(graph)
+            delta = self.graph_delta(state['graph'], graph, changed)
+
+        # Сохраняются хэши только раскрытых (неотфильтрованных) пакетов графа
+        self.save_state(state_file, {
+            'version': 1,
+            'root': start_package,
+            'filter': str(filter_substring or ''),
+            'signature': signature,
+            'graph': dict(graph),
+            'hashes': {package: hashes[package] for package in graph if package in hashes},
+            'etags': {name: etag for name, etag in self.package_etags.items() if etag},
+        })
+
+        return graph, cycles, delta
+
+    def update_saved_graph(self, state, signature, start_package, repo_url, test_mode, filter_substring):
+        """Обновление сохраненного графа: разрешаются только изменившиеся и новые пакеты
+
+        Возвращает граф, хэши зависимостей раскрытых пакетов и множество
+        изменившихся пакетов.
+        """
+        dependencies_of = {package: list(deps) for package, deps in state['graph'].items()}
+        previous_hashes = state['hashes']
+        previous_etags = state.get('etags') or {}
+        hashes = dict(previous_hashes)
+        changed = set()
+
+        if signature is None or state.get('signature') != signature:
+            candidates = previous_hashes
+            if not test_mode and self.snapshot is None:
+                candidates = self.registry_change_candidates(dependencies_of, previous_hashes, previous_etags)
+            for package in candidates:
+                if self.package_hash(package, repo_url, test_mode) != previous_hashes[package]:
+                    changed.add(package)
+        # Иначе источник не менялся: все сохраненные зависимости актуальны
+        print(f"♻️ Изменившихся пакетов с прошлого запуска: {len(changed)}")
+
+        # Повторный обход начинается только от изменившихся пакетов
+        stack = sorted(changed, reverse=True)
+        queued = set(stack)
+        while stack:
+            package = stack.pop()
+            if self.should_filter_package(package, filter_substring):
+                print(f"   🚫 Пакет '{package}' отфильтрован")
+                dependencies_of[package] = []
+                hashes.pop(package, None)
+                continue
+
+            dependencies = self.get_direct_dependencies(package, repo_url, test_mode)
+            hashes[package] = dependency_hash(dependencies)
+            dependency_names = list(dependencies.keys())
+            dependencies_of[package] = dependency_names
+            print(f"   📦 {package} -> {dependency_names}")
+            for dep in reversed(dependency_names):
+                if dep not in dependencies_of and dep not in queued:
+                    queued.add(dep)
+                    stack.append(dep)
+
+        # Граф собирается из словаря в порядке DFS от корня, что отбрасывает ставшие
+        # недостижимыми пакеты и сохраняет порядок полного обхода
+        graph = InternedGraph()
+        stack = [start_package]
+        visited = {start_package}
+        while stack:
+            package = stack.pop()
+            dependency_names = dependencies_of.get(package, [])
+            graph.add_package(package, dependency_names)
+            for dep in reversed(dependency_names):
+                if dep not in visited:
+                    visited.add(dep)
+                    stack.append(dep)
+
+        self.truncated_packages = {}
+        return graph, hashes, changed
+
+    def registry_change_candidates(self, dependencies_of, previous_hashes, previous_etags):
+        """Раскрытые узлы, зависимости которых могли измениться с прошлого запуска
+
+        Зависимости узла 'имя@версия' определяются его packument'ом и packument'ами
+        зависимостей (по ним разрешаются диапазоны), поэтому кандидатом становится
+        узел, у которого изменился хотя бы один из этих документов или нет ETag.
+        """
+        changed_names = {name for name, etag in previous_etags.items() if not self.package_unchanged(name, etag)}
+        candidates = []
+        for package in previous_hashes:
+            names = [split_package_spec(package)[0]]
+            names.extend(split_package_spec(dep)[0] for dep in dependencies_of.get(package, ()))
+            if any(name in changed_names or name not in previous_etags for name in names):
+                candidates.append(package)
+        return candidates
+
+    def graph_delta(self, previous_graph, graph, changed):
+        """Изменения графа: добавленные и удаленные ребра, новые и исчезнувшие группы циклов"""
+        previous_edges = {(package, dep) for package, deps in previous_graph.items() for dep in deps}
+        edges = {(package, dep) for package, deps in graph.items() for dep in deps}
+        previous_groups = {frozenset(group) for group in find_cycle_groups(previous_graph)}
+        groups = {frozenset(group) for group in find_cycle_groups(graph)}
+
+        return {
+            'changed_packages': sorted(changed),
+            'added_packages': sorted(set(graph) - set(previous_graph)),
+            'removed_packages': sorted(set(previous_graph) - set(graph)),
+            'added_edges': sorted(edges - previous_edges),
+            'removed_edges': sorted(previous_edges - edges),
+            'new_cycles': [sorted(group) for group in groups - previous_groups],
+            'broken_cycles': [sorted(group) for group in previous_groups - groups],
+        }
+
+    def print_delta(self, delta):
+        """Вывод изменений относительно предыдущего запуска"""
+        print("🔀 Изменения относительно предыдущего запуска:")
+        if not any(delta.values()):
+            print("   Граф не изменился")
+            return
+
+        for package in delta['added_packages']:
+            print(f"   + пакет {package}")
+        for package in delta['removed_packages']:
+            print(f"   - пакет {package}")
+        for package, dep in delta['added_edges']:
+            print(f"   + {package} -> {dep}")
+        for package, dep in delta['removed_edges']:
+            print(f"   - {package} -> {dep}")
+        for group in delta['new_cycles']:
+            print(f"   🔁 Новый цикл: {', '.join(group)}")
+        for group in delta['broken_cycles']:
+            print(f"   ✅ Цикл устранен: {', '.join(group)}")
+
+    def detect_cycles(self, graph):
+        """Циклические зависимости графа: по одному пути-циклу на каждую группу"""
+        groups = find_cycle_groups(graph)
+        if self.processes > 1 and len(groups) >= self.MIN_PARALLEL_ITEMS:
+            # Пути циклов по компонентам сильной связности ищутся в пуле процессов
+            with ProcessPoolAnalyzer(graph, self.processes, 'cycles') as pool:
+                cycles = pool.map(groups)
+        else:
+            cycles = [cycle_path(graph, component) for component in groups]
+        for cycle in cycles:
+            print(f"   🔁 Обнаружена циклическая зависимость: {' -> '.join(cycle)}")
+        return cycles
+
+    def read_batch_roots(self, batch_file):
+        """Список корневых пакетов пакетного режима (файл или '-' для stdin)"""
+        if batch_file == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            try:
+                with open(batch_file, 'r', encoding='utf-8') as f:
+                    lines = f.read().splitlines()
+            except FileNotFoundError:
+                raise Exception(f"Файл списка пакетов '{batch_file}' не найден")
+
+        roots = []
+        seen = set()
+        for line in lines:
+            package = line.split('#', 1)[0].strip()
+            if package and package not in seen:
+                seen.add(package)
+                roots.append(package)
+        return roots
+
+    def build_shared_graph(self, roots, repo_url, test_mode=False, filter_substring=""):
+        """Общий граф для нескольких корневых пакетов: каждый пакет разрешается один раз
+
+        Отфильтрованные пакеты, как и в DFS, попадают в граф без зависимостей.
+        """
+        graph = InternedGraph()
+        seen = set(roots)
+        queue = deque(roots)
+
+        while queue:
+            current_package = queue.popleft()
+
+            if self.should_filter_package(current_package, filter_substring):
+                graph.add_package(current_package, [])
+                continue
+
+            dependency_names = list(self.get_direct_dependencies(current_package, repo_url, test_mode).keys())
+            graph.add_package(current_package, dependency_names)
+            for dep in dependency_names:
+                if dep not in seen:
+                    seen.add(dep)
+                    queue.append(dep)
+
+        return graph
 
-        parser.add_argument(
-            '--reverse',
-            action='store_true',
-            help='Режим вывода обратных зависимостей'
-        )
+    def extract_subgraph(self, graph, start_package):
+        """Подграф, достижимый из пакета, в порядке обхода build_dependency_graph_dfs"""
+        subgraph = InternedGraph()
+        stack = [start_package]
+        visited = {start_package}
 
-        return parser.parse_args()
+        while stack:
+            current_package = stack.pop()
+            dependency_names = graph.get(current_package) or []
+            subgraph.add_package(current_package, dependency_names)
 
-    def validate_arguments(self, args):
-        """Валидация аргументов командной строки"""
-        errors = []
+            for dep in reversed(dependency_names):
+                if dep not in visited:
+                    visited.add(dep)
+                    stack.append(dep)
 
-        # Проверка имени пакета
-        if not args.package or not args.package.strip():
-            errors.append("Имя пакета не может быть пустым")
+        return subgraph
 
-        # Проверка репозитория
-        if not args.repo or not args.repo.strip():
-            errors.append("Репозиторий не может быть пустым")
-        elif args.test_mode:
-            # В тестовом режиме проверяем существование файла
-            if not os.path.exists(args.repo):
-                errors.append(f"Файл репозитория не существует: {args.repo}")
-            elif not os.path.isfile(args.repo):
-                errors.append(f"Указанный путь не является файлом: {args.repo}")
+    def run_batch(self, args):
+        """Пакетный режим: анализ списка корневых пакетов в одном процессе с общим графом"""
+        roots = self.read_batch_roots(args.batch)
+        if not roots:
+            raise Exception("Список корневых пакетов пуст")
 
-        # Проверка выходного файла
-        if not args.output or not args.output.strip():
-            errors.append("Имя выходного файла не может быть пустым")
-        else:
-            valid_extensions = ['.svg', '.png', '.jpg', '.jpeg']
-            if not any(args.output.lower().endswith(ext) for ext in valid_extensions):
-                errors.append(f"Неподдерживаемый формат файла. Допустимые: {', '.join(valid_extensions)}")
+        if self.snapshot is None and not args.test_mode and not args.ignore_ranges:
+            roots = [self.resolve_root_package(root) for root in roots]
 
-        return errors
+        print(f"📋 Пакетный режим: {len(roots)} корневых пакетов")
 
-    def fetch_package_info_from_npm(self, package_name):
-        """Получение информации о пакете из npm реестра"""
-        url = f"https://registry.npmjs.org/{package_name}"
+        if args.jobs > 1 and not args.test_mode and self.snapshot is None:
+            print(f"⚡ Параллельная загрузка зависимостей ({args.jobs} потоков)...")
+            with self.profiler.phase('prefetch'):
+                self.prefetch_dependencies(roots, args.repo, args.test_mode, args.filter, args.jobs,
+                                           host_connections=args.host_connections)
 
-        try:
-            # Добавляем User-Agent для избежания блокировки
-            req = urllib.request.Request(
-                url,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                    'Accept': 'application/json'
-                }
-            )
-            with urllib.request.urlopen(req, timeout=10) as response:
-                data = json.loads(response.read().decode())
-                return data
-        except urllib.error.HTTPError as e:
-            if e.code == 404:
-                raise Exception(f"Пакет '{package_name}' не найден в npm реестру")
+        with self.profiler.phase('traversal'):
+            shared_graph = self.build_shared_graph(roots, args.repo, args.test_mode, args.filter)
+        self.profiler.graph = shared_graph
+        print(f"🔗 Общий граф: {len(shared_graph)} пакетов, {shared_graph.edge_count} зависимостей")
+
+        with_records = bool(args.batch_output)
+        with self.profiler.phase('analysis'):
+            if self.processes > 1 and len(roots) > 1:
+                # Корни анализируются независимо: каждый процесс читает общий граф из снимка
+                print(f"🧵 Анализ корней в {self.processes} процессах")
+                parameters = (with_records, dict(self.failed_packages), dict(self.truncated_packages))
+                with ProcessPoolAnalyzer(shared_graph, self.processes, 'batch', parameters) as pool:
+                    results = pool.map(roots)
             else:
-                raise Exception(f"Ошибка HTTP {e.code} при запросе к npm реестру: {e}")
-        except urllib.error.URLError as e:
-            raise Exception(f"Ошибка сети: {e}")
-        except json.JSONDecodeError as e:
-            raise Exception(f"Ошибка парсинга JSON ответа: {e}")
-        except Exception as e:
-            raise Exception(f"Неожиданная ошибка: {e}")
+                results = (self.analyze_batch_root(shared_graph, root, with_records) for root in roots)
 
-    def get_dependencies_from_npm(self, package_name):
-        """Получение зависимостей пакета из npm реестра"""
-        try:
-            package_info = self.fetch_package_info_from_npm(package_name)
+            output = open(args.batch_output, 'w', encoding='utf-8') if args.batch_output else None
+            try:
+                for report, record in results:
+                    sys.stdout.write(report)
+                    if output is not None:
+                        output.write(record + '\n')
+            finally:
+                if output is not None:
+                    output.close()
 
-            # Получаем последнюю версию
-            if 'dist-tags' in package_info and 'latest' in package_info['dist-tags']:
-                latest_version = package_info['dist-tags']['latest']
-            else:
-                # Если нет latest, берем последнюю версию из versions
-                versions = list(package_info.get('versions', {}).keys())
-                if not versions:
-                    return {}
-                latest_version = sorted(versions)[-1]
+        if args.batch_output:
+            print(f"\n💾 Результаты сохранены: {args.batch_output}")
 
-            # Получаем зависимости для последней версии
-            version_info = package_info['versions'].get(latest_version, {})
-            dependencies = version_info.get('dependencies', {})
+    def analyze_batch_root(self, shared_graph, root, with_record=False):
+        """Отчет по одному корню пакетного режима: текст вывода и строка JSONL (или None)"""
+        graph = self.extract_subgraph(shared_graph, root)
+        cycles = [cycle_path(graph, component) for component in find_cycle_groups(graph)]
 
-            return dependencies
+        report = io.StringIO()
+        with redirect_stdout(report):
+            print("=" * 60)
+            print(f"🎯 Анализ пакета: {root}")
+            self.print_cycles(graph, cycles)
+            self.print_dependency_graph(graph, root)
+            self.print_statistics(graph, cycles)
 
-        except Exception as e:
-            print(f"   ⚠️ Предупреждение: не удалось получить зависимости для '{package_name}': {e}")
-            return {}
+        record = None
+        if with_record:
+            record = json.dumps({
+                'package': root,
+                'graph': dict(graph),
+                'cycles': cycles,
+                'statistics': self.graph_statistics(graph, cycles),
+            }, ensure_ascii=False)
+        return report.getvalue(), record
 
-    def get_dependencies_from_test_file(self, package_name, file_path):
-        """Получение зависимостей из тестового файла"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except FileNotFoundError:
-            raise Exception(f"Файл '{file_path}' не найден")
-        except json.JSONDecodeError as e:
-            raise Exception(f"Ошибка парсинга JSON файла: {e}")
+    def read_queries(self, args):
+        """Запросы достижимости из --query и --query-file: пары (A, B) или (A, None)"""
+        lines = list(args.query)
+        if args.query_file == '-':
+            lines.extend(sys.stdin.read().splitlines())
+        elif args.query_file:
+            with open(args.query_file, 'r', encoding='utf-8') as f:
+                lines.extend(f.read().splitlines())
 
-        # Ищем информацию о пакете в тестовом файле
-        if isinstance(data, dict):
-            # Если файл содержит информацию об одном пакете
-            if data.get('name') == package_name or 'dependencies' in data:
-                return data.get('dependencies', {})
-            # Если файл содержит информацию о нескольких пакетах
-            elif package_name in data:
-                package_data = data[package_name]
-                if isinstance(package_data, dict) and 'dependencies' in package_data:
-                    return package_data['dependencies']
-                elif isinstance(package_data, dict):
-                    return package_data
-        elif isinstance(data, list):
-            # Если файл содержит список пакетов
-            for package in data:
-                if package.get('name') == package_name:
-                    return package.get('dependencies', {})
+        queries = []
+        for line in lines:
+            text = line.split('#', 1)[0].strip()
+            if not text:
+                continue
+            parts = text.split(':', 1) if ':' in text else text.split(None, 1)
+            package = parts[0].strip()
+            dependency = parts[1].strip() if len(parts) > 1 else None
+            queries.append((package, dependency or None))
+        return queries
 
-        return {}
+    def build_query_graph(self, args):
+        """Граф для запросов и метрик: снимок, весь тестовый репозиторий или обход от --package"""
+        if self.snapshot is not None and not args.filter:
+            return self.snapshot
+        if self.snapshot is not None:
+            return self.build_repository_graph(list(self.snapshot), args.repo, False, args.filter)
+        if args.test_mode:
+            packages = self.get_repository(args.repo).package_names()
+            return self.build_repository_graph(packages, args.repo, True, args.filter)
 
-    def get_direct_dependencies(self, package_name, repo_url, test_mode=False):
-        """Получение прямых зависимостей пакета"""
-        if test_mode:
-            return self.get_dependencies_from_test_file(package_name, repo_url)
-        else:
-            return self.get_dependencies_from_npm(package_name)
+        if args.jobs > 1:
+            self.prefetch_dependencies(args.package, args.repo, False, args.filter,
+                                       args.jobs, host_connections=args.host_connections)
+        # Построчный вывод обхода в режиме запросов не нужен
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, redirect_stdout(devnull):
+            graph, _ = self.build_dependency_graph_dfs(args.package, args.repo, False, args.filter)
+        return graph
 
-    def should_filter_package(self, package_name, filter_substring):
-        """Проверка, нужно ли фильтровать пакет"""
-        if not filter_substring:
-            return False
-        return filter_substring.lower() in package_name.lower()
+    def run_queries(self, args):
+        """Режим запросов: индекс достижимости строится один раз, затем отвечает на все запросы"""
+        queries = self.read_queries(args)
+        if not queries:
+            raise Exception("Список запросов пуст")
 
-    def build_dependency_graph_dfs(self, start_package, repo_url, test_mode=False, filter_substring=""):
-        """Построение графа зависимостей с помощью DFS без рекурсии"""
-        # Стек содержит (текущий_пакет, путь_от_корня)
-        stack = [(start_package, [])]
-        visited = set()
-        graph = {}
-        cycles = []
+        with self.profiler.phase('traversal'):
+            graph = self.build_query_graph(args)
+        self.profiler.graph = graph
 
-        while stack:
-            current_package, path = stack.pop()
+        with self.profiler.phase('reachability_index'):
+            index = ReachabilityIndex(graph)
+        print(f"🧭 Индекс достижимости: {len(index)} пакетов, {index.component_count} компонент сильной связности")
 
-            # Пропускаем пакеты по фильтру
-            if self.should_filter_package(current_package, filter_substring):
-                print(f"   🚫 Пакет '{current_package}' отфильтрован")
-                graph[current_package] = []
-                continue
+        with self.profiler.phase('queries'):
+            for package, dependency in queries:
+                sources = index.packages(package)
+                if not sources:
+                    print(f"   ❓ {package}: пакет отсутствует в графе")
+                    continue
 
-            # Если пакет уже в графе, пропускаем получение зависимостей
-            if current_package not in graph:
-                dependencies = self.get_direct_dependencies(current_package, repo_url, test_mode)
-                dependency_names = list(dependencies.keys())
-                graph[current_package] = dependency_names
-                print(f"   📦 {current_package} -> {dependency_names}")
+                if dependency is None:
+                    for source in sources:
+                        print(f"   📦 {source}: транзитивных зависимостей {index.dependency_count(source)}, "
+                              f"зависящих пакетов {index.dependent_count(source)}")
+                    continue
 
-            # Обрабатываем зависимости
-            for dep in reversed(graph[current_package]):
-                # Проверяем циклическую зависимость
-                if dep in path:
-                    cycle_start = path.index(dep)
-                    cycle = path[cycle_start:] + [current_package, dep]
-                    if cycle not in cycles:
-                        cycles.append(cycle)
-                        print(f"   🔁 Обнаружена циклическая зависимость: {' -> '.join(cycle)}")
+                targets = index.packages(dependency)
+                if not targets:
+                    print(f"   ❓ {dependency}: пакет отсутствует в графе")
                     continue
 
-                # Добавляем в стек для дальнейшего обхода
-                if dep not in visited:
-                    visited.add(dep)
-                    stack.append((dep, path + [current_package]))
+                matches = [(source, target) for source in sources for target in targets
+                           if index.depends_on(source, target)]
+                if matches:
+                    source, target = matches[0]
+                    print(f"   ✅ {source} зависит от {target}")
+                else:
+                    print(f"   ❌ {package} не зависит от {dependency}")
 
-        return graph, cycles
+    def run_analysis_all(self, args):
+        """Метрики всех пакетов графа одним проходом по конденсации с записью в CSV или JSONL"""
+        output_format = args.analyze_format
+        if output_format is None:
+            output_format = 'csv' if args.analyze_all.lower().endswith('.csv') else 'jsonl'
+
+        with self.profiler.phase('traversal'):
+            graph = self.build_query_graph(args)
+        self.profiler.graph = graph
+
+        with self.profiler.phase('analysis'):
+            metrics = RepositoryMetrics(graph)
+
+        with self.profiler.phase('emit'):
+            if args.analyze_all == '-':
+                stream = self.data_stream or sys.stdout
+                metrics.write(output_format, stream)
+                stream.flush()
+                return
+            with open(args.analyze_all, 'w', encoding='utf-8') as f:
+                metrics.write(output_format, f)
+
+        print(f"📊 Метрики {len(metrics)} пакетов ({metrics.index.component_count} компонент сильной связности) "
+              f"сохранены: {args.analyze_all}")
+        print("💥 Наибольший радиус поражения:")
+        for package in metrics.ranking[:10]:
+            record = metrics.record(package)
+            print(f"   {record['blast_rank']}. {package}: зависящих пакетов {record['transitive_dependents']} "
+                  f"(прямых {record['direct_dependents']}), глубина {record['depth']}")
 
     def find_all_paths_to_target(self, start_package, target_package, repo_url, test_mode=False, filter_substring=""):
         """Находит все пути от start_package до target_package"""
@@ -265,106 +3803,254 @@ class DependencyVisualizer:
 
         return paths
 
-    def find_reverse_dependencies(self, target_package, repo_url, test_mode=False, filter_substring=""):
-        """Поиск обратных зависимостей с помощью DFS"""
+    def find_reverse_dependencies(self, target_package, repo_url, test_mode=False, filter_substring="", max_paths=0):
+        """Поиск обратных зависимостей по индексу обратных ребер
+
+        Для каждого зависящего пакета сообщается прямая зависимость или первый
+        промежуточный пакет на пути к цели. При max_paths > 0 дополнительно
+        выводится не более max_paths полных путей через каждый такой пакет.
+        """
         print(f"🔍 Поиск обратных зависимостей для пакета '{target_package}':")
 
         # Сначала строим полный граф из всех пакетов в репозитории
-        if test_mode:
-            # В тестовом режиме получаем все пакеты из файла
+        if self.snapshot is not None:
+            # Все пакеты снимка графа
+            all_packages = list(self.snapshot)
+        elif test_mode:
+            # В тестовом режиме получаем все пакеты из индекса репозитория
             try:
-                with open(repo_url, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                all_packages = self.get_repository(repo_url).package_names()
             except Exception as e:
                 print(f"❌ Ошибка загрузки тестового файла: {e}")
                 return []
-
-            all_packages = []
-            if isinstance(data, dict):
-                # Если файл содержит несколько пакетов
-                if 'name' in data and 'dependencies' in data:
-                    # Один пакет в файле
-                    all_packages = [data['name']]
-                else:
-                    # Несколько пакетов в файле
-                    all_packages = list(data.keys())
-            elif isinstance(data, list):
-                # Список пакетов
-                all_packages = [pkg.get('name') for pkg in data if pkg.get('name')]
         else:
             # В реальном режиме ограничимся известными популярными пакетами для демонстрации
             print("   ⚠️ В реальном режиме поиск обратных зависимостей ограничен")
             popular_packages = ["express", "react", "lodash", "axios", "webpack"]
             all_packages = popular_packages
 
-        reverse_deps = []
+        # Прямой граф строится один раз и обращается в индекс обратных зависимостей
+        if self.snapshot is not None and not filter_substring:
+            forward_graph = self.snapshot
+        else:
+            forward_graph = self.build_repository_graph(all_packages, repo_url, test_mode, filter_substring)
+        reverse_index = self.build_reverse_index(forward_graph)
 
-        # Для каждого пакета проверяем, зависит ли он от target_package
-        for package in all_packages:
-            if package == target_package:
-                continue
+        # Цель без версии соответствует всем узлам 'имя@версия' этого пакета
+        if target_package in forward_graph:
+            targets = {target_package}
+        else:
+            targets = {package for package in forward_graph if split_package_spec(package)[0] == target_package}
+        if not targets:
+            return []
 
-            # Пропускаем по фильтру
-            if self.should_filter_package(package, filter_substring):
-                continue
+        # Один BFS от целевого пакета: расстояние до него от каждого зависящего пакета
+        distance = self.target_distances(reverse_index, targets)
 
-            # Находим все пути от package до target_package
-            paths = self.find_all_paths_to_target(package, target_package, repo_url, test_mode, filter_substring)
+        # Номер компоненты сильной связности для каждого пакета, зависящего от цели
+        components = self.component_numbers(forward_graph)
 
-            for path in paths:
-                if len(path) == 2:
-                    # Прямая зависимость
-                    reverse_deps.append((package, "прямая"))
-                    print(f"   ✅ {package} -> {target_package} (прямая зависимость)")
-                else:
-                    # Транзитивная зависимость
-                    intermediate = path[1]  # Первый промежуточный пакет
-                    reverse_deps.append((package, f"транзитивная через {intermediate}"))
-                    path_str = " -> ".join(path)
-                    print(f"   🔄 {path_str} (транзитивная)")
+        candidates = [
+            package for package in all_packages
+            if package not in targets and package in distance
+            and not self.should_filter_package(package, filter_substring)
+        ]
+
+        if self.processes > 1 and len(candidates) >= self.MIN_PARALLEL_ITEMS:
+            # Проверки путей для зависящих пакетов независимы и делятся между процессами. Расстояния
+            # и номера компонент передаются готовыми; компоненты нужны только пакетам, зависящим от цели
+            parameters = (sorted(targets), target_package, max_paths, distance,
+                          {package: components[package] for package in distance})
+            with ProcessPoolAnalyzer(forward_graph, self.processes, 'reverse', parameters) as pool:
+                results = pool.map(candidates)
+        else:
+            results = (self.classify_dependent(forward_graph, distance, components, targets, target_package,
+                                               package, max_paths) for package in candidates)
+
+        reverse_deps = []
+        for entries, lines in results:
+            reverse_deps.extend(entries)
+            for line in lines:
+                print(line)
 
         return reverse_deps
 
-    def generate_mermaid_diagram(self, graph, start_package):
-        """Генерация текстового представления графа на языке Mermaid"""
-        mermaid_code = "%% Дерево зависимостей для пакета " + start_package + "\n"
-        mermaid_code += "graph TD\n"
+    def target_distances(self, reverse_index, targets):
+        """Расстояние до ближайшей цели для каждого пакета, из которого цель достижима (BFS)"""
+        distance = dict.fromkeys(targets, 0)
+        queue = deque(targets)
+        while queue:
+            current_package = queue.popleft()
+            for parent in reverse_index.get(current_package, ()):
+                if parent not in distance:
+                    distance[parent] = distance[current_package] + 1
+                    queue.append(parent)
+        return distance
 
-        # Добавляем стартовый пакет с особым стилем
-        mermaid_code += f"    {start_package.replace('-', '_')}[{start_package}]:::root\n"
+    def component_numbers(self, graph):
+        """Номер компоненты сильной связности для каждого пакета графа"""
+        components = {}
+        for number, component in enumerate(strongly_connected_components(graph)):
+            for package in component:
+                components[package] = number
+        return components
+
+    def classify_dependent(self, forward_graph, distance, components, targets, target_package, package,
+                           max_paths=0):
+        """Виды зависимости пакета от цели и строки вывода: ([(пакет, вид)], [строки])"""
+        entries = []
+        lines = []
+        for dep in forward_graph[package]:
+            if dep in targets:
+                # Прямая зависимость
+                entries.append((package, "прямая"))
+                lines.append(f"   ✅ {package} -> {dep} (прямая зависимость)")
+            elif dep in distance and self.reaches_target_without(
+                    forward_graph, distance, dep, targets, package, components):
+                # Транзитивная зависимость через первый промежуточный пакет dep
+                entries.append((package, f"транзитивная через {dep}"))
+                if max_paths:
+                    for path in self.enumerate_paths(forward_graph, distance, [package, dep], targets, max_paths):
+                        lines.append(f"   🔄 {' -> '.join(path)} (транзитивная)")
+                else:
+                    via = " -> " if distance[dep] == 1 else " -> ... -> "
+                    lines.append(f"   🔄 {package} -> {dep}{via}{target_package} (транзитивная)")
+        return entries, lines
 
-        # Добавляем все зависимости
-        edges = set()
-        nodes = set([start_package.replace('-', '_')])
+    def build_repository_graph(self, packages, repo_url, test_mode=False, filter_substring=""):
+        """Прямой граф зависимостей, замкнутый от заданных пакетов (отфильтрованные пакеты исключаются)"""
+        graph = InternedGraph()
+        seen = set()
+        queue = deque()
 
-        for package, dependencies in graph.items():
-            package_id = package.replace('-', '_')
-            nodes.add(package_id)
+        for package in packages:
+            if package not in seen and not self.should_filter_package(package, filter_substring):
+                seen.add(package)
+                queue.append(package)
 
+        while queue:
+            current_package = queue.popleft()
+            dependencies = [
+                dep for dep in self.get_direct_dependencies(current_package, repo_url, test_mode)
+                if not self.should_filter_package(dep, filter_substring)
+            ]
+            graph.add_package(current_package, dependencies)
             for dep in dependencies:
-                if dep in graph:  # Добавляем только если зависимость есть в графе
-                    dep_id = dep.replace('-', '_')
-                    nodes.add(dep_id)
-                    edge = f"    {package_id} --> {dep_id}\n"
-                    if edge not in edges:
-                        mermaid_code += edge
-                        edges.add(edge)
+                if dep not in seen:
+                    seen.add(dep)
+                    queue.append(dep)
 
-        # Добавляем стили
-        mermaid_code += "    \n"
-        mermaid_code += "    classDef root fill:#e1f5fe,stroke:#01579b,stroke-width:2px\n"
-        mermaid_code += "    classDef leaf fill:#f3e5f5,stroke:#4a148c,stroke-width:1px\n"
-        mermaid_code += "    classDef node fill:#e8f5e8,stroke:#1b5e20,stroke-width:1px\n"
+        return graph
+
+    def build_reverse_index(self, graph):
+        """Обращение графа: пакет -> список пакетов, которые от него непосредственно зависят"""
+        if isinstance(graph, InternedGraph):
+            return graph.reverse_view()
 
-        # Применяем стили к листовым узлам (без зависимостей)
+        reverse_index = {}
         for package, dependencies in graph.items():
-            package_id = package.replace('-', '_')
-            if not dependencies:
-                mermaid_code += f"    class {package_id} leaf\n"
-            elif package != start_package:
-                mermaid_code += f"    class {package_id} node\n"
+            for dep in dependencies:
+                reverse_index.setdefault(dep, []).append(package)
+        return reverse_index
+
+    def reaches_target_without(self, graph, distance, start_package, targets, excluded_package,
+                               components=None):
+        """Проверка, что из start_package есть путь до одной из целей, не проходящий через excluded_package
+
+        graph - InternedGraph (или снимок графа), обход идет по id без построения списков имен.
+        """
+        # Кратчайший путь из start_package не может проходить через более близкий к цели пакет
+        if distance[start_package] <= distance[excluded_package]:
+            return True
+
+        # Из другой компоненты сильной связности путь обратно в excluded_package невозможен
+        component = components[excluded_package] if components is not None else None
+        if component is not None and components[start_package] != component:
+            return True
+
+        # Иначе ищем обход внутри компоненты excluded_package: первый же пакет другой
+        # компоненты, из которого цель достижима, обратно в excluded_package не ведет
+        names, rows, offsets, csr_targets = graph.names, graph.rows, graph.offsets, graph.targets
+        start_id = graph.ids[start_package]
+        seen = {start_id, graph.ids[excluded_package]}
+        queue = deque([start_id])
+        while queue:
+            row = rows[queue.popleft()]
+            if row == -1:
+                continue
+            for index in range(offsets[row], offsets[row + 1]):
+                dep_id = csr_targets[index]
+                if dep_id in seen:
+                    continue
+                seen.add(dep_id)
+                dep = names[dep_id]
+                if dep in targets:
+                    return True
+                if dep not in distance:
+                    continue
+                if component is not None and components.get(dep) != component:
+                    return True
+                queue.append(dep_id)
+        return False
+
+    def enumerate_paths(self, graph, distance, prefix, targets, limit):
+        """Не более limit простых путей до одной из целей, начинающихся с prefix
+
+        Обход ограничен пакетами, из которых цель достижима, поэтому тупиковые
+        ветви не перебираются.
+        """
+        paths = []
+        stack = [(prefix[-1], iter(graph[prefix[-1]]))]
+        path = list(prefix)
+        on_path = set(prefix)
+
+        if prefix[-1] in targets:
+            return [path]
+
+        while stack and len(paths) < limit:
+            current_package, dependencies = stack[-1]
+            dep = next(dependencies, None)
+            if dep is None:
+                stack.pop()
+                on_path.discard(path.pop())
+                continue
+
+            if dep in targets:
+                paths.append(path + [dep])
+            elif dep in distance and dep not in on_path:
+                path.append(dep)
+                on_path.add(dep)
+                stack.append((dep, iter(graph[dep])))
+
+        return paths
+
+    def generate_mermaid_diagram(self, graph, start_package):
+        """Генерация текстового представления графа на языке Mermaid"""
+        return ''.join(GraphEmitter(graph, start_package, self.truncated_packages).iter_mermaid())
 
-        return mermaid_code
+    def emit_graph(self, graph, start_package, output_format, output_file):
+        """Потоковая запись графа в файл ('-' - стандартный вывод)"""
+        emitter = GraphEmitter(graph, start_package, self.truncated_packages)
+        if output_file == '-':
+            stream = self.data_stream or sys.stdout
+            emitter.write(output_format, stream)
+            # Закрытый получатель (например, head) обнаруживается здесь, а не при выходе интерпретатора
+            stream.flush()
+            return
+
+        with open(output_file, 'w', encoding='utf-8') as f:
+            emitter.write(output_format, f)
+
+    def save_svg_native(self, graph, start_package, output_file):
+        """Сохранение SVG встроенным рендерером (без Docker и Node.js)"""
+        try:
+            print("🚀 Генерация SVG встроенным рендерером...")
+            SvgLayoutRenderer(graph, start_package, self.truncated_packages).write(output_file)
+            print(f"✅ SVG файл успешно создан: {output_file}")
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка встроенного рендерера: {e}")
+            return False
 
     def save_svg_from_mermaid(self, mermaid_code, output_file):
         """Сохранение SVG из Mermaid кода"""
@@ -495,9 +4181,60 @@ class DependencyVisualizer:
         for package, dependencies in graph.items():
             if dependencies:
                 print(f"   {package} -> {dependencies}")
+            elif package in self.truncated_packages:
+                reason = self.TRUNCATION_REASONS[self.truncated_packages[package]]
+                print(f"   {package} -> ✂️ (не раскрыт: {reason})")
             else:
                 print(f"   {package} -> (нет зависимостей)")
 
+    def print_cycles(self, graph, cycles):
+        """Вывод циклических зависимостей с составом групп"""
+        if not cycles:
+            print("✅ Циклические зависимости не обнаружены")
+            return
+
+        print(f"⚠️ Обнаружено циклических зависимостей: {len(cycles)}")
+        cycle_groups = find_cycle_groups(graph)
+        for i, (cycle, group) in enumerate(zip(cycles, cycle_groups), 1):
+            if len(group) > len(cycle) - 1:
+                print(f"   {i}. {' -> '.join(cycle)} (группа из {len(group)} пакетов: {', '.join(group)})")
+            else:
+                print(f"   {i}. {' -> '.join(cycle)}")
+
+    def graph_statistics(self, graph, cycles):
+        """Статистика графа зависимостей"""
+        if isinstance(graph, InternedGraph):
+            # Счетчики берутся из буферов CSR, без построения списков имен
+            offsets = graph.offsets
+            return {
+                'packages': len(graph),
+                'packages_with_dependencies': sum(1 for row in range(len(graph.row_nodes))
+                                                  if offsets[row + 1] != offsets[row]),
+                'edges': graph.edge_count,
+                'cycles': len(cycles),
+            }
+
+        return {
+            'packages': len(graph),
+            'packages_with_dependencies': sum(1 for deps in graph.values() if deps),
+            'edges': sum(len(deps) for deps in graph.values()),
+            'cycles': len(cycles),
+        }
+
+    def print_statistics(self, graph, cycles):
+        """Вывод статистики графа зависимостей"""
+        statistics = self.graph_statistics(graph, cycles)
+        print(f"📊 Статистика:")
+        print(f"   Всего пакетов в графе: {statistics['packages']}")
+        print(f"   Пакетов с зависимостями: {statistics['packages_with_dependencies']}")
+        print(f"   Циклических зависимостей: {statistics['cycles']}")
+        if self.truncated_packages:
+            print(f"   Не раскрыто из-за ограничений обхода: {len(self.truncated_packages)}")
+        failed = [package for package in graph if package in self.failed_packages]
+        if failed:
+            print(f"   ⚠️ Не удалось получить зависимости (граф неполный): {len(failed)} - "
+                  f"{', '.join(failed[:5])}{', ...' if len(failed) > 5 else ''}")
+
     def print_reverse_dependencies(self, target_package, reverse_deps):
         """Вывод обратных зависимостей"""
         if not reverse_deps:
@@ -508,9 +4245,111 @@ class DependencyVisualizer:
         for package, dep_type in reverse_deps:
             print(f"   - {package} ({dep_type})")
 
+    def save_profile(self, args):
+        """Выгрузка профиля запуска по --stats и --trace (в том числе после ошибки или прерывания)"""
+        try:
+            if args.stats:
+                statistics = self.profiler.statistics(self.registry_client, self.packument_cache)
+                self.profiler.write_statistics(args.stats, statistics)
+                if args.stats != '-':
+                    print(f"⏱️ Профиль запуска сохранен: {args.stats}")
+            if args.trace:
+                self.profiler.write_trace(args.trace)
+                print(f"⏱️ Трассировка сохранена: {args.trace} (chrome://tracing, Perfetto)")
+        except OSError as e:
+            print(f"   ⚠️ Предупреждение: не удалось сохранить профиль запуска: {e}")
+
+    def parse_serve_arguments(self, argv):
+        """Парсинг аргументов подкоманды serve"""
+        parser = argparse.ArgumentParser(
+            prog='dependency_visualizer.py serve',
+            description='Локальное зеркало метаданных реестра npm для нескольких запусков инструмента'
+        )
+        parser.add_argument('--host', type=str, default='127.0.0.1', help='Адрес для входящих соединений')
+        parser.add_argument('--port', type=int, default=4873, help='Порт сервера (0 - любой свободный)')
+        parser.add_argument(
+            '--repo',
+            type=str,
+            default=DEFAULT_REGISTRY_URL,
+            help='URL исходного реестра или путь к файлу тестового репозитория (с --test-mode)'
+        )
+        parser.add_argument('--test-mode', action='store_true',
+                            help='Раздавать пакеты тестового репозитория без обращения к сети')
+        parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR,
+                            help='Каталог дискового кэша packument\'ов')
+        parser.add_argument('--cache-ttl', type=int, default=3600,
+                            help='Время жизни записи кэша в секундах (после истечения - ревалидация)')
+        parser.add_argument('--cache-max-size', type=int, default=256, help='Максимальный размер кэша в мегабайтах')
+        parser.add_argument('--no-cache', action='store_true', help='Не использовать дисковый кэш')
+        parser.add_argument('--jobs', type=int, default=8,
+                            help='Число параллельных загрузок при вычислении замыкания зависимостей')
+        return parser.parse_args(argv)
+
+    def validate_serve_arguments(self, args):
+        """Валидация аргументов подкоманды serve"""
+        errors = []
+        if not 0 <= args.port <= 65535:
+            errors.append("Порт должен быть в диапазоне 0-65535")
+        if args.test_mode and not os.path.isfile(args.repo):
+            errors.append(f"Файл репозитория не существует: {args.repo}")
+        elif not args.test_mode and not args.repo.startswith(('http://', 'https://')):
+            errors.append("Исходный реестр должен быть URL http:// или https://")
+        if args.cache_ttl < 0:
+            errors.append("Время жизни кэша не может быть отрицательным")
+        if args.cache_max_size <= 0:
+            errors.append("Размер кэша должен быть положительным")
+        if args.jobs < 1:
+            errors.append("Число параллельных загрузок должно быть не меньше 1")
+        return errors
+
+    def run_server(self, args):
+        """Подкоманда serve: зеркало реестра до остановки по Ctrl+C"""
+        if not args.test_mode:
+            self.registry_url = args.repo.rstrip('/')
+            self.registry_client.pool_size = args.jobs
+            if not args.no_cache:
+                self.packument_cache = PackumentCache(
+                    args.cache_dir,
+                    ttl=args.cache_ttl,
+                    max_size=args.cache_max_size * 1024 * 1024,
+                    registry_url=self.registry_url
+                )
+
+        mirror = RegistryMirror(self, args.repo, args.test_mode, ttl=args.cache_ttl, jobs=args.jobs)
+        server = mirror.create_server(args.host, args.port)
+        host, port = server.server_address[:2]
+        print(f"🌐 Зеркало реестра: http://{host}:{port}")
+        print(f"   Источник: {'тестовый репозиторий ' if args.test_mode else ''}{args.repo}")
+        if self.packument_cache is not None:
+            print(f"   Дисковый кэш: {self.packument_cache.cache_dir}")
+        print(f"   Использование: --repo http://{host}:{port}")
+        print("   Остановка: Ctrl+C")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.registry_client.close()
+        print(f"\n⏹️ Зеркало остановлено: запросов {mirror.requests}, пакетов {len(mirror.responses)}, "
+              f"замыканий {len(mirror.closures)}")
+
     def run(self):
         """Основной метод запуска приложения"""
+        diagnostics = ExitStack()
         try:
+            if sys.argv[1:2] == ['serve']:
+                # Подкоманда serve: локальное зеркало реестра
+                args = self.parse_serve_arguments(sys.argv[2:])
+                errors = self.validate_serve_arguments(args)
+                if errors:
+                    print("❌ Ошибки валидации:")
+                    for error in errors:
+                        print(f"   - {error}")
+                    sys.exit(1)
+                self.run_server(args)
+                return
+
             # Парсинг аргументов
             args = self.parse_arguments()
 
@@ -522,82 +4361,576 @@ class DependencyVisualizer:
                     print(f"   - {error}")
                 sys.exit(1)
 
-            print(f"🎯 Анализ пакета: {args.package}")
-            print(f"🔧 Режим: {'тестовый' if args.test_mode else 'реальный'}")
+            if args.emit == '-' or args.analyze_all == '-':
+                # stdout занят данными: баннеры, ход обхода и ошибки выводятся в stderr
+                self.data_stream = sys.stdout
+                diagnostics.enter_context(redirect_stdout(sys.stderr))
+
+            if args.convert_ndjson:
+                # Режим преобразования репозитория в NDJSON
+                count = convert_repository_to_ndjson(args.repo, args.convert_ndjson)
+                print(f"✅ Репозиторий преобразован в NDJSON: {args.convert_ndjson} ({count} пакетов)")
+                return
+
+            # Профиль отсчитывается от создания инструмента, но измеряет только по запросу
+            self.profiler.enabled = bool(args.stats or args.trace)
+            self.profiler.tracing = bool(args.trace)
+            if args.stats:
+                self.profiler.start_memory_tracking()
+
+            # Время обхода отсчитывается от запуска, включая выбор версии корня
+            deadline = time.monotonic() + args.timeout if args.timeout else None
+
+            self.configure_registry(args)
+
+            if args.snapshot:
+                with self.profiler.phase('open_snapshot'):
+                    self.snapshot = GraphSnapshot(args.snapshot)
+                if not args.package:
+                    args.package = self.snapshot.root or ''
+                if not args.package and not args.batch:
+                    raise Exception("В снимке графа не указан корневой пакет, задайте --package")
+
+            # В реальном режиме корневой пакет становится узлом 'имя@версия'
+            if (self.snapshot is None and not args.test_mode and not args.ignore_ranges
+                    and not args.reverse and not args.batch):
+                with self.profiler.phase('resolve_root'):
+                    args.package = self.resolve_root_package(args.package)
+
+            if not args.batch and args.package:
+                print(f"🎯 Анализ пакета: {args.package}")
+
+            # Все шаблоны фильтрации компилируются один раз за запуск
+            args.filter = PackageFilter(
+                include=args.include,
+                exclude=([args.filter] if args.filter else []) + args.exclude
+            )
+
+            if self.snapshot is not None:
+                print(f"🔧 Режим: снимок графа ({args.snapshot})")
+            else:
+                print(f"🔧 Режим: {'тестовый' if args.test_mode else 'реальный'}")
             if args.filter:
                 print(f"🚫 Фильтр: '{args.filter}'")
             if args.reverse:
                 print(f"🔄 Режим: обратные зависимости")
             print("=" * 60)
 
-            if args.reverse:
+            if args.batch:
+                # Пакетный режим
+                self.run_batch(args)
+
+            elif args.query or args.query_file:
+                # Режим запросов к индексу достижимости
+                self.run_queries(args)
+
+            elif args.analyze_all:
+                # Метрики всех пакетов репозитория за один проход
+                self.run_analysis_all(args)
+
+            elif args.reverse:
                 # Режим обратных зависимостей
-                reverse_deps = self.find_reverse_dependencies(
-                    args.package,
-                    args.repo,
-                    args.test_mode,
-                    args.filter
-                )
+                with self.profiler.phase('reverse'):
+                    reverse_deps = self.find_reverse_dependencies(
+                        args.package,
+                        args.repo,
+                        args.test_mode,
+                        args.filter,
+                        args.max_paths
+                    )
 
                 print("=" * 60)
                 self.print_reverse_dependencies(args.package, reverse_deps)
 
             else:
                 # Обычный режим построения графа зависимостей
-                print("🔍 Построение графа зависимостей (DFS без рекурсии):")
-                dependency_graph, cycles = self.build_dependency_graph_dfs(
-                    args.package,
-                    args.repo,
-                    args.test_mode,
-                    args.filter
-                )
+                delta = None
+                if self.snapshot is not None and not args.filter and args.package == self.snapshot.root:
+                    # Граф снимка используется напрямую, без обхода
+                    print("📂 Граф загружен из снимка:")
+                    dependency_graph = self.snapshot
+                    with self.profiler.phase('cycles'):
+                        cycles = self.detect_cycles(dependency_graph)
+                else:
+                    if args.checkpoint:
+                        self.checkpoint = TraversalCheckpoint(args.checkpoint, args.package, str(args.filter))
+                        resumed = self.checkpoint.load()
+                        for package, dependencies in resumed.items():
+                            self.resolved_dependencies.setdefault(package, dict.fromkeys(dependencies))
+                        if resumed:
+                            print(f"♻️ Продолжение с контрольной точки: {len(resumed)} пакетов уже загружено")
+
+                    if args.jobs > 1 and not args.test_mode and self.snapshot is None:
+                        print(f"⚡ Параллельная загрузка зависимостей ({args.jobs} потоков)...")
+                        with self.profiler.phase('prefetch'):
+                            self.prefetch_dependencies(args.package, args.repo, args.test_mode, args.filter,
+                                                       args.jobs, 0, args.host_connections,
+                                                       args.max_depth, args.max_nodes, deadline, self.checkpoint)
+
+                    print("🔍 Построение графа зависимостей (DFS без рекурсии):")
+                    with self.profiler.phase('traversal'):
+                        if args.state:
+                            dependency_graph, cycles, delta = self.build_dependency_graph_incremental(
+                                args.package,
+                                args.repo,
+                                args.test_mode,
+                                args.filter,
+                                args.state
+                            )
+                        else:
+                            dependency_graph, cycles = self.build_dependency_graph_dfs(
+                                args.package,
+                                args.repo,
+                                args.test_mode,
+                                args.filter,
+                                max_depth=args.max_depth,
+                                max_nodes=args.max_nodes,
+                                deadline=deadline,
+                                checkpoint=self.checkpoint
+                            )
+
+                    if self.checkpoint is not None:
+                        # Частичный обход сохраняется для продолжения, полный - удаляет файл
+                        if self.truncated_packages:
+                            self.checkpoint.save(self.resolved_dependencies, self.failed_packages)
+                            print(f"💾 Контрольная точка сохранена: {args.checkpoint}")
+                        else:
+                            self.checkpoint.remove()
+                self.profiler.graph = dependency_graph
+
+                if args.save_snapshot:
+                    with self.profiler.phase('save_snapshot'):
+                        GraphSnapshot.write(dependency_graph, args.save_snapshot, root=args.package)
+                    print(f"💾 Снимок графа сохранен: {args.save_snapshot}")
 
                 print("=" * 60)
 
                 # Вывод информации о циклических зависимостях
-                if cycles:
-                    print(f"⚠️ Обнаружено циклических зависимостей: {len(cycles)}")
-                    for i, cycle in enumerate(cycles, 1):
-                        print(f"   {i}. {' -> '.join(cycle)}")
-                    print()
-                else:
-                    print("✅ Циклические зависимости не обнаружены")
+                self.print_cycles(dependency_graph, cycles)
+                print()
+
+                if delta is not None:
+                    self.print_delta(delta)
                     print()
 
                 # Вывод полного графа зависимостей
-                self.print_dependency_graph(dependency_graph, args.package)
+                if not args.quiet_graph:
+                    self.print_dependency_graph(dependency_graph, args.package)
 
-                # Генерация Mermaid диаграммы
+                # Генерация текстового представления графа
                 print(f"\n📊 Генерация визуализации...")
-                mermaid_code = self.generate_mermaid_diagram(dependency_graph, args.package)
 
-                print("📝 Mermaid код:")
-                print("-" * 40)
-                print(mermaid_code)
-                print("-" * 40)
+                if args.emit:
+                    with self.profiler.phase('emit'):
+                        self.emit_graph(dependency_graph, args.package, args.format, args.emit)
+                    if args.emit != '-':
+                        print(f"💾 Граф в формате {args.format} сохранен: {args.emit}")
+
+                if not args.quiet_graph:
+                    titles = {'mermaid': 'Mermaid код', 'dot': 'Graphviz DOT', 'json': 'JSON'}
+                    print(f"📝 {titles[args.format]}:")
+                    print("-" * 40)
+                    GraphEmitter(dependency_graph, args.package, self.truncated_packages).write(args.format, sys.stdout)
+                    print()
+                    print("-" * 40)
 
-                # Сохранение SVG
-                svg_generated = self.save_svg_from_mermaid(mermaid_code, args.output)
+                # Сохранение SVG (встроенный рендерер поддерживает только формат SVG)
+                with self.profiler.phase('render_svg'):
+                    if args.renderer == 'native' and args.output.lower().endswith('.svg'):
+                        svg_generated = self.save_svg_native(dependency_graph, args.package, args.output)
+                    else:
+                        mermaid_code = self.generate_mermaid_diagram(dependency_graph, args.package)
+                        svg_generated = self.save_svg_from_mermaid(mermaid_code, args.output)
 
                 # Сравнение с npm (только в реальном режиме)
-                if not args.test_mode and not args.filter and svg_generated:
-                    self.compare_with_npm(args.package, dependency_graph)
+                if not args.test_mode and not args.filter and svg_generated and self.snapshot is None:
+                    with self.profiler.phase('compare_npm'):
+                        self.compare_with_npm(args.package, dependency_graph)
 
                 # Статистика
-                total_packages = len(dependency_graph)
-                packages_with_deps = sum(1 for deps in dependency_graph.values() if deps)
-
-                print(f"\n📊 Статистика:")
-                print(f"   Всего пакетов в графе: {total_packages}")
-                print(f"   Пакетов с зависимостями: {packages_with_deps}")
-                print(f"   Циклических зависимостей: {len(cycles)}")
+                print()
+                self.print_statistics(dependency_graph, cycles)
 
             print(f"\n✅ Этап 5 успешно завершен.")
 
+        except KeyboardInterrupt:
+            if self.checkpoint is not None:
+                self.checkpoint.save(dict(self.resolved_dependencies), dict(self.failed_packages))
+                print(f"\n⏸️ Обход прерван, контрольная точка сохранена: {self.checkpoint.file_path}")
+            else:
+                print("\n⏸️ Обход прерван")
+            sys.exit(130)
+
+        except BrokenPipeError:
+            # Получатель данных закрыл канал (например, head): остаток вывода отбрасывается без ошибки
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, (self.data_stream or sys.stdout).fileno())
+            sys.exit(1)
+
         except Exception as e:
             print(f"❌ Ошибка: {e}")
             sys.exit(1)
 
+        finally:
+            if self.profiler.enabled:
+                self.save_profile(args)
+            self.close_repositories()
+            diagnostics.close()
+
+    def close_repositories(self):
+        """Закрытие файлов открытых тестовых репозиториев"""
+        for repository in self.repositories.values():
+            repository.close()
+        self.repositories.clear()
+
+
+class LazyDependencyGraph:
+    """Граф зависимостей с ленивым раскрытием узлов для использования как библиотеки
+
+    Узел раскрывается (загружается из реестра, тестового репозитория или
+    снимка) только при первом обращении через deps(), edges() или walk();
+    результат запоминается. Обход walk() - генератор: пакеты выдаются по мере
+    раскрытия, поэтому потребитель может остановиться на любом шаге; порядок
+    завершенного обхода запоминается, и повторные walk() и edges() с теми же
+    аргументами идут по нему без нового BFS. В stdout ничего не выводится -
+    предупреждения о версиях и недоступных пакетах визуализатор передает через
+    warning_handler в список warnings.
+
+        graph = LazyDependencyGraph.open(test_mode=True, repo_url='test_repo_simple.json')
+        for package, depth in graph.walk('A', depth=2):
+            print(package, graph.deps(package) if depth < 2 else '...')
+    """
+
+    def __init__(self, visualizer, repo_url, test_mode=False, filter_substring=""):
+        self.visualizer = visualizer
+        self.repo_url = repo_url
+        self.test_mode = test_mode
+        self.filter_substring = filter_substring
+        # Раскрытые узлы: пакет -> кортеж зависимостей (после фильтрации)
+        self.dependencies = {}
+        # Завершенные обходы: (start, depth) -> [(пакет, глубина), ...]
+        self.walks = {}
+        self.warnings = []
+        visualizer.warning_handler = self.warnings.append
+
+    @classmethod
+    def open(cls, repo_url=DEFAULT_REGISTRY_URL, test_mode=False, filter_substring="", cache_dir=DEFAULT_CACHE_DIR,
+             cache_ttl=3600, ignore_ranges=False, snapshot=None):
+        """Ленивый граф реестра, тестового репозитория или снимка графа без разбора argv
+
+        cache_dir=None отключает дисковый кэш packument'ов, snapshot - путь к
+        бинарному снимку графа (заменяет репозиторий).
+        """
+        visualizer = DependencyVisualizer()
+        visualizer.ignore_ranges = ignore_ranges
+        if snapshot:
+            visualizer.snapshot = GraphSnapshot(snapshot)
+        elif not test_mode:
+            if repo_url.startswith(('http://', 'https://')):
+                visualizer.registry_url = repo_url.rstrip('/')
+            if cache_dir:
+                visualizer.packument_cache = PackumentCache(cache_dir, ttl=cache_ttl,
+                                                            registry_url=visualizer.registry_url)
+        if isinstance(filter_substring, str) and filter_substring:
+            filter_substring = visualizer.get_package_filter(filter_substring)
+        return cls(visualizer, repo_url, test_mode, filter_substring)
+
+    @property
+    def live(self):
+        """Узлы загружаются из реестра npm (не из тестового файла и не из снимка)"""
+        return not self.test_mode and self.visualizer.snapshot is None
+
+    def root(self, package_spec):
+        """Узел графа для корневого пакета: в реестре 'имя' или 'имя@диапазон' -> 'имя@версия'"""
+        if not self.live or self.visualizer.ignore_ranges:
+            return package_spec
+        return self.visualizer.resolve_root_package(package_spec)
+
+    def is_filtered(self, package):
+        return self.visualizer.should_filter_package(package, self.filter_substring)
+
+    def deps(self, package):
+        """Прямые зависимости пакета (раскрывает узел при первом обращении)"""
+        dependencies = self.dependencies.get(package)
+        if dependencies is None:
+            declared = self.visualizer.get_direct_dependencies(package, self.repo_url, self.test_mode)
+            dependencies = tuple(dep for dep in declared if not self.is_filtered(dep))
+            self.dependencies[package] = dependencies
+        return dependencies
+
+    def __contains__(self, package):
+        """Узел уже раскрыт"""
+        return package in self.dependencies
+
+    def __len__(self):
+        return len(self.dependencies)
+
+    def walk(self, start, depth=None, max_nodes=None):
+        """Обход в ширину от start: генератор пар (пакет, глубина) по мере раскрытия узлов
+
+        Узлы на глубине depth выдаются, но не раскрываются - как граница обхода
+        при --max-depth. max_nodes ограничивает число выданных пакетов.
+        Отфильтрованный корень не выдается.
+        """
+        if self.is_filtered(start):
+            return
+        order = self.walks.get((start, depth))
+        if order is not None:
+            yield from (order if max_nodes is None else order[:max_nodes])
+            return
+
+        seen = {start}
+        queue = deque([(start, 0)])
+        order = []
+        while queue and (max_nodes is None or len(order) < max_nodes):
+            package, level = queue.popleft()
+            if depth is None or level < depth:
+                for dep in self.deps(package):
+                    if dep not in seen:
+                        seen.add(dep)
+                        queue.append((dep, level + 1))
+            order.append((package, level))
+            yield package, level
+        if not queue:
+            self.walks[(start, depth)] = order
+
+    def edges(self, start, depth=None):
+        """Генератор ребер (пакет, зависимость) раскрытых при обходе walk(start, depth) узлов
+
+        Повторный вызов идет по запомненному порядку обхода и раскрытым узлам.
+        """
+        for package, level in self.walk(start, depth):
+            if depth is None or level < depth:
+                for dep in self.dependencies[package]:
+                    yield package, dep
+
+    def to_graph(self):
+        """Раскрытая часть графа как InternedGraph для анализа циклов, вывода и снимков"""
+        graph = InternedGraph()
+        for package, dependencies in self.dependencies.items():
+            graph.add_package(package, dependencies)
+        return graph
+
+
+class RegistryMirror:
+    """Локальное зеркало метаданных реестра npm, общее для многих запусков инструмента
+
+    GET /<пакет> отдает сокращенный packument (тот же, что хранит дисковый кэш),
+    GET /-/closure/<пакет>[?depth=N] - замыкание зависимостей пакета
+    {"root", "packages": {узел: [зависимости]}, "truncated", "warnings"},
+    вычисленное по запросу и запомненное. Одновременные запросы одного пакета
+    объединяются в одну загрузку из исходного реестра. Ответы в памяти живут
+    ttl секунд, затем загружаются заново (дисковый кэш ревалидирует их по ETag):
+    данные в памяти образуют поколение, которое по истечении ttl заменяется
+    новым, а не очищается на месте, поэтому запросы, начатые до сброса,
+    дорабатывают со своим поколением.
+
+    В тестовом режиме источник - файл тестового репозитория: каждый пакет
+    публикуется единственной версией 1.0.0, а его зависимости объявлены как
+    '*' (версий в тестовом репозитории нет), замыкания строятся по именам.
+    """
+
+    def __init__(self, visualizer, upstream, test_mode=False, ttl=3600, jobs=8):
+        self.visualizer = visualizer
+        self.upstream = upstream
+        self.test_mode = test_mode
+        self.ttl = ttl
+        self.jobs = jobs
+        self.lock = threading.Lock()
+        # Загрузка одного пакета выполняется одним потоком: имя -> блокировка
+        self.fetch_locks = {}
+        # Ленивый граф не потокобезопасен, замыкания вычисляются по одному
+        self.closure_lock = threading.Lock()
+        self.requests = 0
+        self.reset()
+
+    def reset(self):
+        """Новое поколение: пустые ответы, замыкания и разрешенные версии (дисковый кэш сохраняется)"""
+        self.responses = {}
+        self.closures = {}
+        self.graph = LazyDependencyGraph(self.generation_visualizer(), self.upstream, self.test_mode)
+        self.generation_started = time.monotonic()
+
+    def generation_visualizer(self):
+        """Визуализатор поколения: общие клиент, дисковый кэш и настройки, пустые данные в памяти"""
+        base = self.visualizer
+        visualizer = DependencyVisualizer()
+        visualizer.registry_url = base.registry_url
+        visualizer.registry_client = base.registry_client
+        visualizer.packument_cache = base.packument_cache
+        visualizer.rate_limiter = base.rate_limiter
+        visualizer.ignore_ranges = base.ignore_ranges
+        # Индексы тестовых репозиториев от поколения не зависят
+        visualizer.repositories = base.repositories
+        return visualizer
+
+    def expired(self):
+        return bool(self.ttl) and time.monotonic() - self.generation_started > self.ttl
+
+    def count_request(self):
+        """Учет запроса; по истечении ttl данные в памяти загружаются заново"""
+        with self.lock:
+            self.requests += 1
+            expired = self.expired()
+        if expired:
+            # Замыкание не должно вычисляться во время смены поколения
+            with self.closure_lock, self.lock:
+                if self.expired():
+                    self.reset()
+
+    @staticmethod
+    def encode(data):
+        """Тело ответа JSON, его gzip-версия и ETag"""
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        return body, gzip.compress(body), etag
+
+    def load_packument(self, package_name, visualizer):
+        """Сокращенный packument из исходного реестра или тестового репозитория"""
+        if not self.test_mode:
+            return visualizer.fetch_package_info_from_npm(package_name)
+
+        repository = visualizer.get_repository(self.upstream)
+        if package_name not in repository:
+            raise PackageNotFoundError(f"Пакет '{package_name}' не найден в тестовом репозитории")
+        dependencies = dict.fromkeys(repository.get_dependencies(package_name), '*')
+        return {
+            'name': package_name,
+            'dist-tags': {'latest': '1.0.0'},
+            'versions': {'1.0.0': {'name': package_name, 'version': '1.0.0', 'dependencies': dependencies}},
+        }
+
+    def packument(self, package_name):
+        """Ответ на запрос packument'а (загрузка объединяется для одновременных запросов)"""
+        with self.lock:
+            responses, visualizer = self.responses, self.graph.visualizer
+        response = responses.get(package_name)
+        if response is not None:
+            return response
+
+        with self.lock:
+            fetch_lock = self.fetch_locks.setdefault(package_name, threading.Lock())
+        with fetch_lock:
+            response = responses.get(package_name)
+            if response is None:
+                response = self.encode(self.load_packument(package_name, visualizer))
+                responses[package_name] = response
+        with self.lock:
+            self.fetch_locks.pop(package_name, None)
+        return response
+
+    def closure(self, package_spec, depth=None):
+        """Ответ на запрос замыкания зависимостей пакета (вычисляется один раз)"""
+        key = (package_spec, depth)
+        response = self.closures.get(key)
+        if response is not None:
+            return response
+
+        with self.closure_lock:
+            response = self.closures.get(key)
+            if response is None:
+                response = self.encode(self.compute_closure(package_spec, depth))
+                self.closures[key] = response
+        return response
+
+    def compute_closure(self, package_spec, depth=None):
+        """Замыкание зависимостей: раскрытые узлы, граница обхода и предупреждения"""
+        graph = self.graph
+        visualizer = graph.visualizer
+        if self.test_mode and package_spec not in visualizer.get_repository(self.upstream):
+            raise PackageNotFoundError(f"Пакет '{package_spec}' не найден в тестовом репозитории")
+
+        warnings_before = len(graph.warnings)
+        root = graph.root(package_spec)
+        if not self.test_mode and self.jobs > 1:
+            # Параллельная загрузка уровня реестра, дальше обход идет по памяти
+            visualizer.prefetch_dependencies(root, self.upstream, False, '', self.jobs, 0, self.jobs, depth)
+
+        packages = {}
+        truncated = []
+        for package, level in graph.walk(root, depth):
+            if depth is None or level < depth:
+                packages[package] = list(graph.deps(package))
+            else:
+                truncated.append(package)
+        return {'root': root, 'packages': packages, 'truncated': truncated,
+                'warnings': graph.warnings[warnings_before:]}
+
+    def create_server(self, host='127.0.0.1', port=4873):
+        """HTTP-сервер зеркала (запускается вызывающим через serve_forever)"""
+        server = ThreadingHTTPServer((host, port), RegistryMirrorHandler)
+        server.daemon_threads = True
+        server.mirror = self
+        return server
+
+
+class RegistryMirrorHandler(BaseHTTPRequestHandler):
+    """Запросы к зеркалу: GET /<пакет>, /-/closure/<пакет>[?depth=N], /-/ping"""
+
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят отдельными записями - без TCP_NODELAY keep-alive ждет delayed ACK
+    disable_nagle_algorithm = True
+    CLOSURE_PREFIX = '-/closure/'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        mirror = self.server.mirror
+        mirror.count_request()
+        parsed = urllib.parse.urlsplit(self.path)
+        path = urllib.parse.unquote(parsed.path).lstrip('/')
+
+        try:
+            if path == '-/ping':
+                response = mirror.encode({})
+            elif path.startswith(self.CLOSURE_PREFIX) and len(path) > len(self.CLOSURE_PREFIX):
+                depth = urllib.parse.parse_qs(parsed.query).get('depth')
+                response = mirror.closure(path[len(self.CLOSURE_PREFIX):], int(depth[0]) if depth else None)
+            elif path and not path.startswith('-/'):
+                response = mirror.packument(path)
+            else:
+                self.send_error_json(404, f"Неизвестный адрес: /{path}")
+                return
+        except PackageNotFoundError as e:
+            self.send_error_json(404, str(e))
+            return
+        except ValueError as e:
+            self.send_error_json(400, f"Некорректный запрос: {e}")
+            return
+        except Exception as e:
+            self.send_error_json(502, str(e))
+            return
+
+        self.send_json(*response)
+
+    def send_json(self, body, compressed, etag, status=200):
+        if etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if compressed is not None and 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+            body = compressed
+            encoding = 'gzip'
+        else:
+            encoding = None
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if etag:
+            self.send_header('ETag', etag)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message):
+        body = json.dumps({'error': message}, ensure_ascii=False).encode('utf-8')
+        self.send_json(body, None, None, status)
+
 
 if __name__ == "__main__":
     visualizer = DependencyVisualizer()
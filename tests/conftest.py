@@ -0,0 +1,7 @@
+"""Общая настройка тестов: корень репозитория в sys.path для импорта dependency_visualizer"""
+
+import os
+import sys
+
+# Тесты запускаются из каталога tests/ или из корня репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
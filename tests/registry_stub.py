@@ -0,0 +1,124 @@
+"""
+Локальная замена npm реестра для тестов: ThreadingHTTPServer на 127.0.0.1 с
+ETag/304, gzip/deflate, заданными ошибками и журналом запросов
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_packument(name, dependencies=None, version='1.0.0'):
+    """Packument с одной версией и лишними полями, которые кэш должен отбрасывать"""
+    return {
+        'name': name,
+        'dist-tags': {'latest': version},
+        'versions': {
+            version: {
+                'name': name,
+                'version': version,
+                'dependencies': dict(dependencies or {}),
+                'readme': 'x' * 200,
+            },
+        },
+        'readme': 'Описание пакета ' * 20,
+        'time': {version: '2024-01-01T00:00:00.000Z'},
+    }
+
+
+class StubRegistryHandler(BaseHTTPRequestHandler):
+    """GET /<пакет> -> packument; 404 для неизвестных пакетов"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        registry = self.server.registry
+        name = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path.lstrip('/'))
+        with registry.lock:
+            registry.requests.append({'name': name, 'headers': dict(self.headers), 'client': self.client_address})
+            status = registry.failures.pop(0) if registry.failures else None
+        if registry.delay:
+            time.sleep(registry.delay)
+        if status is not None:
+            self.send_body(status, b'{"error":"temporary"}', {'Retry-After': '0'})
+            return
+
+        packument = registry.packuments.get(name)
+        if packument is None:
+            self.send_body(404, b'{"error":"Not found"}')
+            return
+
+        etag = f'"{name}-{registry.revisions.get(name, registry.revision)}"'
+        headers = {'ETag': etag, 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+        if self.headers.get('If-None-Match') == etag:
+            self.send_body(304, b'', headers)
+            return
+
+        body = json.dumps(packument).encode('utf-8')
+        accepted = self.headers.get('Accept-Encoding') or ''
+        if registry.encoding and registry.encoding in accepted:
+            body = gzip.compress(body) if registry.encoding == 'gzip' else zlib.compress(body)
+            headers['Content-Encoding'] = registry.encoding
+        self.send_body(200, body, headers)
+
+    def send_body(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if self.server.registry.close_connections:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubRegistry:
+    """Тестовый реестр в отдельном потоке (контекстный менеджер)"""
+
+    def __init__(self, packuments=None):
+        self.packuments = dict(packuments or {})
+        # Номер ревизии входит в ETag: увеличение означает изменение документов
+        self.revision = 1
+        # Ревизии отдельных пакетов: пакет -> номер (изменение одного документа)
+        self.revisions = {}
+        # Коды ответов, которые будут отданы следующим запросам вместо packument'а
+        self.failures = []
+        self.encoding = None
+        self.close_connections = False
+        # Задержка ответа, с (для проверки одновременных запросов)
+        self.delay = 0
+        self.requests = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubRegistryHandler)
+        self.server.daemon_threads = True
+        self.server.registry = self
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def requested(self, name):
+        """Запросы к пакету name"""
+        return [request for request in self.requests if request['name'] == name]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,78 @@
+"""Вывод данных в stdout ('-'): в потоке только данные, ход работы уходит в stderr"""
+
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from registry_stub import REPOSITORY_DIR
+
+SCRIPT = os.path.join(REPOSITORY_DIR, 'dependency_visualizer.py')
+COMPLEX = os.path.join(REPOSITORY_DIR, 'test_repo_complex.json')
+REVERSE = os.path.join(REPOSITORY_DIR, 'test_reverse_deps.json')
+
+
+class CliOutputTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def run_tool(self, *arguments, repo=COMPLEX):
+        return subprocess.run(
+            [sys.executable, SCRIPT, '--test-mode', '--repo', repo,
+             '--output', os.path.join(self.directory, 'graph.svg'), *arguments],
+            cwd=self.directory, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60,
+        )
+
+    def test_emit_to_stdout_contains_only_graph(self):
+        for quiet in ([], ['--quiet-graph']):
+            result = self.run_tool('--package', 'A', '--emit', '-', '--format', 'json', *quiet)
+
+            self.assertEqual(result.returncode, 0, result.stderr.decode('utf-8'))
+            graph = json.loads(result.stdout.decode('utf-8'))
+            self.assertEqual(graph['root'], 'A')
+            self.assertIn('B', graph['graph'])
+            self.assertIn('Этап 5 успешно завершен', result.stderr.decode('utf-8'))
+
+    def test_analyze_all_to_stdout_is_parseable_csv(self):
+        result = self.run_tool('--analyze-all', '-', '--analyze-format', 'csv', repo=REVERSE)
+
+        self.assertEqual(result.returncode, 0, result.stderr.decode('utf-8'))
+        rows = {row['package']: row for row in csv.DictReader(result.stdout.decode('utf-8').splitlines())}
+        with open(REVERSE, 'r', encoding='utf-8') as f:
+            self.assertEqual(set(rows), set(json.load(f)))
+        self.assertEqual(rows['LOGGER']['transitive_dependents'], '4')
+        self.assertEqual(rows['APP']['transitive_dependencies'], '6')
+        self.assertIn('Этап 5 успешно завершен', result.stderr.decode('utf-8'))
+
+    def test_emit_to_closed_pipe_exits_quietly(self):
+        repo = os.path.join(self.directory, 'chain.json')
+        with open(repo, 'w', encoding='utf-8') as f:
+            json.dump({f"p{i}": {'dependencies': {f"p{i + 1}": '^1.0.0', f"p{i + 2}": '^1.0.0'}}
+                       for i in range(20000)}, f)
+
+        # Ход обхода (20000 строк) пишется в файл, чтобы не заполнить канал stderr
+        with tempfile.TemporaryFile() as errors:
+            process = subprocess.Popen(
+                [sys.executable, SCRIPT, '--test-mode', '--repo', repo, '--package', 'p0', '--emit', '-',
+                 '--quiet-graph', '--output', os.path.join(self.directory, 'graph.svg')],
+                cwd=self.directory, stdout=subprocess.PIPE, stderr=errors,
+            )
+            first_line = process.stdout.readline().decode('utf-8').strip()
+            process.stdout.close()
+            process.wait(timeout=60)
+            errors.seek(0)
+            stderr = errors.read().decode('utf-8')
+
+        self.assertEqual(first_line, '%% Дерево зависимостей для пакета p0')
+
+        self.assertNotIn('Traceback', stderr)
+        self.assertNotIn('Broken pipe', stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""Инкрементальный повторный анализ (--state): проверка по ETag и хэшам, повторное разрешение только изменившегося"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from registry_stub import StubRegistry, make_packument
+from dependency_visualizer import DependencyVisualizer
+
+
+class IncrementalStateTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = StubRegistry({
+            'app': make_packument('app', {'left': '^1.0.0', 'right': '^1.0.0'}),
+            'left': make_packument('left', {'core': '^1.0.0'}),
+            'right': make_packument('right'),
+            'core': make_packument('core'),
+        })
+        self.registry.__enter__()
+        self.addCleanup(self.registry.__exit__, None, None, None)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.state_file = os.path.join(self.directory, 'state.json')
+
+    def run_registry(self):
+        """Новый запуск инструмента с общим файлом состояния"""
+        visualizer = DependencyVisualizer()
+        visualizer.registry_url = self.registry.url
+        self.addCleanup(visualizer.registry_client.close)
+        with redirect_stdout(io.StringIO()):
+            return visualizer.build_dependency_graph_incremental('app', self.registry.url, False, '',
+                                                                 self.state_file)
+
+    def test_unchanged_registry_is_only_revalidated(self):
+        self.run_registry()
+        del self.registry.requests[:]
+
+        graph, cycles, delta = self.run_registry()
+
+        self.assertEqual(sorted(graph), ['app', 'core@1.0.0', 'left@1.0.0', 'right@1.0.0'])
+        self.assertFalse(any(delta.values()))
+        self.assertEqual(sorted(request['name'] for request in self.registry.requests),
+                         ['app', 'core', 'left', 'right'])
+        for request in self.registry.requests:
+            self.assertEqual(request['headers']['If-None-Match'], f'"{request["name"]}-1"')
+
+    def test_rewalks_only_from_changed_package(self):
+        self.run_registry()
+        del self.registry.requests[:]
+        self.registry.packuments['right'] = make_packument('right', {'extra': '^1.0.0'})
+        self.registry.packuments['extra'] = make_packument('extra', {'core': '^1.0.0'})
+        self.registry.revisions['right'] = 2
+
+        graph, cycles, delta = self.run_registry()
+
+        self.assertEqual(graph['right@1.0.0'], ['extra@1.0.0'])
+        self.assertEqual(graph['extra@1.0.0'], ['core@1.0.0'])
+        self.assertEqual(delta['changed_packages'], ['right@1.0.0'])
+        self.assertEqual(delta['added_packages'], ['extra@1.0.0'])
+        self.assertEqual(delta['added_edges'], [('extra@1.0.0', 'core@1.0.0'), ('right@1.0.0', 'extra@1.0.0')])
+        # Изменившийся документ пришел в ответ на условный запрос и повторно не загружается
+        self.assertEqual(len(self.registry.requested('right')), 1)
+        self.assertEqual(len(self.registry.requested('extra')), 1)
+        self.assertNotIn('If-None-Match', self.registry.requested('extra')[0]['headers'])
+
+    def test_new_dependency_release_changes_dependents(self):
+        self.run_registry()
+        self.registry.packuments['core'] = make_packument('core', version='1.1.0')
+        self.registry.revisions['core'] = 2
+
+        graph, cycles, delta = self.run_registry()
+
+        # Диапазон ^1.0.0 пакета left теперь разрешается в новую версию core
+        self.assertEqual(delta['changed_packages'], ['left@1.0.0'])
+        self.assertEqual(delta['added_edges'], [('left@1.0.0', 'core@1.1.0')])
+        self.assertEqual(delta['removed_packages'], ['core@1.0.0'])
+
+    def test_saves_etags_of_fetched_packuments(self):
+        self.run_registry()
+
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        self.assertEqual(state['etags'], {name: f'"{name}-1"' for name in ('app', 'left', 'right', 'core')})
+
+    def test_repository_reresolves_only_changed_hashes(self):
+        repository = os.path.join(self.directory, 'repo.json')
+
+        def run(packages):
+            with open(repository, 'w', encoding='utf-8') as f:
+                json.dump([{'name': name, 'dependencies': deps} for name, deps in packages.items()], f)
+            visualizer = DependencyVisualizer()
+            resolved = []
+            original = visualizer.get_direct_dependencies
+
+            def get_direct_dependencies(package_name, repo_url, test_mode=False):
+                resolved.append(package_name)
+                return original(package_name, repo_url, test_mode)
+
+            visualizer.get_direct_dependencies = get_direct_dependencies
+            with redirect_stdout(io.StringIO()):
+                result = visualizer.build_dependency_graph_incremental('A', repository, True, '', self.state_file)
+            visualizer.close_repositories()
+            return result, resolved
+
+        run({'A': {'B': '1'}, 'B': {'C': '1'}, 'C': {}, 'D': {}})
+        (graph, cycles, delta), resolved = run({'A': {'B': '1'}, 'B': {'C': '1'}, 'C': {'A': '1', 'D': '1'}, 'D': {}})
+
+        self.assertEqual(resolved, ['C', 'D'])
+        self.assertEqual(list(graph), ['A', 'B', 'C', 'D'])
+        self.assertEqual(delta['added_edges'], [('C', 'A'), ('C', 'D')])
+        self.assertEqual(delta['new_cycles'], [['A', 'B', 'C']])
+        self.assertEqual(cycles, [['A', 'B', 'C', 'A']])
+
+
+if __name__ == '__main__':
+    unittest.main()
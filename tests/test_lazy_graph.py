@@ -0,0 +1,59 @@
+"""Ленивый граф: предупреждения через обработчик вместо stdout и повторное использование обхода"""
+
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from registry_stub import StubRegistry, make_packument
+from dependency_visualizer import LazyDependencyGraph
+
+
+class LazyDependencyGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = StubRegistry({
+            'app': make_packument('app', {'left': '^1.0.0', 'right': '^9.0.0', 'ghost': '^1.0.0'}),
+            'left': make_packument('left', {'right': '^1.0.0'}),
+            'right': make_packument('right'),
+        })
+        self.registry.__enter__()
+        self.addCleanup(self.registry.__exit__, None, None, None)
+        self.graph = LazyDependencyGraph.open(self.registry.url, cache_dir=None)
+        self.addCleanup(self.graph.visualizer.registry_client.close)
+
+    def test_collects_warnings_without_printing(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            packages = [package for package, depth in self.graph.walk(self.graph.root('app'))]
+
+        self.assertEqual(output.getvalue(), '')
+        self.assertIn('right@1.0.0', packages)
+        self.assertEqual(len(self.graph.warnings), 3)
+        self.assertTrue(any("подходящей под '^9.0.0'" in warning for warning in self.graph.warnings))
+        self.assertTrue(any("'ghost@^1.0.0'" in warning for warning in self.graph.warnings))
+
+    def test_repeated_edges_reuse_completed_walk(self):
+        root = self.graph.root('app')
+        edges = list(self.graph.edges(root))
+        requests = len(self.registry.requests)
+
+        expanded = []
+        deps = self.graph.deps
+        self.graph.deps = lambda package: expanded.append(package) or deps(package)
+        self.assertEqual(list(self.graph.edges(root)), edges)
+        self.assertEqual(expanded, [])
+        self.assertEqual(len(self.registry.requests), requests)
+        self.assertIn(('left@1.0.0', 'right@1.0.0'), edges)
+
+    def test_interrupted_walk_is_not_reused(self):
+        root = self.graph.root('app')
+        first = next(iter(self.graph.walk(root)))
+
+        self.assertEqual(first, (root, 0))
+        self.assertEqual(self.graph.walks, {})
+        self.assertEqual(len(list(self.graph.walk(root, max_nodes=2))), 2)
+        self.assertEqual(len(list(self.graph.walk(root))), 4)
+        self.assertIn((root, None), self.graph.walks)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Дисковый кэш packument'ов: TTL, ревалидация по ETag, LRU-вытеснение и gzip"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from registry_stub import StubRegistry, make_packument
+from dependency_visualizer import DependencyVisualizer, PackumentCache, RegistryClient
+
+
+class PackumentCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = StubRegistry({
+            'left-pad': make_packument('left-pad', {'pad-core': '^1.0.0'}),
+            'pad-core': make_packument('pad-core'),
+        })
+        self.registry.__enter__()
+        self.addCleanup(self.registry.__exit__, None, None, None)
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, True)
+
+    def visualizer(self, ttl=3600):
+        """Новый запуск инструмента с общим каталогом кэша"""
+        visualizer = DependencyVisualizer()
+        visualizer.registry_url = self.registry.url
+        visualizer.packument_cache = PackumentCache(self.cache_dir, ttl=ttl, registry_url=self.registry.url)
+        self.addCleanup(visualizer.registry_client.close)
+        return visualizer
+
+    def test_stores_only_used_fields(self):
+        self.visualizer().fetch_package_info_from_npm('left-pad')
+
+        entry = PackumentCache(self.cache_dir, registry_url=self.registry.url).get('left-pad')
+        self.assertEqual(entry['etag'], '"left-pad-1"')
+        self.assertEqual(entry['packument'], {
+            'name': 'left-pad',
+            'dist-tags': {'latest': '1.0.0'},
+            'versions': {'1.0.0': {'dependencies': {'pad-core': '^1.0.0'}}},
+        })
+
+    def test_fresh_entry_is_used_without_request(self):
+        self.visualizer().fetch_package_info_from_npm('left-pad')
+        visualizer = self.visualizer()
+        packument = visualizer.fetch_package_info_from_npm('left-pad')
+
+        self.assertEqual(len(self.registry.requested('left-pad')), 1)
+        self.assertEqual(visualizer.packument_cache.hits, 1)
+        self.assertEqual(packument['dist-tags'], {'latest': '1.0.0'})
+
+    def test_expired_entry_is_revalidated_with_etag(self):
+        self.visualizer().fetch_package_info_from_npm('left-pad')
+        visualizer = self.visualizer(ttl=0)
+        packument = visualizer.fetch_package_info_from_npm('left-pad')
+
+        requests = self.registry.requested('left-pad')
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(requests[1]['headers'].get('If-None-Match'), '"left-pad-1"')
+        self.assertEqual(requests[1]['headers'].get('If-Modified-Since'), 'Mon, 01 Jan 2024 00:00:00 GMT')
+        self.assertEqual(visualizer.packument_cache.revalidated, 1)
+        self.assertEqual(packument['versions']['1.0.0']['dependencies'], {'pad-core': '^1.0.0'})
+
+    def test_changed_document_replaces_expired_entry(self):
+        self.visualizer().fetch_package_info_from_npm('left-pad')
+        self.registry.packuments['left-pad'] = make_packument('left-pad', version='2.0.0')
+        self.registry.revision += 1
+        visualizer = self.visualizer(ttl=0)
+        packument = visualizer.fetch_package_info_from_npm('left-pad')
+
+        self.assertEqual(visualizer.packument_cache.misses, 1)
+        self.assertEqual(packument['dist-tags'], {'latest': '2.0.0'})
+        entry = PackumentCache(self.cache_dir, registry_url=self.registry.url).get('left-pad')
+        self.assertEqual(entry['etag'], '"left-pad-2"')
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = PackumentCache(self.cache_dir, max_size=1000)
+        packument = {'dist-tags': {'latest': '1.0.0'}, 'versions': {'1.0.0': {'dependencies': {'x': 'y' * 300}}}}
+        cache.put('old', packument)
+        cache.put('recent', packument)
+        # Время доступа хранится в mtime: 'old' давно не использовался, 'recent' только что прочитан
+        now = time.time()
+        os.utime(cache.entry_path('old'), (now - 100, now - 100))
+        os.utime(cache.entry_path('recent'), (now - 50, now - 50))
+        self.assertIsNotNone(cache.get('recent'))
+        cache.put('new', packument)
+
+        self.assertIsNone(cache.get('old'))
+        self.assertIsNotNone(cache.get('recent'))
+        self.assertIsNotNone(cache.get('new'))
+        self.assertLessEqual(sum(cache.sizes.values()), 1000)
+
+    def test_registries_do_not_share_entries(self):
+        first = PackumentCache(self.cache_dir, registry_url='http://127.0.0.1:1')
+        second = PackumentCache(self.cache_dir, registry_url='http://127.0.0.1:2/')
+        first.put('left-pad', {'dist-tags': {'latest': '1.0.0'}, 'versions': {}})
+
+        self.assertIsNone(second.get('left-pad'))
+        self.assertIsNotNone(PackumentCache(self.cache_dir, registry_url='http://127.0.0.1:1/').get('left-pad'))
+
+    def test_failed_write_leaves_no_temporary_file(self):
+        cache = PackumentCache(self.cache_dir)
+        with mock.patch('dependency_visualizer.os.replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                cache.put('left-pad', {'dist-tags': {}, 'versions': {}})
+
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_gzip_response_is_decoded(self):
+        self.registry.encoding = 'gzip'
+        client = RegistryClient()
+        self.addCleanup(client.close)
+        response = client.get(f"{self.registry.url}/pad-core")
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        self.assertIn(b'"pad-core"', response.body)
+        self.assertIn('gzip', self.registry.requested('pad-core')[0]['headers']['Accept-Encoding'])
+
+        packument = self.visualizer().fetch_package_info_from_npm('pad-core')
+        self.assertEqual(packument['dist-tags'], {'latest': '1.0.0'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Анализ в пуле процессов (--processes) выводит то же, что и последовательный запуск"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from registry_stub import REPOSITORY_DIR, StubRegistry, make_packument
+
+SCRIPT = os.path.join(REPOSITORY_DIR, 'dependency_visualizer.py')
+
+
+class ParallelAnalysisTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def run_tool(self, *arguments):
+        result = subprocess.run(
+            [sys.executable, SCRIPT, '--output', os.path.join(self.directory, 'graph.svg'), *arguments],
+            cwd=self.directory, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=120,
+        )
+        output = result.stdout.decode('utf-8')
+        self.assertEqual(result.returncode, 0, output)
+        # Строка о числе процессов - единственное ожидаемое отличие
+        return [line for line in output.splitlines() if '🧵' not in line]
+
+    def test_batch_report_matches_serial_run(self):
+        registry = StubRegistry({
+            'app': make_packument('app', {'left': '^1.0.0', 'broken': '^1.0.0'}),
+            'tool': make_packument('tool', {'left': '^1.0.0'}),
+            'left': make_packument('left', {'tool': '^1.0.0'}),
+        })
+        roots = os.path.join(self.directory, 'roots.txt')
+        with open(roots, 'w', encoding='utf-8') as f:
+            f.write('app\ntool\nleft\n')
+
+        with registry:
+            serial = self.run_tool('--batch', roots, '--repo', registry.url, '--no-cache')
+            parallel = self.run_tool('--batch', roots, '--repo', registry.url, '--no-cache', '--processes', '2')
+
+        self.assertTrue(any('Не удалось получить зависимости' in line for line in serial))
+        self.assertEqual(parallel, serial)
+
+    def test_reverse_dependencies_match_serial_run(self):
+        # Зависящих пакетов больше порога, с которого анализ уходит в пул процессов
+        packages = {'target': {}, 'core': {'target': '^1.0.0'}}
+        for i in range(300):
+            packages[f"p{i}"] = {f"p{i + 1}" if i % 3 else 'core': '^1.0.0', f"p{i // 2}": '^1.0.0'}
+        packages['p300'] = {'target': '^1.0.0'}
+        repository = os.path.join(self.directory, 'repo.json')
+        with open(repository, 'w', encoding='utf-8') as f:
+            json.dump({name: {'dependencies': dependencies} for name, dependencies in packages.items()}, f)
+
+        arguments = ('--test-mode', '--repo', repository, '--package', 'target', '--reverse', '--max-paths', '2')
+        serial = self.run_tool(*arguments)
+        parallel = self.run_tool(*arguments, '--processes', '2')
+
+        self.assertGreater(sum('транзитивн' in line for line in serial), 256)
+        self.assertEqual(parallel, serial)
+
+
+if __name__ == '__main__':
+    unittest.main()
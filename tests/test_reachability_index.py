@@ -0,0 +1,63 @@
+"""Индекс достижимости: одинаковые ответы при построении одной и несколькими полосами"""
+
+import random
+import unittest
+
+from dependency_visualizer import ReachabilityIndex
+
+
+def reachable(graph, package):
+    """Транзитивные зависимости обходом графа (эталон для индекса)"""
+    seen = set()
+    stack = list(graph.get(package, ()))
+    while stack:
+        current = stack.pop()
+        if current not in seen:
+            seen.add(current)
+            stack.extend(graph.get(current, ()))
+    return seen
+
+
+class ReachabilityIndexTest(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(7)
+        size = 120
+        self.graph = {f"p{i}": [f"p{generator.randrange(size)}" for _ in range(generator.randint(0, 3))]
+                      for i in range(size)}
+        self.graph['p0'] = ['p1']
+        self.graph['p1'] = ['p0']
+
+    def check(self, index):
+        for package in self.graph:
+            dependencies = reachable(self.graph, package)
+            self.assertEqual(index.dependency_count(package), len(dependencies - {package}))
+            self.assertEqual(index.dependent_count(package),
+                             sum(1 for other in self.graph if other != package and package in reachable(self.graph, other)))
+            for other in self.graph:
+                self.assertEqual(index.depends_on(package, other), other in dependencies, (package, other))
+
+    def test_single_stripe_keeps_bitsets(self):
+        index = ReachabilityIndex(self.graph)
+        self.assertIsNotNone(index.forward)
+        self.check(index)
+
+    def test_striped_build_answers_by_condensation_search(self):
+        # Бюджет в 1 байт дает полосы минимальной ширины - 64 пакета
+        index = ReachabilityIndex(self.graph, memory_budget=1)
+        self.assertIsNone(index.forward)
+        self.check(index)
+
+    def test_chain_counts_with_many_stripes(self):
+        chain = {f"c{i}": [f"c{i + 1}"] for i in range(999)}
+        chain['c999'] = []
+        index = ReachabilityIndex(chain, memory_budget=1)
+
+        self.assertEqual(index.dependency_count('c0'), 999)
+        self.assertEqual(index.dependent_count('c999'), 999)
+        self.assertEqual(index.dependency_count('c500'), 499)
+        self.assertTrue(index.depends_on('c10', 'c990'))
+        self.assertFalse(index.depends_on('c990', 'c10'))
+
+
+if __name__ == '__main__':
+    unittest.main()
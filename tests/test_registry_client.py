@@ -0,0 +1,161 @@
+"""HTTP-клиент реестра: keep-alive пул, сжатие, сокращенный формат метаданных и повторы"""
+
+import socket
+import threading
+import time
+import unittest
+
+from registry_stub import StubRegistry, make_packument
+from dependency_visualizer import DependencyVisualizer, PackageNotFoundError, RegistryClient, TokenBucket
+
+
+class RegistryClientTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = StubRegistry({'left-pad': make_packument('left-pad', {'pad-core': '^1.0.0'})})
+        self.registry.__enter__()
+        self.addCleanup(self.registry.__exit__, None, None, None)
+
+    def client(self, **options):
+        options.setdefault('backoff', 0.001)
+        client = RegistryClient(**options)
+        self.addCleanup(client.close)
+        return client
+
+    def test_reuses_keep_alive_connection(self):
+        client = self.client()
+        for _ in range(5):
+            self.assertEqual(client.get(f"{self.registry.url}/left-pad").status, 200)
+
+        ports = {request['client'][1] for request in self.registry.requests}
+        self.assertEqual(len(ports), 1)
+        self.assertEqual(client.requests, 5)
+
+    def test_counts_requests_from_several_threads(self):
+        client = self.client()
+        size = len(client.get(f"{self.registry.url}/left-pad").body)
+
+        def fetch():
+            for _ in range(10):
+                client.get(f"{self.registry.url}/left-pad")
+
+        threads = [threading.Thread(target=fetch) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(client.requests, 81)
+        self.assertEqual(client.requests, len(self.registry.requests))
+        self.assertEqual(client.bytes_received, 81 * size)
+
+    def test_opens_new_connection_when_server_closes_it(self):
+        self.registry.close_connections = True
+        client = self.client()
+        for _ in range(3):
+            self.assertEqual(client.get(f"{self.registry.url}/left-pad").status, 200)
+
+        ports = {request['client'][1] for request in self.registry.requests}
+        self.assertEqual(len(ports), 3)
+
+    def test_requests_abbreviated_metadata_and_compression(self):
+        self.client().get(f"{self.registry.url}/left-pad")
+
+        headers = self.registry.requests[0]['headers']
+        self.assertIn('application/vnd.npm.install-v1+json', headers['Accept'])
+        self.assertIn('gzip', headers['Accept-Encoding'])
+
+    def test_decodes_compressed_responses(self):
+        for encoding in ('gzip', 'deflate'):
+            self.registry.encoding = encoding
+            response = self.client().get(f"{self.registry.url}/left-pad")
+
+            self.assertEqual(response.headers.get('Content-Encoding'), encoding)
+            self.assertIn(b'"pad-core"', response.body)
+
+    def test_retries_transient_errors(self):
+        self.registry.failures = [503, 429]
+        response = self.client().get(f"{self.registry.url}/left-pad")
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(self.registry.requests), 3)
+
+    def test_returns_error_after_last_retry(self):
+        self.registry.failures = [503] * 5
+        response = self.client(retries=2).get(f"{self.registry.url}/left-pad")
+
+        self.assertEqual(response.status, 503)
+        self.assertEqual(len(self.registry.requests), 3)
+
+    def test_raises_network_error_after_retries(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+
+        with self.assertRaises(OSError):
+            self.client(retries=1).get(f"http://127.0.0.1:{port}/left-pad")
+
+    def test_visualizer_fetches_through_client(self):
+        self.registry.encoding = 'gzip'
+        visualizer = DependencyVisualizer()
+        visualizer.registry_url = self.registry.url
+        self.addCleanup(visualizer.registry_client.close)
+
+        packument = visualizer.fetch_package_info_from_npm('left-pad')
+        self.assertEqual(packument['versions']['1.0.0']['dependencies'], {'pad-core': '^1.0.0'})
+        self.assertNotIn('readme', packument)
+        with self.assertRaises(PackageNotFoundError):
+            visualizer.fetch_package_info_from_npm('missing-package')
+
+    def visualizer(self):
+        visualizer = DependencyVisualizer()
+        visualizer.registry_url = self.registry.url
+        self.addCleanup(visualizer.registry_client.close)
+        return visualizer
+
+    def fetch_concurrently(self, visualizer, package_name, threads=8):
+        """Одновременные запросы пакета из нескольких потоков: результаты или исключения"""
+        results = [None] * threads
+
+        def fetch(index):
+            try:
+                results[index] = visualizer.fetch_package_info_from_npm(package_name)
+            except Exception as e:
+                results[index] = e
+
+        workers = [threading.Thread(target=fetch, args=(index,)) for index in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return results
+
+    def test_concurrent_fetches_share_one_request(self):
+        self.registry.delay = 0.1
+        results = self.fetch_concurrently(self.visualizer(), 'left-pad')
+
+        self.assertEqual(len(self.registry.requested('left-pad')), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_concurrent_fetches_share_the_error(self):
+        self.registry.delay = 0.1
+        results = self.fetch_concurrently(self.visualizer(), 'missing-package')
+
+        self.assertEqual(len(self.registry.requested('missing-package')), 1)
+        self.assertTrue(all(isinstance(result, PackageNotFoundError) for result in results))
+
+    def test_rate_limit_applies_to_serial_fetches(self):
+        self.registry.packuments.update({name: make_packument(name) for name in ('a', 'b', 'c', 'd')})
+        visualizer = self.visualizer()
+        visualizer.rate_limiter = TokenBucket(20, capacity=1)
+
+        started = time.monotonic()
+        for name in ('a', 'b', 'c', 'd'):
+            visualizer.get_direct_dependencies(name, self.registry.url)
+
+        # Первый токен есть сразу, каждый следующий - через 1/20 с
+        self.assertGreaterEqual(time.monotonic() - started, 0.14)
+        self.assertEqual(len(self.registry.requests), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
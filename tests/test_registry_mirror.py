@@ -0,0 +1,171 @@
+"""Зеркало реестра: HTTP-ответы, ошибки запросов, клиент через --repo и смена поколений данных"""
+
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+
+from registry_stub import REPOSITORY_DIR, StubRegistry, make_packument
+from dependency_visualizer import DependencyVisualizer, RegistryClient, RegistryMirror
+
+SCRIPT = os.path.join(REPOSITORY_DIR, 'dependency_visualizer.py')
+COMPLEX_CYCLE = os.path.join(REPOSITORY_DIR, 'test_repo_complex_cycle.json')
+
+
+class MirrorTestCase(unittest.TestCase):
+    def start_mirror(self, visualizer, upstream, test_mode, **options):
+        """Зеркало на свободном порту в отдельном потоке"""
+        mirror = RegistryMirror(visualizer, upstream, test_mode, **options)
+        server = mirror.create_server('127.0.0.1', 0)
+        thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.addCleanup(visualizer.close_repositories)
+        self.url = f"http://127.0.0.1:{server.server_address[1]}"
+        self.client = RegistryClient(backoff=0.001)
+        self.addCleanup(self.client.close)
+        return mirror
+
+    def get(self, path, headers=None):
+        return self.client.get(self.url + path, headers)
+
+    def get_json(self, path):
+        response = self.get(path)
+        return response.status, json.loads(response.body.decode('utf-8'))
+
+
+class TestModeMirrorTest(MirrorTestCase):
+    def setUp(self):
+        self.mirror = self.start_mirror(DependencyVisualizer(), COMPLEX_CYCLE, True)
+
+    def test_ping(self):
+        self.assertEqual(self.get_json('/-/ping'), (200, {}))
+
+    def test_packument(self):
+        status, packument = self.get_json('/A')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(packument['dist-tags'], {'latest': '1.0.0'})
+        self.assertEqual(packument['versions']['1.0.0']['dependencies'], {'B': '*', 'C': '*'})
+
+    def test_packument_is_compressed_and_revalidated(self):
+        response = self.get('/A')
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+
+        # RegistryClient распаковывает тело сам; сравниваем со сжатым ответом зеркала
+        body, compressed, etag = self.mirror.responses['A']
+        self.assertEqual(gzip.decompress(compressed), response.body)
+        self.assertEqual(response.headers.get('ETag'), etag)
+        self.assertEqual(self.get('/A', {'If-None-Match': etag}).status, 304)
+
+    def test_closure(self):
+        status, closure = self.get_json('/-/closure/A')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(closure['root'], 'A')
+        self.assertEqual(closure['packages'], {'A': ['B', 'C'], 'B': ['D'], 'C': ['B'], 'D': ['A']})
+        self.assertEqual(closure['truncated'], [])
+
+    def test_closure_with_depth(self):
+        status, closure = self.get_json('/-/closure/A?depth=1')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(closure['packages'], {'A': ['B', 'C']})
+        self.assertEqual(sorted(closure['truncated']), ['B', 'C'])
+
+    def test_bad_depth(self):
+        status, error = self.get_json('/-/closure/A?depth=x')
+
+        self.assertEqual(status, 400)
+        self.assertIn('Некорректный запрос', error['error'])
+
+    def test_missing_package(self):
+        for path in ('/missing', '/-/closure/missing'):
+            status, error = self.get_json(path)
+            self.assertEqual(status, 404, path)
+            self.assertIn('missing', error['error'])
+
+    def test_visualizer_resolves_through_mirror(self):
+        visualizer = DependencyVisualizer()
+        visualizer.registry_url = self.url
+        self.addCleanup(visualizer.registry_client.close)
+        with redirect_stdout(io.StringIO()):
+            graph, cycles = visualizer.build_dependency_graph_dfs('A', self.url, False, '')
+
+        self.assertEqual(graph['A'], ['B@1.0.0', 'C@1.0.0'])
+        self.assertEqual(graph['D@1.0.0'], ['A@1.0.0'])
+        self.assertEqual(len(cycles), 1)
+
+    def test_command_line_client_with_repo_url(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        result = subprocess.run(
+            [sys.executable, SCRIPT, '--package', 'A', '--repo', self.url, '--no-cache',
+             '--output', os.path.join(directory, 'graph.svg')],
+            cwd=directory, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=60,
+        )
+        output = result.stdout.decode('utf-8')
+
+        self.assertEqual(result.returncode, 0, output)
+        self.assertIn('📦 B@1.0.0 -> [\'D@1.0.0\']', output)
+        self.assertIn('Обнаружена циклическая зависимость', output)
+
+
+class LiveMirrorTest(MirrorTestCase):
+    def setUp(self):
+        self.registry = StubRegistry({
+            'app': make_packument('app', {'left': '^1.0.0'}),
+            'left': make_packument('left'),
+        })
+        self.registry.__enter__()
+        self.addCleanup(self.registry.__exit__, None, None, None)
+        self.visualizer = DependencyVisualizer()
+        self.visualizer.registry_url = self.registry.url
+        self.addCleanup(self.visualizer.registry_client.close)
+
+    def test_concurrent_requests_share_one_upstream_fetch(self):
+        self.start_mirror(self.visualizer, self.registry.url, False)
+        self.registry.delay = 0.1
+        statuses = []
+        workers = [threading.Thread(target=lambda: statuses.append(RegistryClient().get(self.url + '/app').status))
+                   for _ in range(6)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(statuses, [200] * 6)
+        self.assertEqual(len(self.registry.requested('app')), 1)
+
+    def test_expired_generation_is_replaced_not_cleared(self):
+        mirror = self.start_mirror(self.visualizer, self.registry.url, False, ttl=0.2)
+        status, closure = self.get_json('/-/closure/app')
+        self.assertEqual(closure['root'], 'app@1.0.0')
+        self.assertEqual(closure['packages'], {'app@1.0.0': ['left@1.0.0'], 'left@1.0.0': []})
+        old_graph = mirror.graph
+        old_packuments = old_graph.visualizer.packuments
+
+        time.sleep(0.3)
+        self.assertEqual(self.get_json('/app')[0], 200)
+
+        self.assertIsNot(mirror.graph, old_graph)
+        self.assertEqual(mirror.closures, {})
+        # Прежнее поколение не очищено: запросы, начатые до сброса, видят свои данные
+        self.assertIn('app', old_packuments)
+        self.assertIn('app@1.0.0', old_graph.dependencies)
+        self.assertEqual(len(self.registry.requested('app')), 2)
+        # Новое поколение использует общий клиент реестра
+        self.assertIs(mirror.graph.visualizer.registry_client, self.visualizer.registry_client)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""Ограничения обхода и контрольные точки: --max-nodes и повторная загрузка неудачных пакетов"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from registry_stub import StubRegistry, make_packument
+from dependency_visualizer import DependencyVisualizer, TraversalCheckpoint
+
+
+class TraversalLimitsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def build(self, visualizer, root, repo_url, test_mode, **limits):
+        with redirect_stdout(io.StringIO()):
+            return visualizer.build_dependency_graph_dfs(root, repo_url, test_mode, '', **limits)
+
+    def test_max_nodes_counts_expanded_packages(self):
+        repository = os.path.join(self.directory, 'repo.json')
+        packages = {'A': ['B', 'C', 'D', 'E'], 'B': ['F'], 'C': ['G'], 'D': [], 'E': [], 'F': [], 'G': []}
+        with open(repository, 'w', encoding='utf-8') as f:
+            json.dump([{'name': name, 'dependencies': dict.fromkeys(deps, '1.0.0')}
+                       for name, deps in packages.items()], f)
+
+        visualizer = DependencyVisualizer()
+        self.addCleanup(visualizer.close_repositories)
+        graph, cycles = self.build(visualizer, 'A', repository, True, max_nodes=3)
+
+        # Раскрыты корень и два пакета, хотя в графе уже были все дети корня
+        self.assertEqual([package for package in graph if graph[package]], ['A', 'B'])
+        self.assertEqual(len(graph) - len(visualizer.truncated_packages), 3)
+        self.assertEqual(set(visualizer.truncated_packages), {'C', 'D', 'E'})
+        self.assertEqual(set(visualizer.truncated_packages.values()), {'nodes'})
+
+    def test_failed_packages_are_retried_after_resume(self):
+        registry = StubRegistry({
+            'app': make_packument('app', {'left': '^1.0.0', 'broken': '^1.0.0'}),
+            'left': make_packument('left'),
+        })
+        checkpoint_path = os.path.join(self.directory, 'traversal.ckpt.json')
+        with registry:
+            visualizer = DependencyVisualizer()
+            visualizer.registry_url = registry.url
+            visualizer.ignore_ranges = True
+            self.addCleanup(visualizer.registry_client.close)
+            self.build(visualizer, 'app', registry.url, False)
+            self.assertIn('broken', visualizer.failed_packages)
+
+            # Запись происходит и тогда, когда пакет уже попал в словарь загруженных
+            visualizer.resolved_dependencies['broken'] = {}
+            checkpoint = TraversalCheckpoint(checkpoint_path, 'app')
+            checkpoint.save(visualizer.resolved_dependencies, visualizer.failed_packages)
+            self.assertEqual(set(checkpoint.load()), {'app', 'left'})
+
+            registry.packuments['broken'] = make_packument('broken', {'left': '^1.0.0'})
+            resumed = DependencyVisualizer()
+            resumed.registry_url = registry.url
+            resumed.ignore_ranges = True
+            self.addCleanup(resumed.registry_client.close)
+            for package, dependencies in checkpoint.load().items():
+                resumed.resolved_dependencies.setdefault(package, dict.fromkeys(dependencies))
+            del registry.requests[:]
+            graph, cycles = self.build(resumed, 'app', registry.url, False)
+
+        self.assertEqual(graph['broken'], ['left'])
+        self.assertEqual([request['name'] for request in registry.requests], ['broken'])
+
+
+if __name__ == '__main__':
+    unittest.main()